@@ -0,0 +1,120 @@
+"""
+Times the same operations against each BlobStore backend.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.blob_store_benchmark --mb 64
+
+For each backend (s3 against the moto stand-in, local, memory) the script
+writes one object through put_file and one through open_writer, then times
+a whole read, a ranged read of the first PREVIEW_BYTES, a chunked stream
+and a download to a local path. Every read is checked against the bytes
+that were written; the script exits non-zero on any mismatch.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.standins import configure_standin_env, start_standins
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return round((time.perf_counter() - started) * 1000, 1), result
+
+def throughput(size: int, ms: float) -> float:
+    return round(size / (1024 * 1024) / (ms / 1000), 1) if ms else None
+
+async def benchmark_backend(backend: str, data: bytes, source_path: str, preview_bytes: int) -> dict:
+    from storage.blob_store import init_blob_store, STREAM_CHUNK_SIZE
+    from executors import run_io
+
+    store = init_blob_store(backend)
+    key = f"benchmark/{backend}/data.bin"
+    streamed_key = f"benchmark/{backend}/streamed.bin"
+    size = len(data)
+    mismatches = []
+
+    put_ms, _ = await timed(store.put_file(key, source_path))
+
+    async def write_streamed():
+        writer = await store.open_writer(streamed_key)
+        for offset in range(0, size, STREAM_CHUNK_SIZE):
+            await writer.write(data[offset:offset + STREAM_CHUNK_SIZE])
+        return await writer.close()
+    writer_ms, _ = await timed(write_streamed())
+
+    get_ms, whole = await timed(store.get_bytes(key))
+    if whole != data:
+        mismatches.append("get_bytes")
+
+    range_ms, head_bytes = await timed(store.read_range(key, 0, preview_bytes - 1))
+    if head_bytes != data[:preview_bytes]:
+        mismatches.append("read_range")
+
+    async def read_stream():
+        return b"".join([chunk async for chunk in store.stream(streamed_key)])
+    stream_ms, streamed = await timed(read_stream())
+    if streamed != data:
+        mismatches.append("stream")
+
+    with tempfile.TemporaryDirectory() as directory:
+        target = os.path.join(directory, "download.bin")
+        download_ms, _ = await timed(store.download_to(key, target))
+        downloaded = await run_io(lambda: open(target, "rb").read())
+        if downloaded != data:
+            mismatches.append("download_to")
+
+    await store.delete(key)
+    await store.delete(streamed_key)
+
+    return {
+        "backend": backend,
+        "put_file_ms": put_ms,
+        "put_file_mb_s": throughput(size, put_ms),
+        "open_writer_ms": writer_ms,
+        "open_writer_mb_s": throughput(size, writer_ms),
+        "get_bytes_ms": get_ms,
+        "get_bytes_mb_s": throughput(size, get_ms),
+        "read_range_ms": range_ms,
+        "stream_ms": stream_ms,
+        "stream_mb_s": throughput(size, stream_ms),
+        "download_to_ms": download_ms,
+        "download_to_mb_s": throughput(size, download_ms),
+        "mismatches": mismatches
+    }
+
+async def main(args):
+    aws = await start_standins()
+    try:
+        data = os.urandom(args.mb * 1024 * 1024)
+        with tempfile.TemporaryDirectory() as directory:
+            source_path = os.path.join(directory, "source.bin")
+            with open(source_path, "wb") as f:
+                f.write(data)
+            results = [await benchmark_backend(backend, data, source_path, args.preview_bytes)
+                       for backend in args.backends]
+    finally:
+        aws.stop()
+
+    report = {"object_mb": args.mb, "results": results}
+    print(json.dumps(report, indent=2))
+    return 1 if any(r["mismatches"] for r in results) else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=64, help="object size in MiB")
+    parser.add_argument("--backends", nargs="*", default=["s3", "local", "memory"])
+    parser.add_argument("--preview-bytes", type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    SESSION_ROOT = configure_standin_env()
+    os.environ.setdefault("BLOB_LOCAL_ROOT", os.path.join(SESSION_ROOT, "blobs"))
+    os.chdir(SESSION_ROOT)
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,120 @@
+"""
+Times branch and checkout against the old copy-the-CSV approach.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.branch_checkout_benchmark --rows 2000000
+
+Runs the FastAPI app in-process against the offline stand-ins and the fake
+LLM. The local snapshot cache is emptied first, as on a worker that has
+never seen the session. The script then times:
+  - a branch and a checkout, which should be metadata only,
+  - a CHAT on the new branch, which only needs a ranged preview read,
+  - the first CODE on the branch, which materialises the snapshot.
+For comparison it also times the download plus re-upload that branching
+used to do. Exits non-zero when a branch is not clearly cheaper than that
+copy, or when the branch does not see the data of the commit it started from.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.standins import configure_standin_env, start_standins
+from benchmarks.loop_lag_load_test import synthetic_csv
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return round((time.perf_counter() - started) * 1000, 1), result
+
+async def legacy_branch_copy(bucket: str, s3_key: str) -> None:
+    """What branch_from_commit used to cost: one download and one upload."""
+    from s3_init import get_s3
+    from executors import run_s3
+
+    s3 = get_s3()
+    with tempfile.TemporaryDirectory() as directory:
+        local_path = os.path.join(directory, "copy.csv")
+        await run_s3(s3.download_file, bucket, s3_key, local_path)
+        await run_s3(s3.upload_file, local_path, bucket, f"{s3_key}.legacy-copy")
+
+async def main(args):
+    import httpx
+    from main import app
+    from controllers.SessionController import get_session_by_session_id
+
+    aws = await start_standins()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://standin", timeout=600) as client:
+            csv_bytes = synthetic_csv(args.rows)
+            response = await client.post("/create-session/",
+                                         files={"file": ("data.csv", csv_bytes, "text/csv")},
+                                         data={"session_name": "branch-benchmark"})
+            session_id = response.json()["session_id"]
+            initial_commit = response.json()["head"]
+
+            response = await client.post("/transform_csv/", data={"session_id": session_id,
+                                                                  "query": "CODE: df['extra'] = 1"})
+            response.raise_for_status()
+
+            # behave like a worker that has never seen this session
+            shutil.rmtree(os.path.join("session_files", session_id), ignore_errors=True)
+
+            session = await get_session_by_session_id(session_id)
+            legacy_ms, _ = await timed(legacy_branch_copy(os.environ["S3_BUCKET_NAME"], session.last_csv_path))
+
+            branch_ms, response = await timed(client.post("/transform_csv/", data={
+                "session_id": session_id, "query": f"BRANCH: {initial_commit}"}))
+            response.raise_for_status()
+            branch_head = response.json()["new_head"]
+
+            chat_ms, response = await timed(client.post("/transform_csv/", data={
+                "session_id": session_id, "query": "what columns are there?"}))
+            response.raise_for_status()
+            local_after_chat = os.path.exists(os.path.join("session_files", session.last_csv_path))
+
+            code_ms, response = await timed(client.post("/transform_csv/", data={
+                "session_id": session_id, "query": "CODE: df['on_branch'] = df['id'] * 2"}))
+            response.raise_for_status()
+
+            session = await get_session_by_session_id(session_id)
+            columns = response.json()["diff_summary"]["columns_added"]
+
+            checkout_ms, response = await timed(client.post("/transform_csv/", data={
+                "session_id": session_id, "query": f"CHECKOUT: {branch_head}"}))
+            response.raise_for_status()
+    finally:
+        aws.stop()
+
+    report = {
+        "rows": args.rows,
+        "csv_mb": round(len(csv_bytes) / 1024 ** 2, 1),
+        "legacy_download_and_upload_ms": legacy_ms,
+        "branch_ms": branch_ms,
+        "checkout_ms": checkout_ms,
+        "chat_on_branch_ms": chat_ms,
+        "chat_materialised_snapshot": local_after_chat,
+        "first_code_on_branch_ms": code_ms,
+        "branch_columns_added": columns
+    }
+    print(json.dumps(report, indent=2))
+
+    ok = branch_ms * args.min_speedup <= legacy_ms and columns == ["on_branch"]
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--min-speedup", type=float, default=5.0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    configure_standin_env()
+    os.chdir(os.environ["SESSION_ROOT"])
+    sys.exit(asyncio.run(main(args)))
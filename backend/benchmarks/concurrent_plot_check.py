@@ -0,0 +1,83 @@
+"""
+Runs plotting transforms from several sessions at once on the exec pool and
+checks that no script draws into, closes or saves another one's chart.
+
+    cd backend
+    python -m benchmarks.concurrent_plot_check
+    python -m benchmarks.concurrent_plot_check --sessions 4 --rounds 10
+
+Each transform opens a figure, plots its frame, sleeps so the others get
+scheduled in between, plots again and saves into its own commit_dir. It
+records how many lines its current figure had and the title it saw; both
+must be its own. Exits 1 when any round mixed charts up.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+PLOT_CODE = """
+import time
+plt.figure()
+plt.title(commit_dir)
+plt.plot(df['value'])
+time.sleep(0.05)
+plt.plot(df['value'] * 2)
+df['lines'] = len(plt.gca().lines)
+df['title'] = plt.gca().get_title()
+plt.savefig(f"{commit_dir}/chart.png")
+"""
+
+async def run_round(sessions: int, root: str) -> list:
+    import pandas as pd
+    from executors import run_exec
+    from services.code_executor import execute_generated_code
+
+    commit_dirs = []
+    for i in range(sessions):
+        commit_dir = os.path.join(root, f"session{i}")
+        os.makedirs(commit_dir, exist_ok=True)
+        commit_dirs.append(commit_dir)
+
+    frames = await asyncio.gather(*[
+        run_exec(execute_generated_code, PLOT_CODE, pd.DataFrame({"value": range(10)}), commit_dir)
+        for commit_dir in commit_dirs
+    ])
+
+    problems = []
+    for commit_dir, df in zip(commit_dirs, frames):
+        if df["lines"].iloc[0] != 2:
+            problems.append(f"{commit_dir}: figure had {df['lines'].iloc[0]} lines, expected 2")
+        if df["title"].iloc[0] != commit_dir:
+            problems.append(f"{commit_dir}: drew into the figure of {df['title'].iloc[0]}")
+        if not os.path.exists(os.path.join(commit_dir, "chart.png")):
+            problems.append(f"{commit_dir}: chart.png missing")
+    return problems
+
+async def main(args) -> int:
+    import matplotlib.pyplot as plt
+
+    report = {"sessions": args.sessions, "rounds": args.rounds, "failed_rounds": 0, "problems": []}
+    with tempfile.TemporaryDirectory() as root:
+        for round_no in range(args.rounds):
+            problems = await run_round(args.sessions, os.path.join(root, f"round{round_no}"))
+            if problems:
+                report["failed_rounds"] += 1
+                report["problems"] += problems
+    report["open_figures_after"] = len(plt.get_fignums())
+
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed_rounds"] or report["open_figures_after"] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2, help="transforms running at the same time")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # the exec pool must have room for every session, or nothing overlaps
+    os.environ.setdefault("EXEC_POOL_SIZE", str(max(args.sessions, 2)))
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,250 @@
+"""
+Replays recorded sessions against the fake LLM to compare how much prompt
+each context strategy costs.
+
+    cd backend
+    # export real sessions (needs MONGODB_CONNECTION_STRING)
+    python -m benchmarks.context_replay --export sessions.json --session-id <id> [<id> ...]
+    # replay them offline
+    python -m benchmarks.context_replay --input sessions.json
+    # or replay a generated session with branches
+    python -m benchmarks.context_replay --synthetic 60 --branch-every 8
+
+Each recorded commit is replayed as the request that produced it, with HEAD
+at its parent. The transform prompt is rendered with the production
+template for every strategy and sent through the metered fake LLM:
+  full     every earlier commit of the session, no checkpoints
+  session  newest checkpoint by time plus the commits after it
+           (the behaviour before checkpoints followed the commit DAG)
+  path     nearest checkpoint on HEAD's path plus the path commits after it
+Checkpoints are simulated per strategy with the production threshold, and
+their summarisation calls are metered too. Token counts from the fake LLM
+are estimates (about 4 characters per token); compare strategies with each
+other, not with a provider bill. A commit in the context that is not an
+ancestor of HEAD is counted as off-path.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import defaultdict
+
+from benchmarks.standins import configure_standin_env
+
+RECORD_FIELDS = ["commit_id", "parent_commit", "timestamp", "mode", "query", "key_steps", "success"]
+
+PREVIEW = "id,name,amount,created\n1,alpha,10.5,2024-01-01\n2,beta,,2024-01-02\n3,gamma,7.25,2024-01-03\n"
+
+def synthetic_session(commits: int, branch_every: int) -> list:
+    """A session that keeps branching off an earlier commit, like undo + retry."""
+    records = [{"commit_id": "c0", "parent_commit": None, "timestamp": "0000", "mode": "CODE",
+                "query": "Initial upload", "key_steps": None, "success": True}]
+    head = "c0"
+    for i in range(1, commits + 1):
+        if branch_every and i % branch_every == 0:
+            # branch from three commits back
+            target = records[max(len(records) - 3, 0)]["commit_id"]
+            records.append({"commit_id": f"c{i}", "parent_commit": target, "timestamp": f"{i:04d}",
+                            "mode": "CONTEXT", "query": f"go back to {target}", "key_steps": None,
+                            "success": True})
+        else:
+            records.append({"commit_id": f"c{i}", "parent_commit": head, "timestamp": f"{i:04d}",
+                            "mode": "CODE", "query": f"clean column {i % 7} and derive feature {i}",
+                            "key_steps": f"filled nulls in column {i % 7}, added feature_{i} = amount * {i}",
+                            "success": True})
+        head = f"c{i}"
+    return records
+
+def path_of(commit_id: str, parents: dict) -> list:
+    path = []
+    while commit_id is not None:
+        path.append(commit_id)
+        commit_id = parents.get(commit_id)
+    return path[::-1]
+
+class Strategy:
+    """Context assembly and checkpointing as one code version did them."""
+
+    def __init__(self, name: str, threshold: int):
+        self.name = name
+        self.threshold = threshold
+        # checkpoints in creation order: {"commit_id", "timestamp", "summary", "commit_ids"}
+        self.checkpoints = []
+
+    def context(self, head: str, seen: list, by_id: dict, parents: dict):
+        """(summary or None, commits in the context) for a request at head."""
+        if self.name == "full":
+            return None, seen
+
+        if self.name == "session":
+            if not self.checkpoints:
+                return None, seen
+            latest = self.checkpoints[-1]
+            return None, [r for r in seen if r["timestamp"] > latest["timestamp"]]
+
+        path = path_of(head, parents)
+        anchored = {c["commit_id"]: c for c in self.checkpoints}
+        for depth in range(len(path) - 1, -1, -1):
+            if path[depth] in anchored:
+                return anchored[path[depth]]["summary"], [by_id[c] for c in path[depth + 1:]]
+        return None, [by_id[c] for c in path]
+
+    def pending_summary(self, record: dict, by_id: dict, parents: dict):
+        """Commits to summarise after a CODE commit, or None when no checkpoint is due."""
+        if self.name == "full":
+            return None
+
+        if self.name == "session":
+            if not self.checkpoints:
+                self.checkpoints.append({"commit_id": None, "timestamp": record["timestamp"],
+                                         "summary": f"Initial step: {record['key_steps']}",
+                                         "commit_ids": [record["commit_id"]]})
+                return None
+            latest = self.checkpoints[-1]
+            latest["commit_ids"].append(record["commit_id"])
+            if len(latest["commit_ids"]) < self.threshold:
+                return None
+            return latest["summary"], [by_id[c] for c in latest["commit_ids"]]
+
+        path = path_of(record["commit_id"], parents)
+        anchored = {c["commit_id"]: c for c in self.checkpoints}
+        start, previous = 0, ""
+        for depth in range(len(path) - 1, -1, -1):
+            if path[depth] in anchored:
+                start, previous = depth + 1, anchored[path[depth]]["summary"]
+                break
+        pending = path[start:]
+        if len(pending) < self.threshold:
+            return None
+        return previous, [by_id[c] for c in pending]
+
+    def add_checkpoint(self, record: dict, summary: str, commit_ids: list):
+        anchor = None if self.name == "session" else record["commit_id"]
+        self.checkpoints.append({"commit_id": anchor, "timestamp": record["timestamp"],
+                                 "summary": summary, "commit_ids": [] if self.name == "session" else commit_ids})
+
+async def replay_session(records: list, strategy_name: str, threshold: int) -> dict:
+    from services.langchain_chain import transform_chain, history_summary_chain
+    from services.llm_usage import ainvoke_metered
+
+    records = sorted(records, key=lambda r: r["timestamp"])
+    by_id = {r["commit_id"]: r for r in records}
+    parents = {r["commit_id"]: r["parent_commit"] for r in records}
+    strategy = Strategy(strategy_name, threshold)
+
+    totals = defaultdict(float)
+    prompt_tokens = []
+    seen = []
+
+    for record in records:
+        head = record["parent_commit"]
+        if head is not None:
+            summary, commits = strategy.context(head, seen, by_id, parents)
+            ancestors = set(path_of(head, parents))
+            context_commits = [c for c in commits if c["success"] and c["key_steps"]]
+
+            lines = [f"- earlier steps (condensed): {summary}"] if summary else []
+            lines += [f"- {c['commit_id']}:{c['key_steps']}" for c in context_commits]
+            _, usage = await ainvoke_metered(transform_chain, {
+                "preview": PREVIEW,
+                "context": "\n".join(lines),
+                "query": record["query"]
+            }, stage="transform")
+
+            totals["requests"] += 1
+            totals["input_tokens"] += usage["input_tokens"]
+            totals["output_tokens"] += usage["output_tokens"]
+            totals["cost_usd"] += usage["cost_usd"]
+            prompt_tokens.append(usage["input_tokens"])
+
+            off_path = [c for c in context_commits if c["commit_id"] not in ancestors]
+            totals["off_path_commits"] += len(off_path)
+            totals["requests_with_off_path_context"] += 1 if off_path else 0
+
+        seen.append(record)
+
+        if record["mode"] == "CODE" and head is not None:
+            due = strategy.pending_summary(record, by_id, parents)
+            if due is not None:
+                previous, commits = due
+                steps = "\n".join(c["key_steps"] for c in commits if c["key_steps"])
+                full_history = f"{previous}\n{steps}".strip() or "No significant transformations yet."
+                response, usage = await ainvoke_metered(history_summary_chain,
+                                                        {"full_history": full_history}, stage="summary")
+                strategy.add_checkpoint(record, response.content.strip(), [c["commit_id"] for c in commits])
+
+                totals["summary_calls"] += 1
+                totals["summary_input_tokens"] += usage["input_tokens"]
+                totals["cost_usd"] += usage["cost_usd"]
+
+    requests = int(totals["requests"]) or 1
+    return {
+        "strategy": strategy_name,
+        "requests": int(totals["requests"]),
+        "prompt_tokens_total": int(totals["input_tokens"]),
+        "prompt_tokens_mean": round(totals["input_tokens"] / requests, 1),
+        "prompt_tokens_max": max(prompt_tokens, default=0),
+        "completion_tokens_total": int(totals["output_tokens"]),
+        "summary_calls": int(totals["summary_calls"]),
+        "summary_input_tokens": int(totals["summary_input_tokens"]),
+        "estimated_cost_usd": round(totals["cost_usd"], 6),
+        "off_path_commits": int(totals["off_path_commits"]),
+        "requests_with_off_path_context": int(totals["requests_with_off_path_context"])
+    }
+
+async def export_sessions(path: str, session_ids: list):
+    from db_init import init_db
+    from controllers.CommitController import get_commits_by_session_id
+
+    await init_db(os.getenv("MONGODB_CONNECTION_STRING"))
+    sessions = {}
+    for session_id in session_ids:
+        commits = await get_commits_by_session_id(session_id)
+        sessions[session_id] = [
+            {field: (str(getattr(c, field)) if field == "commit_id" else getattr(c, field)) for field in RECORD_FIELDS}
+            for c in commits
+        ]
+    with open(path, "w") as f:
+        json.dump(sessions, f, indent=2)
+    print(f"Exported {len(sessions)} sessions to {path}")
+
+async def main(args):
+    from controllers.CheckpointController import CHECKPOINT_THRESHOLD
+
+    if args.export:
+        await export_sessions(args.export, args.session_id)
+        return 0
+
+    if args.input:
+        with open(args.input, "r") as f:
+            sessions = json.load(f)
+    else:
+        sessions = {"synthetic": synthetic_session(args.synthetic, args.branch_every)}
+
+    threshold = args.threshold or CHECKPOINT_THRESHOLD
+    report = {"threshold": threshold, "sessions": {}}
+    for session_id, records in sessions.items():
+        report["sessions"][session_id] = [await replay_session(records, name, threshold)
+                                          for name in args.strategies]
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="sessions exported with --export")
+    parser.add_argument("--export", help="write the commits of --session-id to this file and exit")
+    parser.add_argument("--session-id", nargs="*", default=[])
+    parser.add_argument("--synthetic", type=int, default=60, help="commits in the generated session")
+    parser.add_argument("--branch-every", type=int, default=8)
+    parser.add_argument("--threshold", type=int, default=None, help="checkpoint threshold (default: production)")
+    parser.add_argument("--strategies", nargs="*", default=["full", "session", "path"])
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if not args.export:
+        # replays never reach a real provider
+        os.environ["LLM_PROVIDER"] = "fake"
+    configure_standin_env()
+
+    sys.exit(asyncio.run(main(args)))
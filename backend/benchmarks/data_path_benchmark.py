@@ -0,0 +1,381 @@
+"""
+End-to-end benchmark of the data path on reference datasets, with JSON
+results that can be compared between runs.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.data_path_benchmark --preset quick --output base.json
+    # ... change something ...
+    python -m benchmarks.data_path_benchmark --preset quick --compare base.json
+    # or compare two saved runs without running anything
+    python -m benchmarks.data_path_benchmark --compare base.json --against new.json
+    # any grid
+    python -m benchmarks.data_path_benchmark --rows 1000000 10000000 --cols 5 50 500
+
+Runs the FastAPI app in-process against the offline stand-ins (moto S3,
+fakeredis, mongomock) and the fake LLM. For every dataset it measures:
+  create_session   streaming upload through create_new_session
+  head_load_cold   load_head_frame with an empty local cache (S3 download + parse)
+  head_load_warm   load_head_frame again (parse only)
+  transform_<name> a CODE request per generated transform: fillna, groupby,
+                   merge, pivot, plot; the per-stage split (exec,
+                   snapshot_write, diff, upload, ...) comes from the
+                   transform stage histograms
+  list_files_cold  /list_session_files with empty signed-url caches
+  list_files_warm  the same listing again
+Each stage records wall time, rows/s and the peak RSS growth while it ran.
+
+Reference datasets are deterministic (seeded), cycle through int, float
+with nulls, low-cardinality string, date and bool columns, and are cached
+in --data-dir. Grid cells above --max-cells (rows x cols) are skipped and
+reported as such: 50M x 500 needs a machine with hundreds of GB of RAM.
+
+--compare flags a stage as a regression when it is slower than the
+baseline by more than --time-tolerance, or grows RSS by more than
+--memory-tolerance, and exits 1 if any stage regressed. Stages faster than
+--min-ms in the baseline are too noisy to judge and are skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.standins import configure_standin_env, start_standins
+
+PRESETS = {
+    "quick": {"rows": [10_000, 100_000], "cols": [5, 50]},
+    "standard": {"rows": [10_000, 100_000, 1_000_000], "cols": [5, 50, 500]},
+    "full": {"rows": [10_000, 100_000, 1_000_000, 10_000_000, 50_000_000], "cols": [5, 50, 500]},
+}
+
+COLUMN_KINDS = ["int", "float", "cat", "date", "bool"]
+
+# generated transforms as the LLM typically writes them; every dataset has
+# int_0, float_0, cat_0, date_0 and bool_0
+TRANSFORMS = {
+    "fillna": "df = df.fillna({c: 0 for c in df.select_dtypes('number').columns})",
+    "groupby": ("summary = df.groupby('cat_0', observed=True).agg(rows=('int_0', 'size'), "
+                "mean=('float_0', 'mean'), total=('int_0', 'sum'))\n"
+                "open(f'{commit_dir}/groupby.txt', 'w').write(summary.to_string())"),
+    "merge": ("lookup = df.groupby('cat_0', observed=True)['float_0'].mean().rename('float_0_cat_mean').reset_index()\n"
+              "df = df.merge(lookup, on='cat_0', how='left')"),
+    "pivot": ("pivot = df.pivot_table(index='cat_0', columns='bool_0', values='float_0', aggfunc='mean', observed=True)\n"
+              "open(f'{commit_dir}/pivot.txt', 'w').write(pivot.to_string())"),
+    "plot": ("values = df['float_0'].dropna()\n"
+             "values.sample(n=min(len(values), 100000), random_state=0).plot.hist(bins=50)\n"
+             "plt.savefig(f'{commit_dir}/float_0_hist.png')\n"
+             "plt.close()"),
+}
+
+GENERATE_CHUNK_ROWS = 500_000
+
+def dataset_path(data_dir: str, rows: int, cols: int) -> str:
+    return os.path.join(data_dir, f"reference_{rows}x{cols}.csv")
+
+def _chunk(rows: int, cols: int, start: int, rng):
+    import numpy as np
+    import pandas as pd
+
+    data = {}
+    for i in range(cols):
+        kind = COLUMN_KINDS[i % len(COLUMN_KINDS)]
+        name = f"{kind}_{i // len(COLUMN_KINDS)}"
+        if kind == "int":
+            data[name] = np.arange(start, start + rows) if i == 0 else rng.integers(0, 10_000, size=rows)
+        elif kind == "float":
+            values = rng.normal(100, 25, size=rows).round(3)
+            values[rng.random(size=rows) < 0.05] = np.nan
+            data[name] = values
+        elif kind == "cat":
+            data[name] = rng.choice(["north", "south", "east", "west", "central", ""], size=rows)
+        elif kind == "date":
+            data[name] = (pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, size=rows), unit="D")).strftime("%Y-%m-%d")
+        else:
+            data[name] = rng.random(size=rows) > 0.5
+    return pd.DataFrame(data)
+
+def ensure_dataset(data_dir: str, rows: int, cols: int) -> str:
+    """Writes the reference CSV once, in chunks so big ones never sit in memory whole."""
+    import numpy as np
+
+    path = dataset_path(data_dir, rows, cols)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(rows * 1000 + cols)
+    partial = path + ".partial"
+    with open(partial, "w", newline="") as f:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            chunk = _chunk(min(GENERATE_CHUNK_ROWS, rows - start), cols, start, rng)
+            chunk.to_csv(f, index=False, header=start == 0)
+    os.replace(partial, path)
+    return path
+
+class RssSampler:
+    """Peak resident memory while a stage runs, sampled from a background thread."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def rss() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            # no procfs: high-water mark of the whole process, never shrinks
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, self.rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = self.rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.rss())
+
+def stage_seconds() -> dict:
+    """Running totals of the transform stage histograms."""
+    from metrics import STAGE_SECONDS
+
+    totals = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_sum"):
+                totals[sample.labels["stage"]] = sample.value
+    return totals
+
+async def measure(results: dict, name: str, rows: int, coro_fn):
+    """Runs coro_fn() as stage name and records time, throughput and memory."""
+    before = stage_seconds()
+    with RssSampler() as sampler:
+        started = time.perf_counter()
+        value = await coro_fn()
+        elapsed = time.perf_counter() - started
+    after = stage_seconds()
+
+    breakdown = {stage: round((after[stage] - before.get(stage, 0)) * 1000, 2)
+                 for stage in after if after[stage] - before.get(stage, 0) > 0}
+    results[name] = {
+        "ms": round(elapsed * 1000, 2),
+        "rows_per_s": round(rows / elapsed) if elapsed else None,
+        "rss_growth_mb": round((sampler.peak_rss - sampler.start_rss) / 1024 / 1024, 1),
+        "peak_rss_mb": round(sampler.peak_rss / 1024 / 1024, 1),
+    }
+    if breakdown:
+        results[name]["stages_ms"] = breakdown
+    return value
+
+def _check(response, what: str):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{what} failed: {response.status_code} {response.text[:300]}")
+    return response
+
+async def clear_url_caches():
+    from cache.signed_url_cache import local_url_cache
+    from redis_init import get_redis_cache
+
+    local_url_cache.clear()
+    await get_redis_cache().flushdb()
+
+async def benchmark_dataset(client, path: str, rows: int, cols: int) -> dict:
+    from controllers.SessionController import get_session_by_session_id
+    from routes.gemini_agent import load_head_frame
+    from session_management_2 import set_head
+    from storage.blob_store import local_cache_path
+
+    stages = {}
+
+    async def upload_body():
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                yield chunk
+
+    response = await measure(stages, "create_session", rows, lambda: client.post(
+        "/create-session/stream", params={"session_name": os.path.basename(path)}, content=upload_body()))
+    session_id = _check(response, "create_session").json()["session_id"]
+    session = await get_session_by_session_id(session_id)
+    base_commit = str(session.head)
+
+    # a worker that has never seen the session
+    shutil.rmtree(local_cache_path(session_id), ignore_errors=True)
+    await measure(stages, "head_load_cold", rows, lambda: load_head_frame(session))
+    await measure(stages, "head_load_warm", rows, lambda: load_head_frame(session))
+
+    for name, code in TRANSFORMS.items():
+        response = await measure(stages, f"transform_{name}", rows, lambda: client.post(
+            "/transform_csv/", data={"session_id": session_id, "query": f"CODE: {code}"}))
+        body = _check(response, f"transform_{name}").json()
+        if not body.get("success"):
+            raise RuntimeError(f"transform_{name} failed: {body.get('error')}")
+        # every transform starts from the uploaded data
+        await set_head(session_id, base_commit)
+
+    await clear_url_caches()
+    for name in ("list_files_cold", "list_files_warm"):
+        response = await measure(stages, name, rows, lambda: client.get(
+            "/list_session_files", params={"session_id": session_id}))
+        _check(response, name)
+
+    return {
+        "rows": rows,
+        "cols": cols,
+        "csv_mb": round(os.path.getsize(path) / 1024 / 1024, 2),
+        "stages": stages
+    }
+
+def run_metadata() -> dict:
+    import numpy as np
+    import pandas as pd
+    import pyarrow
+
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pyarrow.__version__,
+    }
+
+async def run_suite(args) -> dict:
+    import httpx
+    from main import app
+
+    grid = [(rows, cols) for rows in args.rows for cols in args.cols]
+    report = {"meta": run_metadata(), "datasets": [], "skipped": []}
+
+    aws = await start_standins()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://standin", timeout=None) as client:
+            for rows, cols in grid:
+                if rows * cols > args.max_cells:
+                    report["skipped"].append({"rows": rows, "cols": cols,
+                                              "reason": f"rows x cols above --max-cells {args.max_cells}"})
+                    continue
+                print(f"dataset {rows} x {cols}", file=sys.stderr)
+                path = ensure_dataset(args.data_dir, rows, cols)
+                try:
+                    report["datasets"].append(await benchmark_dataset(client, path, rows, cols))
+                except Exception as e:
+                    report["datasets"].append({"rows": rows, "cols": cols, "error": str(e)})
+    finally:
+        aws.stop()
+    return report
+
+def compare(baseline: dict, current: dict, time_tolerance: float, memory_tolerance: float, min_ms: float) -> dict:
+    """Stage by stage comparison of two reports; regressions are listed separately."""
+    def index(report):
+        return {(d["rows"], d["cols"]): d for d in report["datasets"] if "stages" in d}
+
+    base, curr = index(baseline), index(current)
+    stages, regressions = [], []
+    for key in sorted(base.keys() & curr.keys()):
+        for name, before in base[key]["stages"].items():
+            after = curr[key]["stages"].get(name)
+            if after is None or before["ms"] < min_ms:
+                continue
+            entry = {
+                "rows": key[0],
+                "cols": key[1],
+                "stage": name,
+                "baseline_ms": before["ms"],
+                "current_ms": after["ms"],
+                "time_ratio": round(after["ms"] / before["ms"], 3),
+                "baseline_rss_growth_mb": before["rss_growth_mb"],
+                "current_rss_growth_mb": after["rss_growth_mb"],
+            }
+            slower = entry["time_ratio"] > 1 + time_tolerance
+            # a few MB of allocator noise is not a regression
+            hungrier = (after["rss_growth_mb"] > before["rss_growth_mb"] * (1 + memory_tolerance)
+                        and after["rss_growth_mb"] - before["rss_growth_mb"] > 16)
+            if slower or hungrier:
+                entry["regressed"] = [what for what, bad in (("time", slower), ("memory", hungrier)) if bad]
+                regressions.append(entry)
+            stages.append(entry)
+
+    return {
+        "baseline": baseline["meta"],
+        "current": current["meta"],
+        "datasets_compared": len(base.keys() & curr.keys()),
+        "missing_in_current": [list(k) for k in sorted(base.keys() - curr.keys())],
+        "stages": stages,
+        "regressions": regressions,
+    }
+
+async def main(args):
+    if args.compare and args.against:
+        with open(args.against) as f:
+            current = json.load(f)
+    else:
+        current = await run_suite(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+
+    if not args.compare:
+        print(json.dumps(current, indent=2))
+        return 1 if any("error" in d for d in current["datasets"]) else 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    result = compare(baseline, current, args.time_tolerance, args.memory_tolerance, args.min_ms)
+    print(json.dumps(result, indent=2))
+    return 1 if result["regressions"] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--rows", type=int, nargs="*", help="overrides the preset's row counts")
+    parser.add_argument("--cols", type=int, nargs="*", help="overrides the preset's column counts")
+    parser.add_argument("--max-cells", type=float, default=2e8, help="skip datasets with more rows x cols")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.expanduser("~"), ".cache", "cellcraft-benchmarks"),
+                        help="where reference datasets are generated and reused")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--compare", help="baseline results to compare with")
+    parser.add_argument("--against", help="compare this saved run instead of running the suite")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    parser.add_argument("--min-ms", type=float, default=20)
+    args = parser.parse_args()
+    args.rows = args.rows or PRESETS[args.preset]["rows"]
+    args.cols = args.cols or PRESETS[args.preset]["cols"]
+    args.data_dir = os.path.abspath(args.data_dir)
+    for path in ("output", "compare", "against"):
+        if getattr(args, path):
+            setattr(args, path, os.path.abspath(getattr(args, path)))
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    configure_standin_env()
+    os.chdir(os.environ["SESSION_ROOT"])
+    sys.exit(asyncio.run(main(args)))
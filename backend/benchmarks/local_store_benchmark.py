@@ -0,0 +1,131 @@
+"""
+Compares the embedded session store with the old session_store.json files.
+
+    cd backend
+    python -m benchmarks.local_store_benchmark --sessions 100 1000 10000
+
+For each store size it times one commit: the old way rewrites
+session_store.json and the session's history file, the new way does one
+SQLite transaction. It then starts several processes that append commits to
+the same session at the same time and checks that no commit was lost.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+def session_record(i: int, directory: str) -> dict:
+    session_id = f"session-{i}"
+    return {
+        "session_id": session_id,
+        "session_name": f"name {i}",
+        "head": "c0",
+        "last_csv_path": os.path.join(directory, session_id, "c0", "c0.csv"),
+        "history_path": os.path.join(directory, f"{session_id}_transform_history.json"),
+        "session_dir": os.path.join(directory, session_id)
+    }
+
+def commit_record(commit_id: str, parent: str) -> dict:
+    return {"commit_id": commit_id, "parent_commit": parent, "mode": "CODE",
+            "query": "add a column", "key_steps": "added column", "code": "df['x'] = 1",
+            "success": True, "error": None}
+
+def legacy_commit(store_file: str, session_id: str, record: dict):
+    with open(store_file, "r") as f:
+        store = json.load(f)
+    session = store[session_id]
+    with open(session["history_path"], "r") as f:
+        history = json.load(f)
+    history.append(record)
+    with open(session["history_path"], "w") as f:
+        json.dump(history, f, indent=2)
+    session["head"] = record["commit_id"]
+    with open(store_file, "w") as f:
+        json.dump(store, f, indent=2)
+
+def timed_ms(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return round((time.perf_counter() - started) * 1000 / repeat, 3)
+
+def benchmark_size(sessions: int, history: int, repeat: int) -> dict:
+    from store import LocalSessionStore
+
+    with tempfile.TemporaryDirectory() as directory:
+        records = {f"session-{i}": session_record(i, directory) for i in range(sessions)}
+        for session in records.values():
+            with open(session["history_path"], "w") as f:
+                json.dump([commit_record(f"c{j}", None) for j in range(history)], f)
+
+        store_file = os.path.join(directory, "session_store.json")
+        with open(store_file, "w") as f:
+            json.dump(records, f, indent=2)
+
+        store = LocalSessionStore(os.path.join(directory, "session_store.db"))
+        store.import_json_store(store_file)
+
+        target = records["session-0"]
+        legacy_ms = timed_ms(lambda i: legacy_commit(store_file, "session-0", commit_record(f"legacy-{i}", "c0")), repeat)
+        sqlite_ms = timed_ms(lambda i: store.commit({**target, "head": f"new-{i}"}, commit_record(f"new-{i}", "c0")), repeat)
+        store.close()
+
+    return {"sessions": sessions, "legacy_json_commit_ms": legacy_ms, "sqlite_commit_ms": sqlite_ms}
+
+def _writer(path: str, worker: int, commits: int):
+    from store import LocalSessionStore
+
+    store = LocalSessionStore(path)
+    session = store.get_session("shared")
+    for i in range(commits):
+        store.commit({**session, "head": f"w{worker}-{i}"}, commit_record(f"w{worker}-{i}", None))
+    store.close()
+
+def concurrent_writers(processes: int, commits: int) -> dict:
+    from store import LocalSessionStore
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "session_store.db")
+        store = LocalSessionStore(path)
+        store.put_session(session_record(0, directory) | {"session_id": "shared"})
+
+        started = time.perf_counter()
+        workers = [multiprocessing.Process(target=_writer, args=(path, w, commits)) for w in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        stored = len(store.get_history("shared"))
+        store.close()
+
+    expected = processes * commits
+    return {
+        "processes": processes,
+        "expected_commits": expected,
+        "stored_commits": stored,
+        "commits_per_second": round(expected / elapsed, 1),
+        "lost_writes": expected - stored
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", nargs="*", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--history", type=int, default=20, help="commits already in each session")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--commits", type=int, default=200, help="commits appended by each process")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    report = {
+        "single_commit": [benchmark_size(n, args.history, args.repeat) for n in args.sessions],
+        "concurrent_writers": concurrent_writers(args.processes, args.commits)
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["concurrent_writers"]["lost_writes"] else 0)
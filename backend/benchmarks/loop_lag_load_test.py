@@ -0,0 +1,133 @@
+"""
+Shows that CHAT requests keep their latency while a heavy CODE request runs.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.loop_lag_load_test --rows 200000 --chats 50
+
+Runs the FastAPI app in-process against the offline stand-ins and the fake
+LLM, measures CHAT latency alone and again while a heavy transform is
+executing, and reports event loop lag for both phases.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+from benchmarks.standins import configure_standin_env, start_standins
+
+HEAVY_CODE = ("df = pd.concat([df] * 10, ignore_index=True)"
+              ".sort_values(list(df.columns)).reset_index(drop=True)")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+def summarise(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "max_ms": round(max(latencies, default=0.0), 1)
+    }
+
+def synthetic_csv(rows: int) -> bytes:
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "group": rng.choice(["a", "b", "c", "d"], size=rows),
+        "value": rng.normal(size=rows),
+        "count": rng.integers(0, 1000, size=rows)
+    })
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue().encode("utf-8")
+
+async def timed_post(client, url, **kwargs):
+    started = time.perf_counter()
+    response = await client.post(url, **kwargs)
+    return (time.perf_counter() - started) * 1000, response
+
+async def run_chats(client, session_id: str, count: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            latency, response = await timed_post(client, "/transform_csv/",
+                                                 data={"session_id": session_id, "query": f"hello {i}"})
+            response.raise_for_status()
+            return latency
+
+    return await asyncio.gather(*[one(i) for i in range(count)])
+
+async def main(args):
+    import httpx
+    from main import app
+    from loop_lag import loop_lag_stats, reset_loop_lag_stats, start_loop_lag_monitor
+
+    aws = await start_standins()
+    start_loop_lag_monitor(threshold_ms=args.lag_threshold_ms)
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://standin", timeout=600) as client:
+            _, response = await timed_post(client, "/create-session/",
+                                           files={"file": ("data.csv", synthetic_csv(args.rows), "text/csv")},
+                                           data={"session_name": "loop-lag"})
+            session_id = response.json()["session_id"]
+
+            # warm the local CSV cache so both phases do the same work
+            await run_chats(client, session_id, 1, 1)
+
+            reset_loop_lag_stats()
+            baseline = await run_chats(client, session_id, args.chats, args.concurrency)
+            baseline_lag = dict(loop_lag_stats)
+
+            reset_loop_lag_stats()
+            heavy = asyncio.create_task(timed_post(client, "/transform_csv/",
+                                                   data={"session_id": session_id,
+                                                         "query": f"CODE: {HEAVY_CODE}"}))
+            await asyncio.sleep(args.heavy_head_start)
+            loaded = await run_chats(client, session_id, args.chats, args.concurrency)
+            heavy_latency, _ = await heavy
+            loaded_lag = dict(loop_lag_stats)
+    finally:
+        aws.stop()
+
+    report = {
+        "rows": args.rows,
+        "chat_baseline": summarise(baseline),
+        "chat_during_heavy_code": summarise(loaded),
+        "heavy_code_ms": round(heavy_latency, 1),
+        "loop_lag_baseline": baseline_lag,
+        "loop_lag_during_heavy_code": loaded_lag
+    }
+    slowdown = report["chat_during_heavy_code"]["p95_ms"] / max(report["chat_baseline"]["p95_ms"], 1.0)
+    report["p95_slowdown"] = round(slowdown, 2)
+    print(json.dumps(report, indent=2))
+
+    return 0 if slowdown <= args.max_slowdown else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--heavy-head-start", type=float, default=0.2)
+    parser.add_argument("--lag-threshold-ms", type=float, default=100)
+    parser.add_argument("--max-slowdown", type=float, default=3.0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    configure_standin_env()
+    os.chdir(os.environ["SESSION_ROOT"])
+    sys.exit(asyncio.run(main(args)))
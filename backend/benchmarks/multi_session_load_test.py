@@ -0,0 +1,371 @@
+"""
+Load generator for many concurrent analysts, each working in their own
+session, to find where the backend saturates and how many workers it needs.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.multi_session_load_test --users 50 --duration 60
+    # realistic LLM latency and a heavier data set
+    python -m benchmarks.multi_session_load_test --users 200 --llm-latency-ms 1500 --rows 200000
+    # worker sizing: the same load on 1, 2 and 4 worker processes
+    python -m benchmarks.multi_session_load_test --users 200 --processes 1 2 4
+    # a running deployment instead of the in-process app
+    python -m benchmarks.multi_session_load_test --base-url http://localhost:8000 --users 20
+
+Every virtual analyst uploads a CSV, then picks actions from --mix with an
+exponential think time between them, as someone at the UI would:
+  chat      CHAT question                       POST /transform_csv/
+  code      CODE transform                      POST /transform_csv/
+  checkout  move HEAD to an earlier commit      POST /transform_csv/
+  branch    branch from an earlier commit       POST /transform_csv/
+  history   poll version and chat history with
+            If-None-Match, like the frontend    GET /version-history, /chat-history
+  files     list the session's artifacts        GET /list_session_files
+Users start spread over --ramp-seconds, and results only count requests
+issued after the ramp.
+
+In-process runs use the offline stand-ins and the fake LLM; set
+--llm-latency-ms to model the provider's latency. With --processes each
+worker process runs its own app and stand-ins and gets an equal share of
+the users. Mongo, Redis and S3 are therefore not shared in that mode, so
+it sizes the app's own CPU and event loop, not the databases. For each
+process count the report gives, per action:
+  - throughput;
+  - latency percentiles;
+  - error rate;
+  - 304 rate for the polls.
+It also reports event-loop lag percentiles and executor queue peaks. The
+load generator shares the event loop with an in-process app, so read the
+lag as an upper bound.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.standins import configure_standin_env, start_standins
+from benchmarks.loop_lag_load_test import percentile, synthetic_csv
+
+DEFAULT_MIX = "chat=45,code=15,checkout=5,branch=5,history=20,files=10"
+
+CODE_SNIPPETS = [
+    "df['value_x2'] = df['value'] * 2",
+    "df = df[df['count'] >= 0]",
+    "df['group'] = df['group'].str.upper()",
+    "summary = df.groupby('group')['value'].describe()\nopen(f'{commit_dir}/summary.txt', 'w').write(summary.to_string())",
+    "df = df.sort_values('value').reset_index(drop=True)",
+]
+
+CHAT_QUESTIONS = [
+    "what columns are there?",
+    "how many rows have a negative value?",
+    "which group is largest?",
+    "summarise the count column",
+]
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {"chat", "code", "checkout", "branch", "history", "files"}
+    if unknown:
+        raise ValueError(f"Unknown actions in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+class Recorder:
+    """Latencies and outcomes per action, counted only after the ramp."""
+
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.not_modified = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    async def timed(self, action: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            failed = response.status_code >= 400
+            detail = f"{response.status_code} {response.text[:200]}" if failed else None
+        except Exception as e:
+            response, failed, detail = None, True, repr(e)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        if started >= self.measure_from:
+            self.latencies[action].append(elapsed)
+            if failed:
+                self.errors[action] += 1
+                if len(self.error_samples[action]) < 3:
+                    self.error_samples[action].append(detail)
+            elif response.status_code == 304:
+                self.not_modified[action] += 1
+        return None if failed else response
+
+class Analyst:
+    """One virtual user and the commits they know about."""
+
+    def __init__(self, client, recorder: Recorder, csv_bytes: bytes, rng: random.Random, weights: dict,
+                 think_ms: float):
+        self.client = client
+        self.recorder = recorder
+        self.csv_bytes = csv_bytes
+        self.rng = rng
+        self.actions = list(weights)
+        self.weights = list(weights.values())
+        self.think_ms = think_ms
+        self.session_id = None
+        self.commits = []
+        self.etags = {}
+
+    async def create(self):
+        response = await self.recorder.timed("create", self.client.post(
+            "/create-session/", files={"file": ("data.csv", self.csv_bytes, "text/csv")},
+            data={"session_name": "load-test"}))
+        if response is None:
+            return False
+        self.session_id = response.json()["session_id"]
+        await self.history()
+        return True
+
+    async def transform(self, action: str, query: str):
+        response = await self.recorder.timed(action, self.client.post(
+            "/transform_csv/", data={"session_id": self.session_id, "query": query}))
+        if response is None:
+            return
+        body = response.json()
+        new_commit = (body.get("commit_data") or {}).get("commit_id") or body.get("head") or body.get("new_head")
+        if new_commit:
+            self.commits.append(new_commit)
+
+    async def chat(self):
+        await self.transform("chat", self.rng.choice(CHAT_QUESTIONS))
+
+    async def code(self):
+        await self.transform("code", f"CODE: {self.rng.choice(CODE_SNIPPETS)}")
+
+    async def checkout(self):
+        if self.commits:
+            await self.transform("checkout", f"CHECKOUT: {self.rng.choice(self.commits)}")
+
+    async def branch(self):
+        if self.commits:
+            await self.transform("branch", f"BRANCH: {self.rng.choice(self.commits)}")
+
+    async def history(self):
+        for path in ("/version-history", "/chat-history"):
+            headers = {"If-None-Match": self.etags[path]} if path in self.etags else {}
+            response = await self.recorder.timed("history", self.client.get(
+                path, params={"session_id": self.session_id}, headers=headers))
+            if response is None or response.status_code == 304:
+                continue
+            if response.headers.get("etag"):
+                self.etags[path] = response.headers["etag"]
+            if path == "/version-history":
+                self.commits = [c["commit_id"] for c in response.json().get("commits", [])] or self.commits
+
+    async def files(self):
+        await self.recorder.timed("files", self.client.get(
+            "/list_session_files", params={"session_id": self.session_id}))
+
+    async def run(self, start_delay: float, deadline: float):
+        await asyncio.sleep(start_delay)
+        if not await self.create():
+            return
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(1000 / self.think_ms) if self.think_ms else 0)
+            if time.perf_counter() >= deadline:
+                break
+            action = self.rng.choices(self.actions, weights=self.weights)[0]
+            await getattr(self, action)()
+
+async def sample_runtime(samples: dict, stop: asyncio.Event, interval: float = 0.05):
+    """Event loop lag and executor queue depth of the in-process app."""
+    from executors import executor_queue_depths
+
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples["loop_lag_ms"].append((time.perf_counter() - started - interval) * 1000)
+        for pool, depth in executor_queue_depths().items():
+            samples["queue_peak"][pool] = max(samples["queue_peak"].get(pool, 0), depth)
+
+async def run_worker(args, users: int, seed: int) -> dict:
+    """Runs users analysts against one app instance; returns raw samples."""
+    import httpx
+
+    rng = random.Random(seed)
+    weights = parse_mix(args.mix)
+    csv_bytes = synthetic_csv(args.rows)
+
+    aws = None
+    if args.base_url:
+        transport, base_url = None, args.base_url
+    else:
+        from main import app
+        aws = await start_standins()
+        transport, base_url = httpx.ASGITransport(app=app), "http://standin"
+
+    runtime = {"loop_lag_ms": [], "queue_peak": {}}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_runtime(runtime, stop)) if aws else None
+
+    started = time.perf_counter()
+    measure_from = started + args.ramp_seconds
+    deadline = measure_from + args.duration
+    recorder = Recorder(measure_from)
+    limits = httpx.Limits(max_connections=users + 10, max_keepalive_connections=users + 10)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout,
+                                     limits=limits) as client:
+            analysts = [Analyst(client, recorder, csv_bytes, random.Random(rng.random()), weights, args.think_ms)
+                        for _ in range(users)]
+            await asyncio.gather(*[a.run(args.ramp_seconds * i / max(users, 1), deadline)
+                                   for i, a in enumerate(analysts)])
+        elapsed = time.perf_counter() - measure_from
+    finally:
+        stop.set()
+        if sampler:
+            await sampler
+        if aws:
+            aws.stop()
+
+    # lag only counts once every user is active
+    skip = int(args.ramp_seconds / 0.05)
+    return {
+        "elapsed_s": elapsed,
+        "latencies": dict(recorder.latencies),
+        "errors": dict(recorder.errors),
+        "not_modified": dict(recorder.not_modified),
+        "error_samples": dict(recorder.error_samples),
+        "loop_lag_ms": runtime["loop_lag_ms"][skip:],
+        "queue_peak": runtime["queue_peak"],
+    }
+
+def _worker_entry(payload):
+    args, users, seed = payload
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    configure_standin_env()
+    os.chdir(os.environ["SESSION_ROOT"])
+    with contextlib.redirect_stdout(sys.stderr):
+        return asyncio.run(run_worker(args, users, seed))
+
+def latency_summary(values: list, elapsed: float) -> dict:
+    return {
+        "count": len(values),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(percentile(values, 50), 1),
+        "p90_ms": round(percentile(values, 90), 1),
+        "p95_ms": round(percentile(values, 95), 1),
+        "p99_ms": round(percentile(values, 99), 1),
+        "max_ms": round(max(values, default=0.0), 1),
+    }
+
+def aggregate(results: list, processes: int, users: int) -> dict:
+    """Merges the samples of every worker process into one report."""
+    # workers run in parallel, so throughput is over the longest of them
+    elapsed = max(r["elapsed_s"] for r in results)
+    actions = sorted({a for r in results for a in r["latencies"]})
+    per_action = {}
+    all_latencies, total_errors = [], 0
+    for action in actions:
+        values = [v for r in results for v in r["latencies"].get(action, [])]
+        errors = sum(r["errors"].get(action, 0) for r in results)
+        not_modified = sum(r["not_modified"].get(action, 0) for r in results)
+        summary = latency_summary(values, elapsed)
+        summary["errors"] = errors
+        summary["error_rate"] = round(errors / len(values), 4) if values else 0
+        if not_modified:
+            summary["not_modified_rate"] = round(not_modified / len(values), 4)
+        samples = [s for r in results for s in r["error_samples"].get(action, [])][:3]
+        if samples:
+            summary["error_samples"] = samples
+        per_action[action] = summary
+        all_latencies += values
+        total_errors += errors
+
+    lag = [v for r in results for v in r["loop_lag_ms"]]
+    queue_peak = {}
+    for r in results:
+        for pool, depth in r["queue_peak"].items():
+            queue_peak[pool] = max(queue_peak.get(pool, 0), depth)
+
+    report = {
+        "processes": processes,
+        "users": users,
+        "measured_seconds": round(elapsed, 1),
+        "overall": {**latency_summary(all_latencies, elapsed),
+                    "errors": total_errors,
+                    "error_rate": round(total_errors / len(all_latencies), 4) if all_latencies else 0},
+        "actions": per_action,
+    }
+    if lag:
+        report["event_loop_lag_ms"] = {
+            "p50": round(percentile(lag, 50), 1),
+            "p99": round(percentile(lag, 99), 1),
+            "max": round(max(lag), 1),
+            "over_100ms": sum(1 for v in lag if v > 100),
+        }
+        report["executor_queue_peak"] = queue_peak
+    return report
+
+def run_load(args, processes: int) -> dict:
+    shares = [args.users // processes + (1 if i < args.users % processes else 0) for i in range(processes)]
+    payloads = [(args, users, args.seed + i) for i, users in enumerate(shares) if users]
+    if processes == 1:
+        results = [asyncio.run(run_worker(args, payloads[0][1], payloads[0][2]))]
+    else:
+        # spawn: each worker imports the app fresh, with its own stand-ins
+        with multiprocessing.get_context("spawn").Pool(len(payloads)) as pool:
+            results = pool.map(_worker_entry, payloads)
+    return aggregate(results, processes, args.users)
+
+def main(args) -> int:
+    if args.llm_latency_ms is not None:
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    if args.base_url and args.processes != [1]:
+        raise SystemExit("--processes only applies to the in-process app; scale the server behind --base-url instead")
+
+    # app logging goes to stderr so the report on stdout stays parseable
+    with contextlib.redirect_stdout(sys.stderr):
+        runs = [run_load(args, processes) for processes in args.processes]
+    report = {
+        "config": {"users": args.users, "duration_s": args.duration, "ramp_s": args.ramp_seconds,
+                   "think_ms": args.think_ms, "mix": parse_mix(args.mix), "rows": args.rows,
+                   "llm_latency_ms": float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+                   "target": args.base_url or "in-process"},
+        "runs": runs,
+    }
+    print(json.dumps(report, indent=2))
+
+    worst = max(run["overall"]["error_rate"] for run in runs)
+    return 0 if worst <= args.max_error_rate else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds after the ramp")
+    parser.add_argument("--ramp-seconds", type=float, default=5)
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between a user's actions")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="action weights")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in each uploaded CSV")
+    parser.add_argument("--llm-latency-ms", type=float, default=None, help="fake LLM latency per call")
+    parser.add_argument("--processes", type=int, nargs="*", default=[1],
+                        help="worker process counts to run the same load on")
+    parser.add_argument("--base-url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    configure_standin_env()
+    os.chdir(os.environ["SESSION_ROOT"])
+    sys.exit(main(args))
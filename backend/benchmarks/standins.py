@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+STANDIN_BUCKET = "cellcraft-standin"
+
+def configure_standin_env(session_root: str = None) -> str:
+    """
+    Points the app at offline stand-ins. Must run before the app modules are
+    imported, since they read their settings at import time.
+    """
+    session_root = session_root or tempfile.mkdtemp(prefix="cellcraft-standin-")
+    os.makedirs(session_root, exist_ok=True)
+
+    os.environ["SESSION_ROOT"] = session_root
+    os.environ.setdefault("S3_BUCKET_NAME", STANDIN_BUCKET)
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    os.environ.setdefault("GEMINI_API_KEY", "standin")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "standin")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "standin")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    return session_root
+
+async def start_standins():
+    """
+    In-memory Mongo (mongomock-motor), Redis (fakeredis) and S3 (moto),
+    wired into the same globals the real init_* functions populate.
+    Returns the moto mock so the caller can stop it.
+    """
+    import boto3
+    import fakeredis
+    from moto import mock_aws
+    from mongomock_motor import AsyncMongoMockClient
+    from beanie import init_beanie
+
+    import s3_init
+    import redis_init
+    from models.commit import Commit
+    from models.session import Session
+    from models.checkpoint import Checkpoint
+
+    aws = mock_aws()
+    aws.start()
+
+    s3_init.s3 = boto3.client("s3", region_name=os.environ["AWS_DEFAULT_REGION"])
+    s3_init.s3.create_bucket(Bucket=os.environ["S3_BUCKET_NAME"])
+
+    redis_init.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    client = AsyncMongoMockClient()
+    await init_beanie(database=client["CellCraftAI"],
+                      document_models=[Commit, Session, Checkpoint])
+
+    return aws
@@ -0,0 +1,103 @@
+"""
+Prints the span tree of one upload and a few transform requests, to see
+where a request spends its time without a tracing backend.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.trace_transform --rows 50000
+    python -m benchmarks.trace_transform --query "CODE: df['total'] = df['value'] * 2" --query "hello"
+
+Runs the FastAPI app in-process against the offline stand-ins and the fake
+LLM with the in-memory span exporter. Every request becomes one trace;
+each span is printed with its duration and its cellcraft.* / cache.* / llm.*
+/ executor.* attributes, and --json dumps the same spans as JSON.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+
+from benchmarks.standins import configure_standin_env, start_standins
+from benchmarks.loop_lag_load_test import synthetic_csv
+
+SHOWN_PREFIXES = ("cellcraft.", "cache.", "llm.", "executor.", "http.")
+
+def span_records(spans) -> list:
+    return [{
+        "name": span.name,
+        "trace_id": format(span.context.trace_id, "032x"),
+        "span_id": format(span.context.span_id, "016x"),
+        "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+        "start_ns": span.start_time,
+        "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+        "attributes": {k: v for k, v in (span.attributes or {}).items() if k.startswith(SHOWN_PREFIXES)}
+    } for span in spans]
+
+def print_tree(records: list):
+    children = {}
+    for record in records:
+        children.setdefault(record["parent_id"], []).append(record)
+
+    def walk(record, depth):
+        attributes = " ".join(f"{k}={v}" for k, v in record["attributes"].items())
+        print(f"{'  ' * depth}{record['name']:<{60 - 2 * depth}} {record['duration_ms']:>10.2f} ms  {attributes}")
+        for child in sorted(children.get(record["span_id"], []), key=lambda r: r["start_ns"]):
+            walk(child, depth + 1)
+
+    for root in sorted(children.get(None, []), key=lambda r: r["start_ns"]):
+        walk(root, 0)
+        print()
+
+async def main(args):
+    import tracing
+    from main import app
+
+    # startup chatter goes to stderr so --json output stays parseable
+    with contextlib.redirect_stdout(sys.stderr):
+        await run_requests(args, app, tracing)
+
+    records = span_records(tracing.memory_exporter.get_finished_spans())
+    if args.json:
+        print(json.dumps(records, indent=2))
+    else:
+        print_tree(records)
+    return 0
+
+async def run_requests(args, app, tracing):
+    import httpx
+
+    tracing.init_tracing("memory", args.sample_ratio)
+    aws = await start_standins()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://standin",
+                                     timeout=600) as client:
+            response = await client.post("/create-session/",
+                                         files={"file": ("data.csv", synthetic_csv(args.rows), "text/csv")},
+                                         data={"session_name": "trace"})
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+
+            for query in args.query:
+                response = await client.post("/transform_csv/", data={"session_id": session_id, "query": query})
+                if response.status_code >= 400:
+                    print(f"{query!r} failed: {response.status_code} {response.text[:200]}", file=sys.stderr)
+    finally:
+        aws.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--query", action="append", default=None,
+                        help="transform query, repeatable (default: one CODE and one CHAT)")
+    parser.add_argument("--sample-ratio", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="print spans as JSON instead of a tree")
+    args = parser.parse_args()
+    args.query = args.query or ["CODE: df['double'] = df['value'] * 2", "hello"]
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ["LLM_PROVIDER"] = "fake"
+    configure_standin_env()
+    os.chdir(os.environ["SESSION_ROOT"])
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+class LocalTTLCache:
+    """
+    Small in-process LRU where every entry carries its own deadline.
+    Not thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, deadline = entry
+        if deadline <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, deadline: float):
+        if deadline <= time.time():
+            return
+
+        self._entries[key] = (value, deadline)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
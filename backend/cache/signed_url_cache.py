@@ -1,31 +1,153 @@
 from redis_init import get_redis_cache
 from storage.storage_utils import (generate_presigned_get_url,
+                                   generate_presigned_get_urls,
                                    generate_presigned_post_url)
-from typing import Literal
+from cache.local_ttl_cache import LocalTTLCache
+from tracing import traced
+from opentelemetry import trace
+from typing import Literal, List, Dict
+import asyncio
+import json
+import os
+import time
 import traceback
 
-CACHE_EXPIRY_SECONDS = 3600
+# lifetime of the presigned url itself
+URL_EXPIRY_SECONDS = int(os.getenv("SIGNED_URL_EXPIRY_SECONDS", "3600"))
+# cached urls are never handed out with less than this much lifetime left
+REFRESH_MARGIN_SECONDS = int(os.getenv("SIGNED_URL_REFRESH_MARGIN_SECONDS", "600"))
+LOCAL_CACHE_SIZE = int(os.getenv("SIGNED_URL_LOCAL_CACHE_SIZE", "4096"))
 
+local_url_cache = LocalTTLCache(maxsize=LOCAL_CACHE_SIZE)
+
+# in-flight signings, so concurrent misses on one key share a single presign
+_inflight: Dict[str, asyncio.Future] = {}
+
+def _cache_key(bucket: str, s3_file_path: str, method: str) -> str:
+    return f"signed_url:{method}:{bucket}:{s3_file_path}"
+
+def _usable_until(expires_at: float) -> float:
+    return expires_at - REFRESH_MARGIN_SECONDS
+
+def _decode(raw: str):
+    try:
+        entry = json.loads(raw)
+        return entry["url"], entry["expires_at"]
+    except (ValueError, KeyError, TypeError):
+        # entries written before the value carried its expiry
+        return None, 0
+
+async def _sign(bucket: str, s3_file_path: str, method: str):
+    if method == "GET":
+        return await generate_presigned_get_url(bucket, s3_file_path, URL_EXPIRY_SECONDS)
+    elif method == "POST":
+        return await generate_presigned_post_url(bucket, s3_file_path, URL_EXPIRY_SECONDS)
+    raise ValueError(f"Invalid Method: {method} for get_signed_url()")
+
+async def _store(redis, entries: Dict[str, tuple]):
+    """
+    entries maps cache key -> (signed url, expires_at). Writes both tiers;
+    the Redis TTL stops at the refresh margin so stale urls are never served.
+    """
+    ttl = max(URL_EXPIRY_SECONDS - REFRESH_MARGIN_SECONDS, 1)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, (url, expires_at) in entries.items():
+            local_url_cache.set(key, url, _usable_until(expires_at))
+            pipe.setex(key, ttl, json.dumps({"url": url, "expires_at": expires_at}))
+        await pipe.execute()
+
+@traced()
 async def get_signed_url(bucket:str, s3_file_path:str, method:Literal["GET","POST"]="GET"):
+    key = _cache_key(bucket, s3_file_path, method)
+
+    span = trace.get_current_span()
+    cached_url = local_url_cache.get(key)
+    if cached_url:
+        span.set_attribute("cache.tier", "local")
+        return cached_url
+
+    if key in _inflight:
+        span.set_attribute("cache.tier", "inflight")
+        return await asyncio.shield(_inflight[key])
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
     try:
         redis = get_redis_cache()
 
-        cached_url = await redis.get(s3_file_path)
-        if cached_url:
-            # print("Returning cached url")
-            return cached_url
-        
-        signed_url = None
-        if method == "GET":
-            signed_url = await generate_presigned_get_url(bucket, s3_file_path, CACHE_EXPIRY_SECONDS)
-        elif method == "POST":
-            signed_url = await generate_presigned_post_url(bucket, s3_file_path, CACHE_EXPIRY_SECONDS)
-        else:
-            raise ValueError(f"Invalid Method: {method} for get_signed_url()")
-
-        await redis.setex(s3_file_path, CACHE_EXPIRY_SECONDS, signed_url)
+        raw = await redis.get(key)
+        if raw:
+            url, expires_at = _decode(raw)
+            if url and _usable_until(expires_at) > time.time():
+                local_url_cache.set(key, url, _usable_until(expires_at))
+                span.set_attribute("cache.tier", "redis")
+                future.set_result(url)
+                return url
+
+        span.set_attribute("cache.tier", "signed")
+        expires_at = time.time() + URL_EXPIRY_SECONDS
+        signed_url = await _sign(bucket, s3_file_path, method)
 
+        if signed_url:
+            await _store(redis, {key: (signed_url, expires_at)})
+
+        future.set_result(signed_url)
         return signed_url
     except Exception as e:
         print(e)
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        future.set_result(None)
+    finally:
+        # also settled when this request is cancelled, or its waiters hang
+        if not future.done():
+            future.set_result(None)
+        _inflight.pop(key, None)
+
+@traced()
+async def get_signed_urls(bucket:str, s3_file_paths:List[str]) -> Dict[str, str]:
+    """
+    Batch variant of get_signed_url for GET urls: the in-process tier first,
+    one MGET for the rest, local presigning for the misses and one pipelined
+    round-trip of SETEX.
+    """
+    paths = list(dict.fromkeys(s3_file_paths))
+    keys = {path: _cache_key(bucket, path, "GET") for path in paths}
+
+    signed_urls = {}
+    for path in paths:
+        cached_url = local_url_cache.get(keys[path])
+        if cached_url:
+            signed_urls[path] = cached_url
+
+    remaining = [path for path in paths if path not in signed_urls]
+    span = trace.get_current_span()
+    span.set_attributes({"cache.requested": len(paths), "cache.local_hits": len(paths) - len(remaining)})
+    if not remaining:
+        return signed_urls
+
+    try:
+        redis = get_redis_cache()
+
+        now = time.time()
+        for path, raw in zip(remaining, await redis.mget([keys[p] for p in remaining])):
+            if not raw:
+                continue
+            url, expires_at = _decode(raw)
+            if url and _usable_until(expires_at) > now:
+                local_url_cache.set(keys[path], url, _usable_until(expires_at))
+                signed_urls[path] = url
+
+        misses = [path for path in remaining if path not in signed_urls]
+        span.set_attribute("cache.redis_hits", len(remaining) - len(misses))
+        if misses:
+            expires_at = time.time() + URL_EXPIRY_SECONDS
+            fresh_urls = await generate_presigned_get_urls(bucket, misses, URL_EXPIRY_SECONDS)
+            await _store(redis, {keys[path]: (url, expires_at) for path, url in fresh_urls.items()})
+            signed_urls.update(fresh_urls)
+
+        return signed_urls
+    except Exception as e:
+        print(e)
+        traceback.print_exc()
+        return signed_urls
@@ -0,0 +1,116 @@
+from redis_init import get_redis_cache
+from cache.local_ttl_cache import LocalTTLCache
+from fastapi.responses import JSONResponse, Response
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import time
+import traceback
+
+# how long a finished transform is replayed to a retry under the same idempotency key
+REPLAY_TTL_SECONDS = int(os.getenv("TRANSFORM_REPLAY_TTL_SECONDS", "120"))
+LOCAL_CACHE_SIZE = int(os.getenv("TRANSFORM_REPLAY_LOCAL_CACHE_SIZE", "1024"))
+
+REPLAYED_HEADER = "Idempotency-Replayed"
+
+local_result_cache = LocalTTLCache(maxsize=LOCAL_CACHE_SIZE)
+
+# running transforms by submission key -> (query, future of (status, body))
+_inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+def submission_key(session_id: str, head: Optional[str], query: str, idempotency_key: Optional[str]) -> str:
+    """
+    With an idempotency key the key alone names the submission, so a retry
+    still replays after HEAD moved on; without one, identical text against
+    the same HEAD does, but only while it is running.
+    """
+    if idempotency_key:
+        fingerprint = f"key\0{idempotency_key}"
+    else:
+        fingerprint = f"head\0{head}\0{query}"
+    digest = hashlib.sha256(fingerprint.encode()).hexdigest()[:32]
+    return f"transform_result:{session_id}:{digest}"
+
+def _response(status_code: int, body: bytes) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json",
+                    headers={REPLAYED_HEADER: "true"})
+
+def _key_reused(query: str) -> JSONResponse:
+    return JSONResponse(content={"error": f"Idempotency key already used for another query than {query!r}"},
+                        status_code=422)
+
+async def _lookup(key: str) -> Optional[dict]:
+    entry = local_result_cache.get(key)
+    if entry:
+        return entry
+    try:
+        raw = await get_redis_cache().get(key)
+        if raw:
+            entry = json.loads(raw)
+            local_result_cache.set(key, entry, entry["expires_at"])
+            return entry
+    except Exception as e:
+        print(f"Transform result lookup failed for {key}:", e)
+    return None
+
+async def _store(key: str, query: str, status_code: int, body: bytes):
+    expires_at = time.time() + REPLAY_TTL_SECONDS
+    entry = {"query": query, "status": status_code, "body": body.decode(), "expires_at": expires_at}
+    local_result_cache.set(key, entry, expires_at)
+    try:
+        await get_redis_cache().setex(key, REPLAY_TTL_SECONDS, json.dumps(entry))
+    except Exception as e:
+        print(f"Transform result store failed for {key}:", e)
+
+async def replayed_result(key: str, query: str) -> Optional[Response]:
+    """The stored response of a finished submission, if it is still retained."""
+    entry = await _lookup(key)
+    if entry is None:
+        return None
+    if entry["query"] != query:
+        return _key_reused(entry["query"])
+    return _response(entry["status"], entry["body"].encode())
+
+async def coalesce_transform(key: str, query: str, run: Callable[[], Awaitable[Response]],
+                             retain: bool) -> Tuple[Response, str]:
+    """
+    Runs run() once per submission key: concurrent duplicates wait for the
+    running one and get its response. With retain (the client sent an
+    idempotency key) later ones replay it too, for REPLAY_TTL_SECONDS; a
+    key-less resubmission after it finished is a new request and runs again.
+    Only responses below 400 are retained, so a failed submission can be
+    retried. Returns the response and how it was served: "run", "inflight",
+    "replay" or "rejected" (idempotency key reused for another query).
+    """
+    if key in _inflight:
+        running_query, future = _inflight[key]
+        if running_query != query:
+            return _key_reused(running_query), "rejected"
+        status_code, body = await asyncio.shield(future)
+        return _response(status_code, body), "inflight"
+
+    # registered before the first await, so a duplicate arriving meanwhile waits on it
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = (query, future)
+    try:
+        served = "replay"
+        response = await replayed_result(key, query) if retain else None
+        if response is None:
+            served = "run"
+            response = await run()
+            if retain and response.status_code < 400:
+                await _store(key, query, response.status_code, response.body)
+        elif response.status_code == 422:
+            served = "rejected"
+        future.set_result((response.status_code, response.body))
+        return response, served
+    except BaseException as e:
+        traceback.print_exc()
+        future.set_exception(e if isinstance(e, Exception) else RuntimeError("Transform was cancelled"))
+        # nobody may be waiting; keep asyncio from logging it as unretrieved
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
@@ -1,22 +1,31 @@
 from models.checkpoint import Checkpoint
 from models.commit import Commit, GeneratedFile
 from models.DocumentMetaData import MetaData
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from bson import ObjectId
 from datetime import datetime
 from pymongo import ASCENDING, DESCENDING
 from controllers.CommitController import (create_commit,
-                                          get_commits)
+                                          get_commits,
+                                          get_commit_by_id)
+from controllers.CommitGraphController import backfill_commit_graph
+from controllers.SessionController import add_session_llm_usage
 from services.langchain_chain import history_summary_chain
+from services.llm_usage import ainvoke_metered
+from tracing import traced
 
 CHECKPOINT_THRESHOLD = 5
 
 # === Create a checkpoint ===
+@traced()
 async def create_checkpoint(
     session_id: str,
     summary: str,
     commit_ids: List[str],
-    parent_checkpoint: Optional[str] = None
+    parent_checkpoint: Optional[str] = None,
+    commit_id: Optional[str] = None,
+    depth: int = 0,
+    llm_usage: Optional[dict] = None
 ) -> Checkpoint:
     now = datetime.utcnow()
     meta_data = MetaData(created_at=now, last_updated_at=now)
@@ -28,11 +37,15 @@ async def create_checkpoint(
         summary=summary,
         commit_ids=commit_ids,
         parent_checkpoint=parent_checkpoint,
+        commit_id=commit_id,
+        depth=depth,
+        llm_usage=llm_usage,
         meta_data=meta_data
     )
     return await checkpoint.insert()
 
 # === Get checkpoint by ID ===
+@traced()
 async def get_checkpoint_by_id(checkpoint_id: str) -> Optional[Checkpoint]:
     try:
         oid = ObjectId(checkpoint_id)
@@ -41,6 +54,7 @@ async def get_checkpoint_by_id(checkpoint_id: str) -> Optional[Checkpoint]:
     return await Checkpoint.find_one(Checkpoint.checkpoint_id == oid)
 
 # === Get latest checkpoint for session ===
+@traced()
 async def get_latest_checkpoint_by_session_id(session_id: str) -> Optional[Checkpoint]:
     try:
         sid = ObjectId(session_id)
@@ -49,7 +63,44 @@ async def get_latest_checkpoint_by_session_id(session_id: str) -> Optional[Check
 
     return await Checkpoint.find(Checkpoint.session_id == sid).sort("-timestamp").first_or_none()
 
+# === Nearest checkpoint on a commit path ===
+@traced()
+async def get_path_checkpoint(path: List[str]) -> Optional[Checkpoint]:
+    """
+    The deepest checkpoint taken at one of the commits in path (root first).
+    Checkpoints of other branches are never on the path, so they never apply.
+    """
+    if not path:
+        return None
+    return await Checkpoint.find({"commit_id": {"$in": path}, "meta_data.deleted_at": None}) \
+        .sort([("depth", DESCENDING)]).first_or_none()
+
+# === Checkpoint + commits since it on the path to commit_id ===
+@traced()
+async def get_path_context(session_id: str, commit_id: Optional[str]) -> Tuple[Optional[Checkpoint], List[Commit]]:
+    """
+    What the prompt needs to know about how HEAD came to be: the nearest
+    ancestor checkpoint and the commits between it and commit_id, in order.
+    """
+    commit = await get_commit_by_id(commit_id) if commit_id else None
+    if not commit:
+        return None, []
+
+    if commit.parent_commit and not commit.ancestors:
+        # legacy commit from before the graph index
+        await backfill_commit_graph(session_id)
+        commit = await get_commit_by_id(commit_id)
+
+    path = commit.ancestors + [commit_id]
+    checkpoint = await get_path_checkpoint(path)
+    if checkpoint:
+        path = path[path.index(checkpoint.commit_id) + 1:]
+
+    commits = await get_commits(session_id, commit_ids=path) if path else []
+    return checkpoint, sorted(commits, key=lambda c: c.depth)
+
 # === List all checkpoints for session ===
+@traced()
 async def list_checkpoints_by_session_id(session_id: str, descending: bool = True) -> List[Checkpoint]:
     try:
         sid = ObjectId(session_id)
@@ -60,6 +111,7 @@ async def list_checkpoints_by_session_id(session_id: str, descending: bool = Tru
     return await Checkpoint.find(Checkpoint.session_id == sid).sort(ordering).to_list()
 
 # === Update checkpoint ===
+@traced()
 async def update_checkpoint(
     checkpoint_id: str,
     summary: Optional[str] = None,
@@ -82,6 +134,7 @@ async def update_checkpoint(
     return checkpoint
 
 # === Soft delete checkpoint ===
+@traced()
 async def delete_checkpoint(checkpoint_id: str) -> bool:
     checkpoint = await get_checkpoint_by_id(checkpoint_id)
     if not checkpoint:
@@ -91,6 +144,7 @@ async def delete_checkpoint(checkpoint_id: str) -> bool:
     await checkpoint.save()
     return True
 
+@traced()
 async def create_commit_with_checkpoint(
     session_id: str,
     query: str,
@@ -101,7 +155,8 @@ async def create_commit_with_checkpoint(
     generated_files: Optional[List[GeneratedFile]] = None,
     mode: str = "CODE",
     success: bool = True,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    llm_usage: Optional[dict] = None
 ):
     # 1. Create the new commit as usual
     commit_doc = await create_commit(
@@ -114,50 +169,44 @@ async def create_commit_with_checkpoint(
         code=code,
         generated_files=generated_files or [],
         success=success,
-        error=error
+        error=error,
+        llm_usage=llm_usage
     )
 
-    # 2. Get the latest checkpoint for the session
-    latest_checkpoint = await get_latest_checkpoint_by_session_id(session_id)
-
-    if latest_checkpoint:
-        # 3. Append this commit to the latest checkpoint
-        latest_checkpoint.commit_ids.append(str(commit_doc.commit_id))
-        latest_checkpoint.meta_data.last_updated_at = datetime.utcnow()
-        await latest_checkpoint.save()
-
-        # 4. Check if threshold exceeded → summarize and create new checkpoint
-        if len(latest_checkpoint.commit_ids) >= CHECKPOINT_THRESHOLD:
-            # Fetch the actual commit docs to build the summary
-            commits_to_summarize = await get_commits(session_id, commit_ids=latest_checkpoint.commit_ids)
-            combined_key_steps = "\n".join([c.key_steps for c in commits_to_summarize if c.key_steps])
-
-            full_history=f"{latest_checkpoint.summary}\n{combined_key_steps}"
-
-            if not full_history:
-                full_history = "No significant transformations yet."
-
-            # LangChain summarization call
-            summary_response = await history_summary_chain.ainvoke({
-                "full_history": full_history
-            })
-            condensed_summary = summary_response.content.strip()
-
-            # Create new checkpoint with empty queue
-            await create_checkpoint(
-                session_id=session_id,
-                summary=condensed_summary,
-                commit_ids=[],  # Starts fresh
-                parent_checkpoint=str(latest_checkpoint.id)
-            )
-
-    else:
-        # 5. No checkpoint exists → create the first checkpoint with this commit
+    commit_id = str(commit_doc.commit_id)
+
+    # 2. Nearest checkpoint on this commit's path, and the commits after it
+    path = commit_doc.ancestors + [commit_id]
+    latest_checkpoint = await get_path_checkpoint(path)
+    pending = path[path.index(latest_checkpoint.commit_id) + 1:] if latest_checkpoint else path
+
+    # 3. Threshold exceeded → summarize and checkpoint at this commit
+    if len(pending) >= CHECKPOINT_THRESHOLD:
+        # Fetch the actual commit docs to build the summary
+        commits_to_summarize = sorted(await get_commits(session_id, commit_ids=pending), key=lambda c: c.depth)
+        combined_key_steps = "\n".join([c.key_steps for c in commits_to_summarize if c.key_steps])
+
+        previous_summary = latest_checkpoint.summary if latest_checkpoint else ""
+        full_history = f"{previous_summary}\n{combined_key_steps}".strip()
+
+        if not full_history:
+            full_history = "No significant transformations yet."
+
+        # LangChain summarization call
+        summary_response, summary_usage = await ainvoke_metered(history_summary_chain, {
+            "full_history": full_history
+        }, stage="summary")
+        condensed_summary = summary_response.content.strip()
+        await add_session_llm_usage(session_id, summary_usage)
+
         await create_checkpoint(
             session_id=session_id,
-            summary=f"Initial step: {key_steps or 'No description.'}",
-            commit_ids=[str(commit_doc.commit_id)],
-            parent_checkpoint=None
+            summary=condensed_summary,
+            commit_ids=pending,
+            parent_checkpoint=str(latest_checkpoint.checkpoint_id) if latest_checkpoint else None,
+            commit_id=commit_id,
+            depth=commit_doc.depth,
+            llm_usage=summary_usage
         )
 
-    return commit_doc
\ No newline at end of file
+    return commit_doc
@@ -2,13 +2,17 @@
 
 from models.commit import Commit, GeneratedFile
 from models.DocumentMetaData import MetaData
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from bson import ObjectId
 from datetime import datetime
 from beanie.operators import RegEx
 from pymongo import ASCENDING, DESCENDING
+from tracing import traced
+from controllers.CommitGraphController import (resolve_commit_path,
+                                               backfill_commit_graph)
 
 # === Create a commit ===
+@traced()
 async def create_commit(
     session_id: str,
     query: str,
@@ -20,16 +24,20 @@ async def create_commit(
     parent_commit: Optional[str] = None,
     generated_files: Optional[List[GeneratedFile]] = None,
     success: bool = True,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    llm_usage: Optional[dict] = None
 ) -> Commit:
     now = datetime.utcnow()
     meta_data = MetaData(created_at=now, last_updated_at=now)
     oid = ObjectId()
+    ancestors, depth = await resolve_commit_path(session_id, parent_commit)
 
     commit = Commit(
         id=oid,
         commit_id=oid,
         session_id=ObjectId(session_id),
+        ancestors=ancestors,
+        depth=depth,
         query=query,
         mode=mode,
         timestamp=timestamp or now.isoformat(),
@@ -40,12 +48,14 @@ async def create_commit(
         generated_files=generated_files or [],
         success=success,
         error=error,
+        llm_usage=llm_usage,
         meta_data=meta_data
     )
     return await commit.insert()
 
 
 # === Get commit by ID ===
+@traced()
 async def get_commit_by_id(commit_id: str) -> Optional[Commit]:
     try:
         oid = ObjectId(commit_id)
@@ -54,7 +64,19 @@ async def get_commit_by_id(commit_id: str) -> Optional[Commit]:
     return await Commit.find_one(Commit.commit_id == oid)
 
 
+# === Root commit of a session (the initial upload) ===
+@traced()
+async def get_initial_commit(session_id: str) -> Optional[Commit]:
+    try:
+        sid = ObjectId(session_id)
+    except Exception:
+        return None
+    return await Commit.find({"session_id": sid, "parent_commit": None}) \
+        .sort([("_id", ASCENDING)]).first_or_none()
+
+
 # === Update a commit ===
+@traced()
 async def update_commit(
     commit_id: str,
     query: Optional[str] = None,
@@ -65,7 +87,15 @@ async def update_commit(
     parent_commit: Optional[str] = None,
     generated_files: Optional[List[GeneratedFile]] = None,
     success: Optional[bool] = None,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    csv_format: Optional[dict] = None,
+    dtype_report: Optional[dict] = None,
+    diff_summary: Optional[dict] = None,
+    content_hash: Optional[str] = None,
+    snapshot_kind: Optional[str] = None,
+    replay_verified: Optional[bool] = None,
+    llm_usage: Optional[dict] = None,
+    exec_profile: Optional[dict] = None
 ) -> Optional[Commit]:
     commit = await get_commit_by_id(commit_id)
     if not commit:
@@ -81,6 +111,7 @@ async def update_commit(
         commit.key_steps = key_steps
     if code is not None:
         commit.code = code
+    reparented = parent_commit is not None and parent_commit != commit.parent_commit
     if parent_commit is not None:
         commit.parent_commit = parent_commit
     if generated_files is not None:
@@ -89,13 +120,35 @@ async def update_commit(
         commit.success = success
     if error is not None:
         commit.error = error
+    if csv_format is not None:
+        commit.csv_format = csv_format
+    if dtype_report is not None:
+        commit.dtype_report = dtype_report
+    if diff_summary is not None:
+        commit.diff_summary = diff_summary
+    if content_hash is not None:
+        commit.content_hash = content_hash
+    if snapshot_kind is not None:
+        commit.snapshot_kind = snapshot_kind
+    if replay_verified is not None:
+        commit.replay_verified = replay_verified
+    if llm_usage is not None:
+        commit.llm_usage = llm_usage
+    if exec_profile is not None:
+        commit.exec_profile = exec_profile
 
     commit.meta_data.last_updated_at = datetime.utcnow()
     await commit.save()
+
+    if reparented:
+        # moving a commit invalidates the materialised paths below it
+        await backfill_commit_graph(str(commit.session_id))
+        commit = await get_commit_by_id(commit_id)
     return commit
 
 
 # === Soft delete a commit ===
+@traced()
 async def delete_commit(commit_id: str) -> bool:
     commit = await get_commit_by_id(commit_id)
     if not commit:
@@ -108,6 +161,7 @@ async def delete_commit(commit_id: str) -> bool:
     return True
 
 # === Query commits with filters, pagination, and sorting ===
+@traced()
 async def query_commits(
     commit_id: Optional[str] = None,
     session_id: Optional[str] = None,
@@ -149,6 +203,7 @@ async def query_commits(
 
     return await Commit.find(query).sort(ordering).skip(skip).limit(limit).to_list()
 
+@traced()
 async def get_commits_by_session_id(session_id: str,
                                     descending: bool=True)->List[Commit]:
     query = {}
@@ -160,6 +215,7 @@ async def get_commits_by_session_id(session_id: str,
 
     return await Commit.find(query).sort(ordering).to_list()
 
+@traced()
 async def get_commits(
     session_id: str,
     since_timestamp: Optional[str] = None,
@@ -182,3 +238,48 @@ async def get_commits(
 
     commits = await Commit.find(query).sort("timestamp").to_list()
     return commits
+
+# === Projected commit listing with keyset pagination on (timestamp, _id) ===
+@traced()
+async def query_commit_fields(
+    session_id: str,
+    fields: List[str],
+    after: Optional[Tuple[str, str]] = None,
+    since: Optional[datetime] = None,
+    limit: int = 100
+) -> List[dict]:
+    query = {"session_id": ObjectId(session_id)}
+
+    if since is not None:
+        # deltas must also surface soft deletes, so keep deleted rows
+        query["meta_data.last_updated_at"] = {"$gt": since}
+    else:
+        query["is_deleted"] = False
+
+    if after:
+        after_timestamp, after_id = after
+        query["$or"] = [
+            {"timestamp": {"$gt": after_timestamp}},
+            {"timestamp": after_timestamp, "_id": {"$gt": ObjectId(after_id)}}
+        ]
+
+    projection = {field: 1 for field in fields}
+    projection.update({"commit_id": 1, "timestamp": 1, "_id": 0})
+    if since is not None:
+        projection["is_deleted"] = 1
+
+    cursor = Commit.get_motor_collection().find(query, projection) \
+        .sort([("timestamp", ASCENDING), ("_id", ASCENDING)]).limit(limit)
+    return await cursor.to_list(length=limit)
+
+# === Generated files of every commit in a session ===
+@traced()
+async def get_generated_files_by_session_id(session_id: str) -> List[dict]:
+    query = {
+        "session_id": ObjectId(session_id),
+        "is_deleted": False,
+        "generated_files.0": {"$exists": True}
+    }
+    cursor = Commit.get_motor_collection().find(query, {"commit_id": 1, "generated_files": 1, "_id": 0}) \
+        .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+    return await cursor.to_list(length=None)
@@ -0,0 +1,170 @@
+# controllers/CommitGraphController.py
+
+from models.commit import Commit, CommitDagNode, CommitPath
+from typing import Optional, List, Dict, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from tracing import traced
+
+# === Resolve the materialised path for a new child of parent_commit ===
+@traced()
+async def resolve_commit_path(session_id: str,
+                              parent_commit: Optional[str]) -> Tuple[List[str], int]:
+    """
+    Returns (ancestors, depth) for a commit whose parent is parent_commit.
+    Legacy parents that predate the graph index are backfilled on the way.
+    """
+    try:
+        parent_oid = ObjectId(parent_commit)
+    except Exception:
+        return [], 0
+
+    parent = await Commit.find_one(Commit.commit_id == parent_oid)
+    if not parent:
+        return [], 0
+
+    if parent.parent_commit and not parent.ancestors:
+        await backfill_commit_graph(session_id)
+        parent = await Commit.find_one(Commit.commit_id == parent_oid)
+
+    return parent.ancestors + [parent_commit], parent.depth + 1
+
+# === Rebuild ancestors/depth for every commit in a session ===
+@traced()
+async def backfill_commit_graph(session_id: str) -> int:
+    sid = ObjectId(session_id)
+    collection = Commit.get_motor_collection()
+
+    parents: Dict[str, Optional[str]] = {}
+    async for doc in collection.find({"session_id": sid},
+                                     {"commit_id": 1, "parent_commit": 1}):
+        parents[str(doc["commit_id"])] = doc.get("parent_commit")
+
+    paths: Dict[str, List[str]] = {}
+
+    def path_of(commit_id: str) -> List[str]:
+        # iterative walk so deep histories do not hit the recursion limit
+        chain = []
+        node = commit_id
+        while node in parents and node not in paths and node not in chain:
+            chain.append(node)
+            node = parents[node]
+        base = paths.get(node, []) + [node] if node in paths else []
+        for cid in reversed(chain):
+            paths[cid] = base
+            base = base + [cid]
+        return paths[commit_id]
+
+    updates = []
+    for commit_id in parents:
+        ancestors = path_of(commit_id)
+        updates.append(UpdateOne({"commit_id": ObjectId(commit_id)},
+                                 {"$set": {"ancestors": ancestors, "depth": len(ancestors)}}))
+
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+# === Ancestors of a commit, root first ===
+@traced()
+async def get_ancestors(commit_id: str) -> List[CommitDagNode]:
+    try:
+        oid = ObjectId(commit_id)
+    except Exception:
+        return []
+
+    commit = await Commit.find_one(Commit.commit_id == oid)
+    if not commit or not commit.ancestors:
+        return []
+
+    oids = [ObjectId(cid) for cid in commit.ancestors]
+    return await Commit.find({"commit_id": {"$in": oids}}) \
+        .sort([("depth", ASCENDING)]).project(CommitDagNode).to_list()
+
+# === Nearest commit on the path (inclusive) that produced a CSV snapshot ===
+SNAPSHOT_OWNER_QUERY = {
+    "success": True,
+    "$or": [
+        {"parent_commit": None},
+        {"mode": "CODE", "code": {"$ne": None}}
+    ]
+}
+
+@traced()
+async def get_snapshot_commit(commit_id: str) -> Optional[Commit]:
+    """
+    The commit whose CSV is the data state at commit_id. CHAT, CONTEXT and
+    branch commits carry no snapshot of their own, so this walks up to the
+    nearest successful CODE commit or the initial upload.
+    """
+    try:
+        oid = ObjectId(commit_id)
+    except Exception:
+        return None
+
+    commit = await Commit.find_one(Commit.commit_id == oid)
+    if not commit:
+        return None
+
+    if commit.parent_commit and not commit.ancestors:
+        # legacy commit from before the graph index
+        await backfill_commit_graph(str(commit.session_id))
+        commit = await Commit.find_one(Commit.commit_id == oid)
+
+    path = [ObjectId(cid) for cid in commit.ancestors] + [oid]
+    return await Commit.find({"commit_id": {"$in": path}, **SNAPSHOT_OWNER_QUERY}) \
+        .sort([("depth", DESCENDING)]).first_or_none()
+
+# === Every commit reachable from commit_id ===
+@traced()
+async def get_descendants(commit_id: str) -> List[CommitDagNode]:
+    return await Commit.find({"ancestors": commit_id, "is_deleted": False}) \
+        .sort([("depth", ASCENDING), ("_id", ASCENDING)]).project(CommitDagNode).to_list()
+
+async def _get_paths(commit_a: str, commit_b: str) -> Optional[Tuple[List[str], List[str]]]:
+    try:
+        oids = [ObjectId(commit_a), ObjectId(commit_b)]
+    except Exception:
+        return None
+
+    commits = await Commit.find({"commit_id": {"$in": oids}}).project(CommitPath).to_list()
+    by_id = {str(c.commit_id): c for c in commits}
+    if commit_a not in by_id or commit_b not in by_id:
+        return None
+
+    return (by_id[commit_a].ancestors + [commit_a],
+            by_id[commit_b].ancestors + [commit_b])
+
+# === Lowest common ancestor of two commits ===
+@traced()
+async def get_lowest_common_ancestor(commit_a: str, commit_b: str) -> Optional[str]:
+    paths = await _get_paths(commit_a, commit_b)
+    if not paths:
+        return None
+
+    lca = None
+    for a, b in zip(*paths):
+        if a != b:
+            break
+        lca = a
+    return lca
+
+# === Commits on each side since the lowest common ancestor ===
+@traced()
+async def get_lineage_diff(commit_a: str, commit_b: str) -> Optional[Dict]:
+    paths = await _get_paths(commit_a, commit_b)
+    if not paths:
+        return None
+
+    path_a, path_b = paths
+    shared = 0
+    for a, b in zip(path_a, path_b):
+        if a != b:
+            break
+        shared += 1
+
+    return {
+        "lowest_common_ancestor": path_a[shared - 1] if shared else None,
+        "only_in_a": path_a[shared:],
+        "only_in_b": path_b[shared:]
+    }
@@ -6,16 +6,20 @@ from bson import ObjectId
 from models.DocumentMetaData import MetaData
 from datetime import datetime
 from beanie.operators import RegEx
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from tracing import traced
 
 
 # === Create a new session ===
+@traced()
 async def create_session(
     session_name: str,
     head: Optional[str] = None,
     last_csv_path: Optional[str] = None,
     history_path: Optional[str] = None,
-    session_dir: Optional[str] = None
+    session_dir: Optional[str] = None,
+    upload_status: Optional[str] = None,
+    optimize_dtypes: bool = True
 ) -> Session:
     now = datetime.utcnow()
     meta_data = MetaData(created_at=now, last_updated_at=now)
@@ -29,12 +33,15 @@ async def create_session(
         last_csv_path=last_csv_path,
         history_path=history_path,
         session_dir=session_dir,
+        upload_status=upload_status,
+        optimize_dtypes=optimize_dtypes,
         meta_data=meta_data
     )
     return await session.insert()
 
 
 # === Get a session by session_id (custom ObjectId field) ===
+@traced()
 async def get_session_by_session_id(session_id: str) -> Optional[Session]:
     try:
         oid = ObjectId(session_id)
@@ -42,36 +49,127 @@ async def get_session_by_session_id(session_id: str) -> Optional[Session]:
     except Exception:
         return None
 
+# === Get only a session's HEAD ===
+@traced()
+async def get_session_head(session_id: str) -> Optional[str]:
+    try:
+        oid = ObjectId(session_id)
+    except Exception:
+        return None
+
+    doc = await Session.get_motor_collection().find_one({"session_id": oid}, projection={"head": 1})
+    return doc.get("head") if doc else None
+
+class HeadConflictError(Exception):
+    """A conditional HEAD update found another HEAD or a newer lease."""
+
+
 # === Update a session ===
+@traced()
 async def update_session(
     session_id: str,
     session_name: Optional[str]=None,
     head: Optional[str] = None,
     last_csv_path: Optional[str] = None,
     history_path: Optional[str] = None,
-    session_dir: Optional[str] = None
+    session_dir: Optional[str] = None,
+    source_profile: Optional[dict] = None,
+    upload_status: Optional[str] = None,
+    csv_format: Optional[dict] = None,
+    optimize_dtypes: Optional[bool] = None,
+    expected_head: Optional[str] = None,
+    fence: Optional[int] = None
 ) -> Optional[Session]:
-    session = await get_session_by_session_id(session_id)
-    if not session:
+    """
+    $set of the given fields only, so concurrent writers of other fields
+    (usage counters, the fence) are never overwritten. With expected_head
+    and/or fence the write is a compare-and-set: it only applies while
+    HEAD is still expected_head and no newer lease took the session, and
+    raises HeadConflictError otherwise.
+    """
+    try:
+        oid = ObjectId(session_id)
+    except Exception:
         return None
 
-    if session_name is not None:
-        session.session_name = session_name
-    if head is not None:
-        session.head = head
-    if last_csv_path is not None:
-        session.last_csv_path = last_csv_path
-    if history_path is not None:
-        session.history_path = history_path
-    if session_dir is not None:
-        session.session_dir = session_dir
-
-    session.meta_data.last_updated_at = datetime.utcnow()
-    await session.save()
-    return session
+    fields = {
+        "session_name": session_name,
+        "head": head,
+        "last_csv_path": last_csv_path,
+        "history_path": history_path,
+        "session_dir": session_dir,
+        "source_profile": source_profile,
+        "upload_status": upload_status,
+        "csv_format": csv_format,
+        "optimize_dtypes": optimize_dtypes
+    }
+    updates = {k: v for k, v in fields.items() if v is not None}
+    updates["meta_data.last_updated_at"] = datetime.utcnow()
+
+    query = {"session_id": oid}
+    if expected_head is not None:
+        query["head"] = expected_head
+    if fence is not None:
+        query["head_fence"] = fence
+
+    result = await Session.get_motor_collection().update_one(query, {"$set": updates})
+    if result.matched_count == 0:
+        if expected_head is None and fence is None:
+            return None
+        raise HeadConflictError(f"Session {session_id} HEAD changed while this request ran")
+    return await get_session_by_session_id(session_id)
+
+
+# === Take the next fencing token for a session ===
+@traced()
+async def claim_head_fence(session_id: str) -> Optional[int]:
+    """
+    Bumps head_fence and returns the new value. Every lease holder claims
+    one, so a HEAD write with a smaller token is known to be stale.
+    """
+    try:
+        oid = ObjectId(session_id)
+    except Exception:
+        return None
+
+    doc = await Session.get_motor_collection().find_one_and_update(
+        {"session_id": oid},
+        {"$inc": {"head_fence": 1}},
+        projection={"head_fence": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["head_fence"] if doc else None
+
+
+# === Add one LLM call to the session's usage totals ===
+@traced()
+async def add_session_llm_usage(session_id: str, usage: dict) -> None:
+    """
+    Atomic $inc of the session totals, overall and for usage["stage"], so
+    concurrent requests never lose each other's counts.
+    """
+    try:
+        sid = ObjectId(session_id)
+    except Exception:
+        return
+
+    increments = {}
+    for scope in ("total", usage["stage"]):
+        increments[f"llm_usage.{scope}.calls"] = 1
+        for counter in ("input_tokens", "output_tokens", "cached_input_tokens", "latency_ms", "cost_usd"):
+            increments[f"llm_usage.{scope}.{counter}"] = usage.get(counter) or 0
+
+    collection = Session.get_motor_collection()
+    # $inc cannot create paths under a null field
+    await collection.update_one({"session_id": sid, "llm_usage": None}, {"$set": {"llm_usage": {}}})
+    await collection.update_one(
+        {"session_id": sid},
+        {"$inc": increments, "$set": {"meta_data.last_updated_at": datetime.utcnow()}}
+    )
 
 
 # === Soft delete a session ===
+@traced()
 async def delete_session(session_id: str) -> bool:
     session = await get_session_by_session_id(session_id)
     if not session:
@@ -85,6 +183,7 @@ async def delete_session(session_id: str) -> bool:
 
 
 # === Query sessions ===
+@traced()
 async def query_sessions(
     session_id: Optional[str] = None,
     session_name: Optional[str] = None,
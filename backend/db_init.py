@@ -1,20 +1,45 @@
+import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from models.commit import Commit
 from models.session import Session
 from models.checkpoint import Checkpoint
 
+# connections per Mongo host; min keeps a few warm for the first requests
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+# how long a request waits for a free connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+mongo_client = None
+
 async def init_db(connection_string:str):
     try:
-        client = AsyncIOMotorClient(connection_string, serverSelectionTimeoutMS=5000)
+        global mongo_client
+        client = AsyncIOMotorClient(connection_string,
+                                    serverSelectionTimeoutMS=5000,
+                                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                                    maxIdleTimeMS=300000,
+                                    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS)
         await client.server_info()
 
         db = client.get_database("CellCraftAI")
         await init_beanie(database=db, document_models=[Commit,
                                                         Session,
                                                         Checkpoint])
+        mongo_client = client
 
         print("Successfully connected to MongoDB")
 
     except Exception as e:
         raise RuntimeError("Failed to connect to MongoDB") from e
+
+async def ping_db():
+    await Session.get_motor_collection().database.command("ping")
+
+async def close_db():
+    global mongo_client
+    if mongo_client is not None:
+        mongo_client.close()
+        mongo_client = None
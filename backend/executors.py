@@ -0,0 +1,72 @@
+import os
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from tracing import tracer
+
+load_dotenv()
+
+# Dedicated pools so a slow S3 transfer or a heavy pandas transform never
+# starves the other kinds of work, and none of them run on the event loop.
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "8"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(max(2, os.cpu_count() or 1))))
+# generated transforms get their own pool: one slow user script must not
+# queue the CSV parsing of every other request behind it. Scripts share
+# pyplot's global state and run one at a time (code_executor.exclusive_exec),
+# so extra threads here would only wait on that lock.
+EXEC_POOL_SIZE = int(os.getenv("EXEC_POOL_SIZE", "1"))
+S3_POOL_SIZE = int(os.getenv("S3_POOL_SIZE", "16"))
+
+io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="cellcraft-io")
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_POOL_SIZE, thread_name_prefix="cellcraft-cpu")
+exec_pool = ThreadPoolExecutor(max_workers=EXEC_POOL_SIZE, thread_name_prefix="cellcraft-exec")
+s3_pool = ThreadPoolExecutor(max_workers=S3_POOL_SIZE, thread_name_prefix="cellcraft-s3")
+
+async def _run_in_pool(pool: ThreadPoolExecutor, kind: str, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    name = getattr(fn, "__qualname__", type(fn).__name__)
+    with tracer.start_as_current_span(f"executor.{kind}", attributes={"executor.function": name}) as span:
+        submitted = time.perf_counter()
+
+        def timed():
+            # time spent queued behind other work in this pool
+            span.set_attribute("executor.queue_wait_ms", round((time.perf_counter() - submitted) * 1000, 2))
+            return fn(*args, **kwargs)
+
+        # carry contextvars over so per-request state (and the span) survives the thread hop
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(pool, ctx.run, timed)
+
+async def run_io(fn, *args, **kwargs):
+    """Local disk work: temp dirs, file reads/writes."""
+    return await _run_in_pool(io_pool, "io", fn, *args, **kwargs)
+
+async def run_cpu(fn, *args, **kwargs):
+    """CPU-bound pandas work: CSV parsing and serialisation."""
+    return await _run_in_pool(cpu_pool, "cpu", fn, *args, **kwargs)
+
+async def run_exec(fn, *args, **kwargs):
+    """Execution of LLM generated code."""
+    return await _run_in_pool(exec_pool, "exec", fn, *args, **kwargs)
+
+async def run_s3(fn, *args, **kwargs):
+    """Blocking boto3 calls."""
+    return await _run_in_pool(s3_pool, "s3", fn, *args, **kwargs)
+
+def executor_queue_depths() -> dict:
+    return {
+        "io": io_pool._work_queue.qsize(),
+        "cpu": cpu_pool._work_queue.qsize(),
+        "exec": exec_pool._work_queue.qsize(),
+        "s3": s3_pool._work_queue.qsize()
+    }
+
+def shutdown_executors(wait: bool = True, cancel_futures: bool = False):
+    """
+    Blocking when wait is set; call it off the event loop then, since pool
+    work may be waiting on a coroutine it scheduled on the loop.
+    """
+    for pool in (io_pool, cpu_pool, exec_pool, s3_pool):
+        pool.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+
+# requests currently being handled, id(scope) -> "METHOD /path"
+inflight_requests = {}
+
+loop_lag_stats = {
+    "samples": 0,
+    "max_lag_ms": 0.0,
+    "last_lag_ms": 0.0,
+    "blocked_count": 0
+}
+
+_monitor_task = None
+
+class InflightRequestMiddleware:
+    """
+    Tracks which handlers are in flight so a lag report can name the
+    likely culprit.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inflight_requests[id(scope)] = f"{scope['method']} {scope['path']}"
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            inflight_requests.pop(id(scope), None)
+
+async def _monitor_loop(interval: float, threshold_ms: float):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms = (time.perf_counter() - started - interval) * 1000
+
+        loop_lag_stats["samples"] += 1
+        loop_lag_stats["last_lag_ms"] = lag_ms
+        loop_lag_stats["max_lag_ms"] = max(loop_lag_stats["max_lag_ms"], lag_ms)
+
+        if lag_ms > threshold_ms:
+            loop_lag_stats["blocked_count"] += 1
+            culprits = ", ".join(sorted(set(inflight_requests.values()))) or "no request in flight"
+            print(f"[loop-lag] event loop blocked for {lag_ms:.0f} ms; in flight: {culprits}")
+
+def start_loop_lag_monitor(interval_ms: float = LOOP_LAG_INTERVAL_MS,
+                           threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+    global _monitor_task
+    if _monitor_task is None or _monitor_task.done():
+        _monitor_task = asyncio.create_task(_monitor_loop(interval_ms / 1000, threshold_ms))
+    return _monitor_task
+
+def stop_loop_lag_monitor():
+    global _monitor_task
+    if _monitor_task is not None:
+        _monitor_task.cancel()
+        _monitor_task = None
+
+def reset_loop_lag_stats():
+    loop_lag_stats.update(samples=0, max_lag_ms=0.0, last_lag_ms=0.0, blocked_count=0)
@@ -1,20 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import time
-import json
+import asyncio
 import dotenv
-from store import session_cache
+from store import init_local_store, close_local_store
 from routes import gemini_agent
 from routes import version_history
 from routes import sessions
 from routes import db_commits
 from routes import db_sessions
-
-from db_init import init_db
-from s3_init import init_s3
-from redis_init import init_redis
+from routes import blobs
+from routes import commit_tables
+from routes import metrics
+from routes import health
+
+from db_init import init_db, close_db
+from s3_init import init_s3, close_s3
+from redis_init import init_redis, close_redis
+from resources import drain_transforms, timed_phase, lifecycle_timings
+from storage.blob_store import init_blob_store, LOCAL_CACHE_DIR
+from executors import run_io, shutdown_executors
+from loop_lag import (InflightRequestMiddleware,
+                      start_loop_lag_monitor,
+                      stop_loop_lag_monitor)
+from tracing import TracingMiddleware, init_tracing, shutdown_tracing
 
 dotenv.load_dotenv()
 
@@ -26,11 +37,88 @@ def cleanup_old_files(folder, expiry_secs=3600):
             os.remove(fpath)
 
 
-app = FastAPI()
+async def startup():
+    # spans for requests, Mongo/Redis/S3 calls and LLM calls (TRACING_EXPORTER)
+    with timed_phase("startup.tracing"):
+        init_tracing()
+
+    # initialize MongoDB
+    with timed_phase("startup.mongo"):
+        await init_db(MONGODB_CONNECTION_STRING)
+
+    # initialize S3 storage
+    with timed_phase("startup.s3"):
+        await init_s3()
+
+    # intialize Redis cache
+    with timed_phase("startup.redis"):
+        await init_redis()
+
+    # artifact storage (S3, local disk or memory)
+    init_blob_store()
+
+    # report handlers that block the event loop
+    start_loop_lag_monitor()
+
+    # Create folder structure
+    os.makedirs(SESSION_ROOT, exist_ok=True)
+    os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+
+    # Open the embedded session store (imports session_store.json once)
+    with timed_phase("startup.local_store"):
+        await run_io(init_local_store, SESSION_STORE_DB, SESSION_STORE_FILE)
+
+async def shutdown():
+    # finish running transforms while every client is still open
+    with timed_phase("shutdown.drain"):
+        still_running = await drain_transforms()
+
+    stop_loop_lag_monitor()
+    with timed_phase("shutdown.executors"):
+        if still_running:
+            # the drain deadline passed: drop queued work, don't wait on the rest
+            shutdown_executors(wait=False, cancel_futures=True)
+        else:
+            # joined off the loop: a pool thread (table_store._BlobFile) may
+            # still be waiting on a coroutine it scheduled on this loop
+            await asyncio.to_thread(shutdown_executors)
+
+    # one failing client must not keep the others open
+    async def close_store():
+        # checkpoints the SQLite WAL; the io pool is gone, so on a plain thread
+        await asyncio.to_thread(close_local_store)
+
+    for name, close in (("redis", close_redis), ("s3", close_s3), ("mongo", close_db),
+                        ("local store", close_store)):
+        try:
+            await close()
+        except Exception as e:
+            print(f"Error closing {name}:", e)
+
+    # flush spans still queued for the exporter
+    with timed_phase("shutdown.tracing"):
+        shutdown_tracing()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with timed_phase("startup"):
+        await startup()
+    print(f"Startup took {lifecycle_timings['startup']:.2f}s:", lifecycle_timings)
+    try:
+        yield
+    finally:
+        with timed_phase("shutdown"):
+            await shutdown()
+        print(f"Shutdown took {lifecycle_timings['shutdown']:.2f}s:",
+              {k: v for k, v in lifecycle_timings.items() if k.startswith("shutdown")})
+
+
+app = FastAPI(lifespan=lifespan)
 
 SESSION_ROOT = os.getenv("SESSION_ROOT","session_data")
+# legacy JSON store, imported into SESSION_STORE_DB on first start
 SESSION_STORE_FILE = os.path.join(SESSION_ROOT, "session_store.json")
-SESSION_FILES_DIR = os.path.join(SESSION_ROOT, "session_files")
+SESSION_STORE_DB = os.path.join(SESSION_ROOT, "session_store.db")
 
 MONGODB_CONNECTION_STRING = os.getenv("MONGODB_CONNECTION_STRING")
 
@@ -45,50 +133,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-app.mount("/static", StaticFiles(directory=SESSION_ROOT), name='static')
+app.add_middleware(InflightRequestMiddleware)
+# outermost, so the request span covers every other middleware
+app.add_middleware(TracingMiddleware)
 
 app.include_router(gemini_agent.router)
 app.include_router(version_history.router)
 app.include_router(sessions.router)
 app.include_router(db_sessions.router)
 app.include_router(db_commits.router)
-
-
-def save_sessions():
-    with open(SESSION_STORE_FILE, "w") as f:
-        json.dump(session_cache, f, indent=2)
-
-@app.on_event("startup")
-async def setup_session_storage():
-
-    # initialize MongoDB
-    await init_db(MONGODB_CONNECTION_STRING)
-
-    # initialize S3 storage
-    await init_s3()
-
-    # intialize Redis cache
-    await init_redis()
-
-    # Create folder structure
-    os.makedirs(SESSION_FILES_DIR, exist_ok=True)
-
-    # Create or load session_store.json
-    if not os.path.exists(SESSION_STORE_FILE):
-        with open(SESSION_STORE_FILE, "w") as f:
-            json.dump({}, f, indent=2)
-        session_cache.clear()
-        print("Created new session_store.json")
-    else:
-        try:
-            with open(SESSION_STORE_FILE, "r") as f:
-                # session_cache = json.load(f)
-                session_cache.clear()
-                session_cache.update(json.load(f))
-            print(f"Loaded {len(session_cache)} sessions from session_store.json")
-        except json.JSONDecodeError:
-            print("Corrupt session_store.json — resetting")
-            session_cache.clear()
-            save_sessions()
-
+app.include_router(blobs.router)
+app.include_router(commit_tables.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
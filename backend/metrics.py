@@ -0,0 +1,154 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (CollectorRegistry, Counter, Histogram, REGISTRY,
+                               generate_latest, CONTENT_TYPE_LATEST)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Prometheus metrics, served at /metrics (routes/metrics.py). With several
+# uvicorn workers set PROMETHEUS_MULTIPROC_DIR so every worker's samples
+# are merged at scrape time.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# from a cached preview (ms) up to a slow LLM call or a big upload (minutes)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+# Stages of /transform_csv/, in request order:
+#   session_load      session document from Mongo
+#   snapshot_preview  head of the snapshot for the prompt
+#   context_load      HEAD's checkpoint + path commits from Mongo
+#   llm               transform or summary chain call
+#   json_parse        parsing the LLM reply
+#   snapshot_download materialising HEAD's CSV locally
+#   csv_parse         CSV -> DataFrame
+#   exec              generated code
+#   dtype_optimize    lossless downcasting pass
+#   snapshot_write    DataFrame -> CSV in commit_dir
+#   diff              delta against the parent frame
+#   upload            commit folder -> blob store
+#   db_update         commit / session / checkpoint writes
+STAGE_SECONDS = Histogram("cellcraft_transform_stage_seconds",
+                          "Time spent in each stage of a transform request",
+                          ["stage"], buckets=STAGE_BUCKETS)
+
+STAGE_FAILURES = Counter("cellcraft_transform_stage_failures_total",
+                         "Transform stages that raised",
+                         ["stage"])
+
+TRANSFORM_REQUESTS = Counter("cellcraft_transform_requests_total",
+                             "Transform requests by the mode the LLM chose and how they ended",
+                             ["mode", "outcome"])
+
+LLM_TOKENS = Counter("cellcraft_llm_tokens_total",
+                     "LLM tokens by call site; kind is input, output or cached_input",
+                     ["stage", "kind"])
+
+LLM_COST = Counter("cellcraft_llm_cost_usd_total",
+                   "Estimated LLM cost in USD by call site",
+                   ["stage"])
+
+# from an uncontended lease (ms) up to waiting behind a slow transform
+LOCK_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+SESSION_LOCK_WAIT = Histogram("cellcraft_session_lock_wait_seconds",
+                              "Time a transform waited for its session's lease",
+                              buckets=LOCK_WAIT_BUCKETS)
+
+# contended     had to queue behind another request on the session
+# timeout       gave up waiting
+# lost          the lease expired under a running request
+# redis_error   Redis unreachable; only the in-process queue and the fence applied
+# head_conflict a HEAD write was refused by the compare-and-set
+SESSION_LOCK_EVENTS = Counter("cellcraft_session_lock_events_total",
+                              "Session lease outcomes other than a clean acquire",
+                              ["event"])
+
+TRANSFORM_COALESCED = Counter("cellcraft_transform_coalesced_total",
+                              "Transform submissions answered from a duplicate instead of a new run",
+                              ["served"])
+
+@contextmanager
+def observe_stage(stage: str):
+    """Times the block into STAGE_SECONDS; counts a failure if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_FAILURES.labels(stage=stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started)
+
+def record_transform(mode: str, outcome: str):
+    TRANSFORM_REQUESTS.labels(mode=mode, outcome=outcome).inc()
+
+def record_llm_usage(usage: dict):
+    stage = usage["stage"]
+    for kind in ("input", "output", "cached_input"):
+        LLM_TOKENS.labels(stage=stage, kind=kind).inc(usage.get(f"{kind}_tokens") or 0)
+    LLM_COST.labels(stage=stage).inc(usage.get("cost_usd") or 0)
+
+class _RuntimeCollector:
+    """Gauges read at scrape time: executor queues, caches, loop health."""
+
+    def describe(self):
+        # without it register() runs collect() right away, importing
+        # session_lock while session_lock is still importing this module
+        return []
+
+    def collect(self):
+        from executors import executor_queue_depths
+        from loop_lag import inflight_requests, loop_lag_stats
+        from cache.signed_url_cache import local_url_cache
+        from storage import snapshot_store, table_store
+        from session_lock import waiting_requests
+        from cache.transform_results import local_result_cache
+        from resources import inflight_transforms, lifecycle_timings
+
+        queues = GaugeMetricFamily("cellcraft_executor_queue_depth",
+                                   "Tasks waiting for a worker thread", labels=["pool"])
+        for pool, depth in executor_queue_depths().items():
+            queues.add_metric([pool], depth)
+        yield queues
+
+        caches = GaugeMetricFamily("cellcraft_cache_entries",
+                                   "Entries in in-process caches", labels=["cache"])
+        caches.add_metric(["signed_url"], len(local_url_cache))
+        caches.add_metric(["table_metadata"], len(table_store._metadata_cache))
+        caches.add_metric(["snapshot_materializing"], len(snapshot_store._materializing))
+        caches.add_metric(["table_building"], len(table_store._building))
+        caches.add_metric(["transform_result"], len(local_result_cache))
+        yield caches
+
+        lifecycle = GaugeMetricFamily("cellcraft_lifecycle_seconds",
+                                      "Duration of each startup and shutdown phase", labels=["phase"])
+        for phase, seconds in lifecycle_timings.items():
+            lifecycle.add_metric([phase], seconds)
+        yield lifecycle
+        yield GaugeMetricFamily("cellcraft_transforms_in_flight",
+                                "Transforms running in this worker", value=inflight_transforms())
+
+        yield GaugeMetricFamily("cellcraft_session_lock_waiting",
+                                "Transforms queued behind another request on their session",
+                                value=waiting_requests())
+        yield GaugeMetricFamily("cellcraft_http_requests_in_flight",
+                                "HTTP requests being handled", value=len(inflight_requests))
+        yield GaugeMetricFamily("cellcraft_event_loop_lag_seconds",
+                                "Event loop lag at the last sample",
+                                value=loop_lag_stats["last_lag_ms"] / 1000)
+        yield GaugeMetricFamily("cellcraft_event_loop_lag_max_seconds",
+                                "Worst event loop lag since start",
+                                value=loop_lag_stats["max_lag_ms"] / 1000)
+
+REGISTRY.register(_RuntimeCollector())
+
+def render_metrics():
+    """(body, content type) of the text exposition for a scrape."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        # runtime gauges are per worker; report this worker's
+        registry.register(_RuntimeCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,5 +1,6 @@
 from beanie import Document
 from pydantic import BaseModel, Field, ConfigDict
+from pymongo import IndexModel, ASCENDING
 
 from typing import Optional, List, Literal
 from models.DocumentMetaData import MetaData
@@ -10,8 +11,14 @@ class Checkpoint(Document):
     session_id: ObjectId = Field(..., alias="session_id")
     timestamp: str
     parent_checkpoint: Optional[str] = None
+    # commit the summary was taken at; it covers the path root..commit_id,
+    # so every branch that shares that prefix can reuse it
+    commit_id: Optional[str] = None
+    depth: int = 0
     summary: str
     commit_ids: List[str]
+    # tokens, latency and cost of the summarisation call
+    llm_usage: Optional[dict] = None
     meta_data: MetaData
 
     model_config = ConfigDict(
@@ -21,3 +28,6 @@ class Checkpoint(Document):
 
     class Settings:
         name = "checkpoints"
+        indexes = [
+            IndexModel([("commit_id", ASCENDING)]),
+        ]
@@ -1,5 +1,6 @@
 from beanie import Document
 from pydantic import BaseModel, Field, ConfigDict
+from pymongo import IndexModel, ASCENDING
 from typing import Optional, List, Literal
 from models.DocumentMetaData import MetaData
 from models.requestModels.commit import GeneratedFile
@@ -10,6 +11,9 @@ class Commit(Document):
     commit_id: ObjectId = Field(default_factory=ObjectId)
     session_id: ObjectId
     parent_commit: Optional[str] = None
+    # materialised path: ids of every ancestor, root first
+    ancestors: List[str] = []
+    depth: int = 0
     timestamp: str
 
     query: str
@@ -18,6 +22,22 @@ class Commit(Document):
     key_steps: Optional[str] = None
     code: Optional[str] = None
     generated_files: List[GeneratedFile] = []
+    # parse options + column types of this commit's CSV snapshot
+    csv_format: Optional[dict] = None
+    # memory before/after and converted columns of the dtype optimisation pass
+    dtype_report: Optional[dict] = None
+    # row/column delta against the parent snapshot (counts only, full delta in S3)
+    diff_summary: Optional[dict] = None
+    content_hash: Optional[str] = None
+    # "delta": the CSV was not uploaded and is rebuilt from the parent + stored patch
+    # "replay": the CSV was tiered away and is rebuilt by re-running code on the parent
+    snapshot_kind: Literal["full","delta","replay"] = "full"
+    # whether replaying code reproduced content_hash; None until tiering tries
+    replay_verified: Optional[bool] = None
+    # tokens, latency and cost of the LLM call that produced this commit
+    llm_usage: Optional[dict] = None
+    # per-statement time / memory and library hotspots of a profiled exec run
+    exec_profile: Optional[dict] = None
 
     success: bool
     error: Optional[str] = None
@@ -33,3 +53,33 @@ class Commit(Document):
 
     class Settings:
         name = "commits"
+        indexes = [
+            IndexModel([("ancestors", ASCENDING)]),
+            IndexModel([("session_id", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("session_id", ASCENDING), ("meta_data.last_updated_at", ASCENDING)]),
+        ]
+
+
+class CommitDagNode(BaseModel):
+    commit_id: ObjectId
+    parent_commit: Optional[str] = None
+    depth: int = 0
+    timestamp: str
+    mode: Literal["CODE","CHAT","CONTEXT"]
+    key_steps: Optional[str] = None
+    success: bool
+    # titles and keys only; the DAG view draws a node per artifact
+    generated_files: List[GeneratedFile] = []
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+        json_encoders={ObjectId: str}
+    )
+
+
+class CommitPath(BaseModel):
+    commit_id: ObjectId
+    ancestors: List[str] = []
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
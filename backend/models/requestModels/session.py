@@ -7,6 +7,7 @@ class SessionCreateRequest(BaseModel):
     last_csv_path: Optional[str] = None
     history_path: Optional[str] = None
     session_dir: Optional[str] = None
+    optimize_dtypes: bool = True
 
 class SessionUpdateRequest(BaseModel):
     session_name: Optional[str] = None
@@ -14,3 +15,4 @@ class SessionUpdateRequest(BaseModel):
     last_csv_path: Optional[str] = None
     history_path: Optional[str] = None
     session_dir: Optional[str] = None
+    optimize_dtypes: Optional[bool] = None
@@ -1,6 +1,6 @@
 from beanie import Document
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Optional, Literal
 from bson import ObjectId
 from datetime import datetime
 from models.DocumentMetaData import MetaData
@@ -13,6 +13,19 @@ class Session(Document):
     last_csv_path: Optional[str] = None
     history_path: Optional[str] = None
     session_dir: Optional[str] = None
+    # hash, size, row count and column profile of the uploaded CSV
+    source_profile: Optional[dict] = None
+    # "PENDING" while a direct-to-S3 upload has not been finalised
+    upload_status: Optional[Literal["PENDING", "READY"]] = None
+    # parse options + column types of the CSV at last_csv_path
+    csv_format: Optional[dict] = None
+    # run the lossless dtype downcasting pass after every CODE commit
+    optimize_dtypes: bool = True
+    # LLM usage totals, overall and per stage: {"total": {...}, "transform": {...}}
+    llm_usage: Optional[dict] = None
+    # fencing token of the newest transform lease; HEAD writes carrying an
+    # older token come from a request that lost its lease and are refused
+    head_fence: int = 0
     meta_data: MetaData
 
     is_deleted: bool = False
@@ -6,18 +6,41 @@ load_dotenv()
 
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# requests beyond this wait up to REDIS_POOL_TIMEOUT_S for a free
+# connection instead of opening one connection each
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_POOL_TIMEOUT_S = float(os.getenv("REDIS_POOL_TIMEOUT_S", "5"))
+REDIS_SOCKET_TIMEOUT_S = float(os.getenv("REDIS_SOCKET_TIMEOUT_S", "5"))
 
 redis_client = None
 
 async def init_redis():
     try:
         global redis_client
-        redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+        pool = redis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT_S,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT_S,
+            socket_timeout=REDIS_SOCKET_TIMEOUT_S,
+            health_check_interval=30,
+            encoding="utf-8",
+            decode_responses=True
+        )
+        # closing the client closes the pool too
+        redis_client = redis.Redis.from_pool(pool)
+        await redis_client.ping()
 
         print("Redis connection successful.")
     except Exception as e:
         print("Error connecting to Redis:", e)
 
+async def close_redis():
+    global redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+        redis_client = None
+
 def get_redis_cache():
     if redis_client is None:
         raise RuntimeError("Redis client is not initialized yet. Call init_redis() first.")
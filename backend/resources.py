@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Dict
+
+from db_init import ping_db
+from redis_init import get_redis_cache
+from s3_init import ping_s3
+from executors import run_s3
+
+# Process lifecycle around the shared clients: how long startup and
+# shutdown took, which transforms are still running, and whether the
+# clients answer. Shutdown stops taking transforms, then waits up to
+# SHUTDOWN_DRAIN_TIMEOUT_S for the running ones before closing anything.
+SHUTDOWN_DRAIN_TIMEOUT_S = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT_S", "60"))
+HEALTH_CHECK_TIMEOUT_S = float(os.getenv("HEALTH_CHECK_TIMEOUT_S", "2"))
+
+# phase -> seconds, e.g. "startup.mongo", "startup", "shutdown.drain"
+lifecycle_timings: Dict[str, float] = {}
+
+_inflight_transforms = 0
+_draining = False
+
+@contextmanager
+def timed_phase(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        lifecycle_timings[phase] = round(time.perf_counter() - started, 4)
+
+def accepting_transforms() -> bool:
+    return not _draining
+
+def inflight_transforms() -> int:
+    return _inflight_transforms
+
+@contextmanager
+def transform_slot():
+    """Counts the block as a running transform, for the shutdown drain."""
+    global _inflight_transforms
+    _inflight_transforms += 1
+    try:
+        yield
+    finally:
+        _inflight_transforms -= 1
+
+async def drain_transforms(timeout: float = SHUTDOWN_DRAIN_TIMEOUT_S) -> int:
+    """
+    Refuses new transforms and waits for the running ones (and their
+    background tiering) to finish. Returns how many were still running
+    at the deadline.
+    """
+    global _draining
+    from services.snapshot_tiering import pending_tiering_tasks
+
+    _draining = True
+    deadline = time.monotonic() + timeout
+    while _inflight_transforms and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    tasks = pending_tiering_tasks()
+    if tasks and time.monotonic() < deadline:
+        await asyncio.wait(tasks, timeout=deadline - time.monotonic())
+
+    if _inflight_transforms:
+        print(f"Shutdown drain timed out with {_inflight_transforms} transform(s) still running")
+    return _inflight_transforms
+
+async def _check(ping) -> dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(ping(), HEALTH_CHECK_TIMEOUT_S)
+        return {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        return {"ok": False, "ms": round((time.perf_counter() - started) * 1000, 2),
+                "error": str(e) or type(e).__name__}
+
+async def check_health() -> dict:
+    """Pings Mongo, Redis and S3 concurrently."""
+    async def redis_ping():
+        await get_redis_cache().ping()
+
+    async def s3_ping():
+        await run_s3(ping_s3)
+
+    names = ("mongo", "redis", "s3")
+    results = await asyncio.gather(_check(ping_db), _check(redis_ping), _check(s3_ping))
+    checks = dict(zip(names, results))
+    return {
+        "status": "ok" if all(c["ok"] for c in checks.values()) and not _draining else "unavailable",
+        "draining": _draining,
+        "inflight_transforms": _inflight_transforms,
+        "checks": checks,
+        "lifecycle": lifecycle_timings
+    }
@@ -0,0 +1,95 @@
+import re
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
+from executors import run_io
+from storage.blob_store import get_blob_store, S3BlobStore
+from typing import Optional, Tuple
+import mimetypes
+import os
+
+router = APIRouter()
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of a single-range Range header, or None to send the whole
+    object (no header, or several ranges). Raises ValueError when the range
+    cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        # multiple ranges or another unit: the whole object is a valid answer
+        return None
+
+    first, last = match.groups()
+    if first == "" and last == "":
+        raise ValueError(header)
+    if first == "":
+        # suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+async def blob_response(request: Request, key: str, filename: Optional[str] = None,
+                        local_path: Optional[str] = None) -> Response:
+    """
+    Serves a blob, or a local file standing in for one, with Range support.
+    Local files go to the server as is (sendfile, ranges handled by
+    FileResponse); other backends are streamed, only the requested bytes.
+    """
+    store = get_blob_store()
+    try:
+        local_path = local_path or store.local_path(key)
+    except ValueError:
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    media_type = mimetypes.guess_type(filename or key)[0] or "application/octet-stream"
+    disposition = {"content_disposition_type": "attachment", "filename": filename} if filename else {}
+
+    if local_path and await run_io(os.path.exists, local_path):
+        return FileResponse(local_path, media_type=media_type, **disposition)
+
+    info = await store.head(key)
+    if info is None:
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+
+    etag = f'"{info["etag"]}"'
+    media_type = info["content_type"] or media_type
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    size = info["size"]
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = _parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(store.stream(key), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(store.stream(key, start, end), status_code=206,
+                             media_type=media_type, headers=headers)
+
+# Replaces the old StaticFiles mount on SESSION_ROOT: blobs of the local and
+# memory backends, whose url_for points here.
+@router.get("/static/{key:path}")
+async def get_blob(request: Request, key: str):
+    # S3 blobs are only handed out as presigned URLs (url_for); serving them
+    # here would bypass their expiry
+    if isinstance(get_blob_store(), S3BlobStore):
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    return await blob_response(request, key)
@@ -0,0 +1,94 @@
+import base64
+from fastapi import APIRouter, Query, Request, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Optional
+from controllers.CommitController import get_commit_by_id
+from controllers.CommitGraphController import get_snapshot_commit
+from storage.blob_store import local_cache_path
+from storage.snapshot_store import snapshot_key, ensure_local_snapshot
+from storage.table_store import ensure_table, read_table_page
+from routes.blobs import blob_response
+
+router = APIRouter()
+
+# Row access to a commit's table for grids that page or scroll through it.
+# The cursor pins the commit, so a page never mixes rows of two versions.
+
+def _encode_cursor(commit_id: str, row: int) -> str:
+    raw = f"{commit_id}|{row}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str, commit_id: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_commit, row = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        row = int(row)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_commit != commit_id:
+        raise HTTPException(status_code=400, detail="Cursor belongs to another commit")
+    return row
+
+@router.get("/commit-table")
+async def get_commit_table(commit_id: str,
+                           offset: int = Query(default=0, ge=0),
+                           limit: int = Query(default=500, ge=1, le=10000),
+                           cursor: Optional[str] = None,
+                           columns: Optional[str] = None):
+    """
+    A page of a commit's table. Page with offset/limit, or follow
+    next_cursor; columns is a comma separated subset.
+    """
+    commit = await get_commit_by_id(commit_id)
+    if not commit:
+        return JSONResponse(status_code=404, content={"error": "Commit not found"})
+
+    if cursor:
+        offset = _decode_cursor(cursor, commit_id)
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+
+    try:
+        page = await read_table_page(str(commit.session_id), commit_id, offset, limit, selected)
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except KeyError as e:
+        return JSONResponse(status_code=400, content={"error": e.args[0]})
+
+    next_row = offset + len(page["rows"])
+    return JSONResponse({
+        "commit_id": commit_id,
+        **page,
+        "next_cursor": _encode_cursor(commit_id, next_row) if next_row < page["total_rows"] else None
+    })
+
+@router.get("/commit-table/download")
+async def download_commit_table(request: Request, commit_id: str, format: str = "csv"):
+    """
+    The whole table as a file, honouring Range requests so large downloads
+    can be resumed or read in parts. format is csv or parquet.
+    """
+    if format not in ("csv", "parquet"):
+        return JSONResponse(status_code=400, content={"error": "format must be csv or parquet"})
+
+    commit = await get_commit_by_id(commit_id)
+    if not commit:
+        return JSONResponse(status_code=404, content={"error": "Commit not found"})
+    session_id = str(commit.session_id)
+
+    try:
+        if format == "parquet":
+            key, local_path, _ = await ensure_table(session_id, commit_id)
+            return await blob_response(request, key, filename=f"{commit_id}.parquet", local_path=local_path)
+
+        owner = await get_snapshot_commit(commit_id)
+        if owner is None:
+            return JSONResponse(status_code=404, content={"error": f"No snapshot for commit {commit_id}"})
+        key = snapshot_key(session_id, str(owner.commit_id))
+        # a locally cached snapshot is served as is; delta and tiered
+        # commits have no object, so theirs is rebuilt first
+        local_path = local_cache_path(key)
+        if owner.snapshot_kind != "full":
+            local_path = await ensure_local_snapshot(key)
+        return await blob_response(request, key, filename=f"{commit_id}.csv", local_path=local_path)
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
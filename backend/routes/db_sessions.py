@@ -3,6 +3,9 @@ from controllers.SessionController import *
 from models.DocumentMetaData import MetaData
 from typing import Optional
 from models.requestModels.session import (SessionCreateRequest, SessionUpdateRequest)
+from services.snapshot_tiering import tier_session_snapshots, SNAPSHOT_EVERY_N
+from controllers.CheckpointController import list_checkpoints_by_session_id
+from services.llm_usage import estimate_tokens
 
 router = APIRouter(prefix="/sessions", tags=["Sessions"])
 
@@ -13,7 +16,8 @@ async def create_new_session(payload: SessionCreateRequest):
         head=payload.head,
         last_csv_path=payload.last_csv_path,
         history_path=payload.history_path,
-        session_dir=payload.session_dir
+        session_dir=payload.session_dir,
+        optimize_dtypes=payload.optimize_dtypes
     )
 
 @router.get("/{session_id}")
@@ -31,12 +35,43 @@ async def update_session_metadata(session_id: str, payload: SessionUpdateRequest
         head=payload.head,
         last_csv_path=payload.last_csv_path,
         history_path=payload.history_path,
-        session_dir=payload.session_dir
+        session_dir=payload.session_dir,
+        optimize_dtypes=payload.optimize_dtypes
     )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
 
+@router.post("/{session_id}/tier-snapshots")
+async def tier_snapshots(session_id: str, every_n: Optional[int] = None):
+    session = await get_session_by_session_id(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await tier_session_snapshots(session_id, every_n or SNAPSHOT_EVERY_N)
+
+@router.get("/{session_id}/usage")
+async def get_session_usage(session_id: str):
+    """LLM token and cost totals of a session, plus what each checkpoint summary cost."""
+    session = await get_session_by_session_id(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    checkpoints = await list_checkpoints_by_session_id(session_id, descending=False)
+    return {
+        "session_id": session_id,
+        "llm_usage": session.llm_usage or {},
+        "checkpoints": [
+            {
+                "checkpoint_id": str(c.checkpoint_id),
+                "commit_id": c.commit_id,
+                "summarized_commits": len(c.commit_ids),
+                "summary_tokens": estimate_tokens(c.summary),
+                "llm_usage": c.llm_usage
+            }
+            for c in checkpoints
+        ]
+    }
+
 @router.delete("/{session_id}") 
 async def remove_session(session_id: str):
     if not await delete_session(session_id):
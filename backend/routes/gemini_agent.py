@@ -1,87 +1,130 @@
 import os
 import traceback
-from fastapi import APIRouter, Form
+from typing import Optional
+from fastapi import APIRouter, Form, Header
 from fastapi.responses import JSONResponse
 from session_management_2 import (apply_transform_and_checkpoint,
-                                  branch_from_commit)
+                                  branch_from_commit,
+                                  set_head)
 import json
 import re
 import pandas as pd
-import numpy as np
-import sklearn
-import matplotlib.pyplot as plt
-import seaborn as sns
 from controllers.SessionController import (get_session_by_session_id,
-                                           update_session)
+                                           update_session,
+                                           get_session_head,
+                                           add_session_llm_usage,
+                                           HeadConflictError)
 from controllers.CommitController import (create_commit,
-                                          get_commits_by_session_id,
-                                          update_commit,
-                                          get_commits)
-from controllers.CheckpointController import (get_latest_checkpoint_by_session_id,
+                                          update_commit)
+from controllers.CheckpointController import (get_path_context,
                                               create_commit_with_checkpoint)
-from s3_init import get_s3
 from storage.storage_utils import (upload_commit_folder)
+from storage.blob_store import local_cache_path
+from storage.snapshot_store import (ensure_local_snapshot,
+                                    load_snapshot_preview,
+                                    record_commit_diff)
+from executors import run_cpu, run_exec, run_io
+from services.csv_ingest import read_csv_fast, csv_format_from_frame
+from services.dtype_optimizer import optimize_dtypes
+from services.code_executor import execute_generated_code
+from services.code_profiler import profile_generated_code, profile_for_prompt
+from services.snapshot_tiering import schedule_tiering
 from models.requestModels.commit import GeneratedFile
 
-from google import genai
-
 import dotenv
 dotenv.load_dotenv()
 
 from services.langchain_chain import transform_chain
+from services.llm_usage import ainvoke_metered
+from metrics import observe_stage, record_transform, SESSION_LOCK_EVENTS, TRANSFORM_COALESCED
+from tracing import bind_trace_ids
+from session_lock import session_lease, SessionLockTimeout
+from cache.transform_results import submission_key, coalesce_transform, replayed_result
+from opentelemetry import trace
+from resources import accepting_transforms, transform_slot
 
 BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 
-# Load your API key (from .env or hardcoded for testing)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if GEMINI_API_KEY is None:
-    raise ValueError("GEMINI_API_KEY environment variable not set")
-
-client = genai.Client(api_key=GEMINI_API_KEY)
-
 
 router = APIRouter()
 
+# pandas >= 3 always copies on write, so a shallow copy already keeps the
+# parent frame intact when the generated code modifies df in place
+_COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3
+
 @router.post("/transform_csv/")
-async def transform_csv(session_id: str = Form(...), query: str = Form(...)):
+async def transform_csv(session_id: str = Form(...), query: str = Form(...), profile: bool = Form(False),
+                        idempotency_key: Optional[str] = Form(None),
+                        idempotency_header: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if not accepting_transforms():
+        return JSONResponse(content={"error": "Server is shutting down, retry shortly"},
+                            status_code=503, headers={"Retry-After": "5"})
+
+    # a double-click or a retry of the same submission attaches to the
+    # running pipeline (or, with an idempotency key, replays its result)
+    # instead of running it again
+    idempotency_key = idempotency_key or idempotency_header
+    key = submission_key(session_id, await get_session_head(session_id), query, idempotency_key)
+
+    async def run():
+        # filled in as the request goes, for the request counters
+        request_state = {"mode": "NONE"}
+        try:
+            # one transform per session at a time: a second submit waits for
+            # the first and then builds on the HEAD it left behind
+            async with session_lease(session_id) as lease:
+                # a duplicate from another worker may have finished while we waited
+                replay = await replayed_result(key, query) if idempotency_key else None
+                if replay is not None:
+                    TRANSFORM_COALESCED.labels(served="replay").inc()
+                    return replay
+                response = await run_transform(session_id, query, request_state, profile, lease.fence)
+        except SessionLockTimeout as e:
+            response = JSONResponse(content={"error": str(e)}, status_code=409)
+        record_transform(request_state["mode"], "success" if response.status_code < 400 else "failure")
+        return response
+
+    with transform_slot():
+        response, served = await coalesce_transform(key, query, run, retain=bool(idempotency_key))
+    if served != "run":
+        TRANSFORM_COALESCED.labels(served=served).inc()
+        trace.get_current_span().set_attribute("cellcraft.coalesced", served)
+    return response
+
+async def run_transform(session_id: str, query: str, request_state: dict, profile: bool = False,
+                        fence: int = None):
+    bind_trace_ids(session_id=session_id)
     try:
-        session = await get_session_by_session_id(session_id=session_id)
+        with observe_stage("session_load"):
+            session = await get_session_by_session_id(session_id=session_id)
 
         if not session:
             return JSONResponse(content={"error": "Invalid session ID"}, status_code=400)
-    
-        # 2. Ensure latest CSV is downloaded
-        s3_key = session.last_csv_path  # e.g., session_files/<session_id>/<commit_id>/<commit_id>.csv
-        local_path = os.path.join("session_files", s3_key)
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
-
-        s3 = get_s3()
 
-        if not os.path.exists(local_path):
-            s3.download_file(BUCKET_NAME, s3_key, local_path)
+        if session.upload_status == "PENDING":
+            return JSONResponse(content={"error": "Session upload has not been finalised"}, status_code=409)
+    
+        # 2. Preview the HEAD snapshot; the full frame is only loaded for CODE
+        with observe_stage("snapshot_preview"):
+            preview = await load_snapshot_preview(session.last_csv_path, session.csv_format)
 
-        df = pd.read_csv(local_path)
+        # only HEAD's own lineage: the nearest checkpoint on its path plus
+        # the commits after it, never summaries from sibling branches
+        with observe_stage("context_load"):
+            checkpoint, path_commits = await get_path_context(session_id, session.head)
 
-        latest_checkpoint = await get_latest_checkpoint_by_session_id(session_id=session_id)
+        history = [c for c in path_commits if c.success]
 
-        if latest_checkpoint:
-            commits_list = await get_commits(session_id=session_id,
-                                             since_timestamp=latest_checkpoint.timestamp)
-            
-        else:
-            commits_list = await get_commits_by_session_id(session_id)
-        
-        history = sorted(
-                        [c for c in commits_list if c.success],
-                        key=lambda c: c.timestamp
-                    )
+        # the newest profiled run, so "make it faster" knows where the time went
+        profiled = next((c for c in reversed(history) if c.exec_profile), None)
 
         key_step_changelog = "\n".join(
-            [f"- {c.commit_id}:{c.key_steps}" for c in history if c.key_steps]
+            ([f"- earlier steps (condensed): {checkpoint.summary}"] if checkpoint else []) +
+            [f"- {c.commit_id}:{c.key_steps}" for c in history if c.key_steps] +
+            ([profile_for_prompt(str(profiled.commit_id), profiled.exec_profile)] if profiled else [])
         )
 
-        df_preview = df.head(5).to_csv(index=False)
+        df_preview = preview.to_csv(index=False)
 
         inputs = {
             "preview": df_preview,
@@ -89,27 +132,35 @@ async def transform_csv(session_id: str = Form(...), query: str = Form(...)):
             "query": query
         }
 
-        response = await transform_chain.ainvoke(inputs)
+        response, llm_usage = await ainvoke_metered(transform_chain, inputs, stage="transform")
+        with observe_stage("db_update"):
+            await add_session_llm_usage(session_id, llm_usage)
         response_text = response.content
-        
-        cleaned = re.sub(r"^```json|```$", "", response_text, flags=re.IGNORECASE).strip()
 
-        fixed = re.sub(r'f"({.*?})"', lambda m: '"' + m.group(1).replace('{', '{{').replace('}', '}}') + '"', cleaned)
+        request_state["mode"] = "UNPARSED"
+        with observe_stage("json_parse"):
+            cleaned = re.sub(r"^```json|```$", "", response_text, flags=re.IGNORECASE).strip()
 
-        # Safely load the JSON
-        try:
-            parsed = json.loads(fixed)
-        except json.JSONDecodeError:
+            fixed = re.sub(r'f"({.*?})"', lambda m: '"' + m.group(1).replace('{', '{{').replace('}', '}}') + '"', cleaned)
+
+            # Safely load the JSON
+            try:
+                parsed = json.loads(fixed)
+            except json.JSONDecodeError:
+                parsed = None
+        if parsed is None:
             return JSONResponse(content={"error": "Failed to parse LLM response as JSON"}, status_code=400)
+        request_state["mode"] = str(parsed.get("mode"))
 
         if parsed["mode"] == "CHAT":
             # handle chat response
-            return await handle_chat_response(session_id, session, query, parsed)
+            return await handle_chat_response(session_id, session, query, parsed, llm_usage, fence)
         elif parsed["mode"] == "CODE":
             # handle code response
-            return await handle_code_response(session_id, session, query, parsed, df)
+            df = await load_head_frame(session)
+            return await handle_code_response(session_id, session, query, parsed, df, llm_usage, profile, fence)
         elif parsed["mode"] == "CONTEXT":
-            return await handle_context_change(session_id, parsed)
+            return await handle_context_change(session_id, parsed, llm_usage, fence)
         else:
             # invalid LLM response
             return JSONResponse(content={"error": "Invalid LLM response"}, status_code=400)
@@ -119,7 +170,20 @@ async def transform_csv(session_id: str = Form(...), query: str = Form(...)):
         print(e)
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
 
-async def handle_code_response(session_id, session, query, parsed, df):
+async def load_head_frame(session) -> pd.DataFrame:
+    """Materialises the session's HEAD snapshot locally and loads it."""
+    with observe_stage("snapshot_download"):
+        local_path = await ensure_local_snapshot(session.last_csv_path)
+
+    with observe_stage("csv_parse"):
+        df, csv_format = await run_cpu(read_csv_fast, local_path, session.csv_format)
+    if csv_format != session.csv_format:
+        # first load of a legacy snapshot, or the stored types went stale
+        await update_session(session_id=str(session.session_id), csv_format=csv_format)
+        session.csv_format = csv_format
+    return df
+
+async def handle_code_response(session_id, session, query, parsed, df, llm_usage=None, profile=False, fence=None):
     key_steps = parsed["key_steps"]
     code = parsed["executable_code"]
     response = parsed["response"]
@@ -128,67 +192,93 @@ async def handle_code_response(session_id, session, query, parsed, df):
     parent_commit = session.head
 
     # Step 1: Create commit document early
-    commit_doc = await create_commit_with_checkpoint(
-        session_id=session_id,
-        parent_commit=parent_commit,
-        query=query,
-        mode="CODE",
-        key_steps=key_steps,
-        response=response,
-        code=code,
-        generated_files=[],
-        success=True,
-        error=None
-    )
+    with observe_stage("db_update"):
+        commit_doc = await create_commit_with_checkpoint(
+            session_id=session_id,
+            parent_commit=parent_commit,
+            query=query,
+            mode="CODE",
+            key_steps=key_steps,
+            response=response,
+            code=code,
+            generated_files=[],
+            success=True,
+            error=None,
+            llm_usage=llm_usage
+        )
     commit_id = str(commit_doc.commit_id)
+    bind_trace_ids(commit_id=commit_id)
 
     # Step 2: Prepare commit directory (local)
-    commit_dir = os.path.join("session_files", session_id, commit_id)
-    os.makedirs(commit_dir, exist_ok=True)
+    commit_dir = local_cache_path(f"{session_id}/{commit_id}")
+    await run_io(os.makedirs, commit_dir, exist_ok=True)
 
     # Step 3: Execute the LLM code
     try:
-        safe_globals = {
-            "__builtins__": __builtins__,
-            "pd": pd,
-            "np": np,
-            "sklearn": sklearn,
-            "plt": plt,
-            "sns": sns
-        }
-        local_vars = {
-            "df": df,
-            "commit_dir": commit_dir
-        }
-
-        exec(code, safe_globals, local_vars)
-        df = local_vars["df"]
+        parent_df = df
+        exec_profile = None
+        with observe_stage("exec"):
+            if profile:
+                # opt-in: per-line time and memory, report saved next to the charts
+                df, exec_profile = await run_exec(profile_generated_code, code,
+                                                  df.copy(deep=not _COPY_ON_WRITE), commit_dir)
+            else:
+                df = await run_exec(execute_generated_code, code, df.copy(deep=not _COPY_ON_WRITE), commit_dir)
+
+        dtype_report = None
+        snapshot_df = df
+        if session.optimize_dtypes:
+            with observe_stage("dtype_optimize"):
+                # only writes the snapshot; df and csv_format keep the original
+                # dtypes, so the next step's df['age'] * 2 cannot wrap a uint8
+                snapshot_df, dtype_report = await run_cpu(optimize_dtypes, df)
 
         # Step 4: Save transformed CSV
         csv_name = f"{commit_id}.csv"
         csv_path = os.path.join(commit_dir, csv_name)
-        df.to_csv(csv_path, index=False)
-
-        # Step 5: Upload all generated files in commit folder
-        uploaded_files = await upload_commit_folder(
-            bucket=BUCKET_NAME,
-            local_folder_path=commit_dir,
-            session_id=session_id,
-            commit_id=commit_id
-        )
-
-        # Step 6: Update commit with file metadata
+        with observe_stage("snapshot_write"):
+            await run_cpu(snapshot_df.to_csv, csv_path, index=False)
+            csv_format = await run_cpu(csv_format_from_frame, df)
+
+        # Step 5: Diff against the parent; small changes may skip the CSV upload
+        with observe_stage("diff"):
+            diff_summary, content_hash, snapshot_kind = await record_commit_diff(session, commit_id, parent_df, df)
+
+        # Step 6: Upload all generated files in commit folder
+        with observe_stage("upload"):
+            uploaded_files = await upload_commit_folder(
+                bucket=BUCKET_NAME,
+                local_folder_path=commit_dir,
+                session_id=session_id,
+                commit_id=commit_id,
+                exclude=[csv_name] if snapshot_kind == "delta" else None
+            )
+
+        # Step 7: Update commit with file metadata
         generated_files = [
             GeneratedFile(**f) for f in uploaded_files
         ]
-        await update_commit(commit_id, generated_files=generated_files)
-
-        # Step 7: Update session head and last_csv_path
-        await update_session(
-            session_id=session_id,
-            head=commit_id,
-            last_csv_path=uploaded_files[0]["url"]  # CSV path
-        )
+        with observe_stage("db_update"):
+            await update_commit(commit_id,
+                                generated_files=generated_files,
+                                csv_format=csv_format,
+                                dtype_report=dtype_report,
+                                diff_summary=diff_summary,
+                                content_hash=content_hash,
+                                snapshot_kind=snapshot_kind,
+                                exec_profile=exec_profile)
+
+            # Step 8: Update session head and last_csv_path, unless HEAD
+            # moved on since this request read it
+            await update_session(
+                session_id=session_id,
+                head=commit_id,
+                last_csv_path=f"{session_id}/{commit_id}/{csv_name}",
+                csv_format=csv_format,
+                expected_head=parent_commit,
+                fence=fence
+            )
+        schedule_tiering(session_id)
 
         return JSONResponse(content={
             "success": True,
@@ -198,6 +288,9 @@ async def handle_code_response(session_id, session, query, parsed, df):
             "key_steps": key_steps,
             # "df_head": df_head.to_dict(orient="records"),
             "generated_files": uploaded_files,
+            "dtype_report": dtype_report,
+            "diff_summary": diff_summary,
+            "exec_profile": exec_profile,
             "commit_data": {
                 "commit_id": commit_id,
                 "parent_id": parent_commit,
@@ -205,6 +298,10 @@ async def handle_code_response(session_id, session, query, parsed, df):
             }
         })
 
+    except HeadConflictError as conflict:
+        await update_commit(commit_id, success=False, error=str(conflict))
+        return _head_conflict_response("CODE", response, conflict)
+
     except Exception as exec_err:
         traceback.print_exc()
 
@@ -220,27 +317,31 @@ async def handle_code_response(session_id, session, query, parsed, df):
             "key_steps": key_steps
         }, status_code=500)
 
-async def handle_chat_response(session_id, session, query, parsed):
+async def handle_chat_response(session_id, session, query, parsed, llm_usage=None, fence=None):
     try:
         llm_response_text = parsed["response"]
 
-        commit_doc = await create_commit(
-            session_id=session_id,
-            parent_commit=str(session.head),
-            query=query,
-            mode="CHAT",
-            key_steps=None,
-            response=llm_response_text,
-            code=None,
-            generated_files=[],
-            success=True,
-            error=None
-        )
-        # 2. Update session HEAD
-        await update_session(
-            session_id=session_id,
-            head=str(commit_doc.commit_id)
-        )
+        with observe_stage("db_update"):
+            commit_doc = await create_commit(
+                session_id=session_id,
+                parent_commit=str(session.head),
+                query=query,
+                mode="CHAT",
+                key_steps=None,
+                response=llm_response_text,
+                code=None,
+                generated_files=[],
+                success=True,
+                error=None,
+                llm_usage=llm_usage
+            )
+            # 2. Update session HEAD
+            await update_session(
+                session_id=session_id,
+                head=str(commit_doc.commit_id),
+                expected_head=session.head,
+                fence=fence
+            )
 
         # 3. Return response
         return JSONResponse(content={
@@ -253,6 +354,10 @@ async def handle_chat_response(session_id, session, query, parsed):
             "head": str(commit_doc.commit_id)
         })
 
+    except HeadConflictError as conflict:
+        await update_commit(str(commit_doc.commit_id), success=False, error=str(conflict))
+        return _head_conflict_response("CHAT", llm_response_text, conflict)
+
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(content={
@@ -260,15 +365,16 @@ async def handle_chat_response(session_id, session, query, parsed):
             "error": str(e)
         }, status_code=500)
 
-async def handle_context_change(session_id: str, parsed):
+async def handle_context_change(session_id: str, parsed, llm_usage=None, fence=None):
     try:
         action = parsed.get("action")
         commit_id = parsed.get("target_commit_id")
         response = parsed["response"]
 
         if action == "checkout":
-            # Move HEAD to a previous commit
-            await update_session(session_id=session_id, head=commit_id)
+            # Move HEAD (and the snapshot it reads) to a previous commit
+            with observe_stage("db_update"):
+                await set_head(session_id, commit_id, fence=fence)
             return JSONResponse(content={
                 "success": True,
                 "mode": "CONTEXT",
@@ -279,7 +385,10 @@ async def handle_context_change(session_id: str, parsed):
 
         elif action == "branch":
             # Fork from a previous commit
-            _, new_commit = await branch_from_commit(session_id, commit_id)
+            with observe_stage("db_update"):
+                _, new_commit = await branch_from_commit(session_id, commit_id, fence=fence)
+                if llm_usage:
+                    await update_commit(str(new_commit.commit_id), llm_usage=llm_usage)
             return JSONResponse(content={
                 "success": True,
                 "mode": "CONTEXT",
@@ -296,6 +405,9 @@ async def handle_context_change(session_id: str, parsed):
             "error": "Invalid context action"
         }, status_code=400)
 
+    except HeadConflictError as conflict:
+        return _head_conflict_response("CONTEXT", parsed.get("response"), conflict)
+
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(content={
@@ -303,3 +415,13 @@ async def handle_context_change(session_id: str, parsed):
             "mode": "CONTEXT",
             "error": str(e)
         }, status_code=500)
+
+def _head_conflict_response(mode: str, response, conflict: HeadConflictError):
+    """409 for a request whose HEAD write lost to a newer lease holder."""
+    SESSION_LOCK_EVENTS.labels(event="head_conflict").inc()
+    return JSONResponse(content={
+        "success": False,
+        "mode": mode,
+        "response": response,
+        "error": str(conflict)
+    }, status_code=409)
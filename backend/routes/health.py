@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from resources import check_health, accepting_transforms
+
+router = APIRouter()
+
+@router.get("/health", include_in_schema=False)
+async def liveness():
+    # the process is up; 503 once it is draining, so it stops getting traffic
+    if not accepting_transforms():
+        return JSONResponse(content={"status": "draining"}, status_code=503)
+    return {"status": "ok"}
+
+@router.get("/health/ready", include_in_schema=False)
+async def readiness():
+    health = await check_health()
+    return JSONResponse(content=health, status_code=200 if health["status"] == "ok" else 503)
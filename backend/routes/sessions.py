@@ -1,13 +1,22 @@
 import os
-from fastapi import APIRouter, File, UploadFile, Form
+from fastapi import APIRouter, File, UploadFile, Form, Request
 from fastapi.responses import JSONResponse
-from store import session_cache
-from session_management_2 import (create_new_session)
-from controllers.SessionController import (query_sessions)
+from urllib.parse import unquote_plus
+from session_management_2 import (create_new_session,
+                                  create_pending_session,
+                                  finalize_uploaded_session)
+from controllers.SessionController import (query_sessions,
+                                           get_session_by_session_id)
 from typing import Optional
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def _iter_upload(file: UploadFile):
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
 @router.get("/session-list")
 async def search_sessions(session_id: Optional[str] = None,
                           session_name: Optional[str] = None,
@@ -30,7 +39,77 @@ async def search_sessions(session_id: Optional[str] = None,
 async def create_session(file: UploadFile = File(...),
                          session_name: str = Form(default="Untitled Session")):
     try:
-        file_bytes = await file.read()
-        return await create_new_session(file_bytes, session_name)
+        return await create_new_session(_iter_upload(file), session_name)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.post("/create-session/stream")
+async def create_session_from_stream(request: Request,
+                                     session_name: str = "Untitled Session"):
+    """
+    Raw CSV request body instead of multipart, so the upload is ingested
+    as it arrives rather than after being spooled by the form parser.
+    """
+    try:
+        return await create_new_session(request.stream(), session_name)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.post("/create-session/upload-url")
+async def create_session_upload_url(session_name: str = Form(default="Untitled Session")):
+    """
+    Phase one of a direct browser upload: POST the file to upload.url with
+    upload.fields, then call /create-session/finalize.
+    """
+    try:
+        return await create_pending_session(session_name)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.post("/create-session/finalize")
+async def finalize_session_upload(session_id: str = Form(...)):
+    try:
+        return await finalize_uploaded_session(session_id)
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=409)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.post("/s3-events")
+async def handle_s3_event(request: Request):
+    """
+    Bucket notification webhook (S3 via a relay, MinIO, or a local
+    stand-in). Finalises sessions whose initial CSV has landed.
+    """
+    payload = await request.json()
+    finalized = []
+
+    for record in payload.get("Records", []):
+        if not record.get("eventName", "").startswith("ObjectCreated"):
+            continue
+
+        key = unquote_plus(record.get("s3", {}).get("object", {}).get("key", ""))
+        parts = key.split("/")
+        # initial uploads and CODE-commit snapshots share the
+        # <session_id>/<commit_id>/<commit_id>.csv layout
+        if len(parts) != 3 or parts[2] != f"{parts[1]}.csv":
+            continue
+
+        # only a session still waiting for its upload is finalised; for a
+        # snapshot this one read is all the event costs
+        session = await get_session_by_session_id(parts[0])
+        if session is None or session.upload_status != "PENDING":
+            continue
+
+        try:
+            session = await finalize_uploaded_session(parts[0])
+            if session and session.upload_status == "READY":
+                finalized.append(str(session.session_id))
+        except Exception as e:
+            print(f"Failed to finalise upload {key}: {e}")
+
+    return {"finalized": finalized}
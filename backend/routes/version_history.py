@@ -1,15 +1,86 @@
 import os
-from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
+import json
+import base64
+import hashlib
+from datetime import datetime
+from bson import ObjectId
+from fastapi import APIRouter, Query, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Optional, List, Tuple
+from models.commit import Commit
 from controllers.SessionController import (get_session_by_session_id)
-from controllers.CommitController import (query_commits, get_commit_by_id)
-from storage.storage_utils import get_file_list, generate_presigned_get_url
-from cache.signed_url_cache import get_signed_url
+from controllers.CommitController import (query_commit_fields,
+                                          get_commit_by_id,
+                                          get_generated_files_by_session_id)
+from controllers.CommitGraphController import (get_ancestors,
+                                               get_descendants,
+                                               get_lowest_common_ancestor,
+                                               get_lineage_diff)
+from storage.storage_utils import get_file_list
+from storage.snapshot_store import load_commit_diff
+from cache.signed_url_cache import get_signed_urls
 
 router = APIRouter()
 
+CHAT_HISTORY_FIELDS = ["query", "response", "mode", "parent_commit", "generated_files", "success", "error"]
+VERSION_HISTORY_FIELDS = ["parent_commit", "depth", "mode", "key_steps", "success", "generated_files"]
+SELECTABLE_FIELDS = set(Commit.model_fields) - {"id", "revision_id"}
+
+def _parse_fields(fields: Optional[str], default: List[str]) -> List[str]:
+    if not fields:
+        return default
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in SELECTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+def _encode_cursor(doc: dict) -> str:
+    raw = f"{doc['timestamp']}|{doc['commit_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, commit_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return timestamp, commit_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _list_commit_page(session_id: str, fields: List[str], cursor: Optional[str],
+                            since: Optional[datetime], limit: int):
+    docs = await query_commit_fields(session_id,
+                                     fields=fields,
+                                     after=_decode_cursor(cursor),
+                                     since=since,
+                                     limit=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(docs[-1])
+    return jsonable_encoder(docs, custom_encoder={ObjectId: str}), next_cursor
+
+def _etag_response(request: Request, payload: dict) -> Response:
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    # server_time changes on every call, so it must not feed the validator
+    versioned = {k: v for k, v in payload.items() if k != "server_time"}
+    etag = f'W/"{hashlib.sha1(json.dumps(versioned, separators=(",", ":")).encode("utf-8")).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/chat-history")
-async def get_chat_history(session_id: str, last_10: bool=True):
+async def get_chat_history(request: Request,
+                           session_id: str,
+                           fields: Optional[str] = None,
+                           cursor: Optional[str] = None,
+                           since: Optional[datetime] = None,
+                           limit: int = Query(default=100, ge=1, le=1000)):
     session = await get_session_by_session_id(session_id)
 
     if session is None:
@@ -17,22 +88,31 @@ async def get_chat_history(session_id: str, last_10: bool=True):
             "success": False,
             "msg": f"session_id {session_id} not found"
         })
-    
-    history = await query_commits(session_id=session_id, descending=False)
-    
-    commit_dicts = [commit.model_dump(mode="json") for commit in history]
+
+    # captured before the query so a delta client never misses a concurrent update
+    server_time = datetime.utcnow()
+    commit_dicts, next_cursor = await _list_commit_page(session_id,
+                                                        _parse_fields(fields, CHAT_HISTORY_FIELDS),
+                                                        cursor, since, limit)
 
     res = {
             "session_id": session_id,
-            "chat_history": commit_dicts
+            "chat_history": commit_dicts,
+            "next_cursor": next_cursor,
+            "server_time": server_time.isoformat()
         }
 
-    return JSONResponse(res)
+    return _etag_response(request, res)
 
 
 
 @router.get("/version-history")
-async def get_version_history(session_id:str):
+async def get_version_history(request: Request,
+                              session_id: str,
+                              fields: Optional[str] = None,
+                              cursor: Optional[str] = None,
+                              since: Optional[datetime] = None,
+                              limit: int = Query(default=200, ge=1, le=1000)):
     session = await get_session_by_session_id(session_id)
 
     if session is None:
@@ -41,17 +121,78 @@ async def get_version_history(session_id:str):
             "msg": f"session_id {session_id} not found"
         })
 
-    history = await query_commits(session_id=session_id, descending=False)
-
-    commit_dicts = [commit.model_dump(mode="json") for commit in history]
+    server_time = datetime.utcnow()
+    commit_dicts, next_cursor = await _list_commit_page(session_id,
+                                                        _parse_fields(fields, VERSION_HISTORY_FIELDS),
+                                                        cursor, since, limit)
 
     res = {
         "session_id": session_id,
         "head": session.head,
-        "commits": commit_dicts
+        "commits": commit_dicts,
+        "next_cursor": next_cursor,
+        "server_time": server_time.isoformat()
     }
 
-    return JSONResponse(res)
+    return _etag_response(request, res)
+
+@router.get("/commit-graph/ancestors")
+async def get_commit_ancestors(commit_id: str):
+    nodes = await get_ancestors(commit_id)
+    return JSONResponse({
+        "commit_id": commit_id,
+        "ancestors": [node.model_dump(mode="json") for node in nodes]
+    })
+
+@router.get("/commit-graph/descendants")
+async def get_commit_descendants(commit_id: str):
+    nodes = await get_descendants(commit_id)
+    return JSONResponse({
+        "commit_id": commit_id,
+        "descendants": [node.model_dump(mode="json") for node in nodes]
+    })
+
+@router.get("/commit-graph/lca")
+async def get_commit_lca(commit_a: str, commit_b: str):
+    lca = await get_lowest_common_ancestor(commit_a, commit_b)
+    return JSONResponse({
+        "commit_a": commit_a,
+        "commit_b": commit_b,
+        "lowest_common_ancestor": lca
+    })
+
+@router.get("/commit-graph/diff")
+async def get_commit_lineage_diff(commit_a: str, commit_b: str):
+    diff = await get_lineage_diff(commit_a, commit_b)
+    if diff is None:
+        return JSONResponse(status_code=404, content={"error": "Commit not found"})
+    return JSONResponse({
+        "commit_a": commit_a,
+        "commit_b": commit_b,
+        **diff
+    })
+
+@router.get("/commit-diff")
+async def get_commit_diff(commit_id: str):
+    commit = await get_commit_by_id(commit_id)
+    if not commit:
+        return JSONResponse(status_code=404, content={"error": "Commit not found"})
+
+    delta = await load_commit_diff(str(commit.session_id), commit_id)
+    if delta is None:
+        # stored delta missing; fall back to the counts kept on the commit
+        delta = commit.diff_summary
+    if delta is None:
+        return JSONResponse(status_code=404, content={"error": "No diff recorded for this commit"})
+
+    delta.pop("patch", None)
+    return JSONResponse({
+        "commit_id": commit_id,
+        "parent_commit": commit.parent_commit,
+        "snapshot_kind": commit.snapshot_kind,
+        "content_hash": commit.content_hash,
+        **delta
+    })
 
 @router.get("/list_commit_files")
 async def list_commit_files(session_id: str = Query(...), commit_id: str = Query(...)):
@@ -68,14 +209,17 @@ async def list_commit_files(session_id: str = Query(...), commit_id: str = Query
         if not s3_keys:
             return JSONResponse(status_code=404, content={"error": "No files found in this commit"})
 
-        # 3. Generate signed GET URLs
+        # 3. Generate signed GET URLs in one batch
+        signed_urls = await get_signed_urls(bucket=os.getenv("S3_BUCKET_NAME"),
+                                            s3_file_paths=[file.url for file in commit.generated_files])
+
         files = []
 
         for file in commit.generated_files:
             files.append({
                 "title": file.title,
                 "type": file.type,
-                "url": await get_signed_url(bucket=os.getenv("S3_BUCKET_NAME"), s3_file_path=file.url)
+                "url": signed_urls.get(file.url)
             })
         
         return JSONResponse(content={
@@ -85,3 +229,37 @@ async def list_commit_files(session_id: str = Query(...), commit_id: str = Query
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+@router.get("/list_session_files")
+async def list_session_files(session_id: str = Query(...)):
+    try:
+        session = await get_session_by_session_id(session_id)
+        if not session:
+            return JSONResponse(status_code=404, content={"error": "Invalid session ID"})
+
+        commits = await get_generated_files_by_session_id(session_id)
+
+        # sign every artifact of the session in a single batch
+        signed_urls = await get_signed_urls(bucket=os.getenv("S3_BUCKET_NAME"),
+                                            s3_file_paths=[f["url"] for c in commits for f in c["generated_files"]])
+
+        return JSONResponse(content={
+            "session_id": session_id,
+            "commits": [
+                {
+                    "commit_id": str(c["commit_id"]),
+                    "files": [
+                        {
+                            "title": f["title"],
+                            "type": f["type"],
+                            "url": signed_urls.get(f["url"])
+                        }
+                        for f in c["generated_files"]
+                    ]
+                }
+                for c in commits
+            ]
+        })
+
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
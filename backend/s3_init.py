@@ -1,9 +1,17 @@
 import os
 from dotenv import load_dotenv
 import boto3
+from botocore.config import Config
 
 load_dotenv()
 
+# botocore keeps 10 connections by default: fewer than the s3 executor
+# threads, and every upload_file fans out to several more of its own
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "64"))
+S3_CONNECT_TIMEOUT_S = float(os.getenv("S3_CONNECT_TIMEOUT_S", "5"))
+S3_READ_TIMEOUT_S = float(os.getenv("S3_READ_TIMEOUT_S", "60"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "3"))
+
 s3 = None
 
 async def init_s3():
@@ -15,13 +23,29 @@ async def init_s3():
             's3',
             aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
             aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+            region_name=os.getenv("AWS_DEFAULT_REGION", "us-west-2"),
+            config=Config(
+                max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                connect_timeout=S3_CONNECT_TIMEOUT_S,
+                read_timeout=S3_READ_TIMEOUT_S,
+                retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "adaptive"}
+            )
         )
 
         print("S3 connection successful.")
     except Exception as e:
         print("Error connecting to S3:", e)
 
+def ping_s3():
+    """Blocking HEAD of the bucket; call it through run_s3."""
+    get_s3().head_bucket(Bucket=os.getenv("S3_BUCKET_NAME"))
+
+async def close_s3():
+    global s3
+    if s3 is not None:
+        s3.close()
+        s3 = None
+
 def get_s3():
     if s3 is None:
         raise RuntimeError("S3 client is not initialized yet. Call init_s3() first.")
@@ -0,0 +1,51 @@
+import threading
+import pandas as pd
+import numpy as np
+import sklearn
+import matplotlib
+# generated code runs on worker threads, so never pick an interactive backend
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import seaborn as sns
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# pyplot keeps one current figure for the whole process: two scripts on the
+# exec pool at once would draw into, close or savefig each other's charts
+# (into the other commit's commit_dir). Generated code runs one script at a
+# time, and no figure outlives the script that opened it.
+_exec_lock = threading.Lock()
+
+@contextmanager
+def exclusive_exec():
+    with _exec_lock:
+        try:
+            yield
+        finally:
+            plt.close("all")
+
+def exec_namespaces(df: pd.DataFrame, commit_dir: str) -> Tuple[Dict, Dict]:
+    """(globals, locals) the generated code runs with."""
+    safe_globals = {
+        "__builtins__": __builtins__,
+        "pd": pd,
+        "np": np,
+        "sklearn": sklearn,
+        "plt": plt,
+        "sns": sns
+    }
+    local_vars = {
+        "df": df,
+        "commit_dir": commit_dir
+    }
+    return safe_globals, local_vars
+
+def execute_generated_code(code: str, df: pd.DataFrame, commit_dir: str) -> pd.DataFrame:
+    """
+    Runs LLM generated code against df and returns the resulting df.
+    Blocking; call it through run_exec.
+    """
+    safe_globals, local_vars = exec_namespaces(df, commit_dir)
+    with exclusive_exec():
+        exec(code, safe_globals, local_vars)
+    return local_vars["df"]
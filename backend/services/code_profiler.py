@@ -0,0 +1,159 @@
+import ast
+import io
+import os
+import time
+import cProfile
+import pstats
+import tracemalloc
+import pandas as pd
+from typing import Dict, List, Tuple
+from services.code_executor import exec_namespaces, exclusive_exec
+
+# artifacts written next to the charts in commit_dir
+PROFILE_REPORT_NAME = "exec_profile.md"
+PROFILE_STATS_NAME = "exec_profile.pstats"
+# statements / library calls kept in the summary stored on the commit
+PROFILE_TOP_N = int(os.getenv("EXEC_PROFILE_TOP_N", "8"))
+
+GENERATED_FILENAME = "<generated>"
+# frames of the profiling harness itself, left out of the hotspots
+_PROFILER_FRAMES = ("<built-in method builtins.exec>", "<method 'disable' of '_lsprof.Profiler' objects>")
+
+def _mb(n_bytes: int) -> float:
+    return round(n_bytes / 1024 / 1024, 2)
+
+def _statements(code: str) -> List[Tuple[int, str, object]]:
+    """Top-level statements of code as (line, source, code object), in order."""
+    tree = ast.parse(code, GENERATED_FILENAME)
+    statements = []
+    for node in tree.body:
+        module = ast.Module(body=[node], type_ignores=[])
+        source = ast.get_source_segment(code, node) or ""
+        statements.append((node.lineno, source, compile(module, GENERATED_FILENAME, "exec")))
+    return statements
+
+def _function_label(key: Tuple[str, int, str]) -> str:
+    filename, line, name = key
+    if filename == "~":
+        # builtins and C methods
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+def _hotspots(stats: pstats.Stats, limit: int) -> List[Dict]:
+    """Library calls by cumulative time, without the generated statements themselves."""
+    entries = []
+    for key, (_, calls, own, cumulative, _) in stats.stats.items():
+        if key[0] == GENERATED_FILENAME or key[2] in _PROFILER_FRAMES:
+            continue
+        entries.append({
+            "function": _function_label(key),
+            "calls": calls,
+            "cumulative_ms": round(cumulative * 1000, 2),
+            "own_ms": round(own * 1000, 2)
+        })
+    entries.sort(key=lambda e: e["cumulative_ms"], reverse=True)
+    return entries[:limit]
+
+def _one_line(source: str, width: int = 120) -> str:
+    line = " ".join(source.split())
+    return line if len(line) <= width else line[:width - 3] + "..."
+
+def _write_report(path: str, code: str, timings: List[Dict], stats: pstats.Stats,
+                  wall_ms: float, peak_bytes: int, error: str = None):
+    lines = [
+        "# Execution profile",
+        "",
+        f"- wall time: {wall_ms:.1f} ms (includes profiler overhead)",
+        f"- peak memory above start: {_mb(peak_bytes)} MB",
+    ]
+    if error:
+        lines.append(f"- failed: {error}")
+
+    lines += ["", "## Statements", "", "| line | ms | % | peak MB | statement |", "|---|---|---|---|---|"]
+    for t in timings:
+        share = 100 * t["ms"] / wall_ms if wall_ms else 0
+        source = _one_line(t["source"]).replace("|", "\\|")
+        lines.append(f"| {t['line']} | {t['ms']:.1f} | {share:.0f} | {t['peak_mb']} | `{source}` |")
+
+    buf = io.StringIO()
+    stats.stream = buf
+    stats.sort_stats("cumulative").print_stats(25)
+    stats.sort_stats("tottime").print_stats(15)
+    lines += ["", "## cProfile", "", "```", buf.getvalue().strip(), "```", "", "## Code", "", "```python", code, "```", ""]
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+def profile_generated_code(code: str, df: pd.DataFrame, commit_dir: str) -> Tuple[pd.DataFrame, Dict]:
+    """
+    execute_generated_code under cProfile and tracemalloc. Each top-level
+    statement is timed on its own, so the summary names the slow line, not
+    just the slow pandas call. Writes PROFILE_REPORT_NAME (readable) and
+    PROFILE_STATS_NAME (for snakeviz / pstats) to commit_dir and returns the
+    new df and a summary for the commit. Blocking; call it through run_exec.
+    """
+    safe_globals, local_vars = exec_namespaces(df, commit_dir)
+    statements = _statements(code)
+    profiler = cProfile.Profile()
+    timings = []
+    error = None
+
+    # also keeps the tracemalloc peaks attributable: no other script runs meanwhile
+    with exclusive_exec():
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        peak_bytes = 0
+        started = time.perf_counter()
+        try:
+            for line, source, compiled in statements:
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                statement_started = time.perf_counter()
+                try:
+                    profiler.enable()
+                    exec(compiled, safe_globals, local_vars)
+                finally:
+                    profiler.disable()
+                    _, peak = tracemalloc.get_traced_memory()
+                    peak_bytes = max(peak_bytes, peak - baseline)
+                    timings.append({
+                        "line": line,
+                        "source": source,
+                        "ms": round((time.perf_counter() - statement_started) * 1000, 2),
+                        "peak_mb": _mb(max(peak - before, 0))
+                    })
+        except Exception as e:
+            error = f"line {timings[-1]['line']}: {e}"
+            raise
+        finally:
+            wall_ms = (time.perf_counter() - started) * 1000
+            if started_tracing:
+                tracemalloc.stop()
+
+            stats = pstats.Stats(profiler)
+            stats.dump_stats(os.path.join(commit_dir, PROFILE_STATS_NAME))
+            _write_report(os.path.join(commit_dir, PROFILE_REPORT_NAME), code, timings, stats,
+                          wall_ms, peak_bytes, error)
+
+    summary = {
+        "wall_ms": round(wall_ms, 2),
+        "peak_memory_mb": _mb(peak_bytes),
+        "statements": [{**t, "source": _one_line(t["source"])}
+                       for t in sorted(timings, key=lambda t: t["ms"], reverse=True)[:PROFILE_TOP_N]],
+        "hotspots": _hotspots(stats, PROFILE_TOP_N),
+        "report": PROFILE_REPORT_NAME,
+        "stats": PROFILE_STATS_NAME
+    }
+    return local_vars["df"], summary
+
+def profile_for_prompt(commit_id: str, summary: Dict, top: int = 3) -> str:
+    """One changelog line for the transform prompt, so a "make it faster" request sees where time went."""
+    # lines under 1% of the run are noise for a rewrite
+    slow = [s for s in summary["statements"] if s["ms"] >= summary["wall_ms"] / 100][:top]
+    lines = "; ".join(f"line {s['line']} `{s['source']}` {s['ms']:.0f} ms (+{s['peak_mb']} MB)" for s in slow)
+    calls = "; ".join(f"{h['function']} {h['cumulative_ms']:.0f} ms x{h['calls']}"
+                      for h in summary["hotspots"][:top])
+    return (f"- {commit_id} execution profile: {summary['wall_ms']:.0f} ms, peak +{summary['peak_memory_mb']} MB. "
+            f"Slowest lines: {lines}. Slowest calls: {calls}.")
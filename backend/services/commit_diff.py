@@ -0,0 +1,143 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+# cell-level detail is only kept for at most this many changed cells
+MAX_SAMPLE_CELLS = 200
+MAX_PATCH_CELLS = 1_000_000
+
+def frame_content_hash(df: pd.DataFrame) -> str:
+    """Order-sensitive hash of a frame's values, column names and dtypes."""
+    digest = hashlib.sha256()
+    digest.update("|".join(f"{c}:{t}" for c, t in zip(df.columns, df.dtypes)).encode("utf-8"))
+    if len(df.columns):
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _row_hashes(df: pd.DataFrame, columns) -> pd.Series:
+    if not columns:
+        return pd.Series(np.zeros(len(df), dtype=np.uint64))
+    return pd.util.hash_pandas_object(df[columns], index=False).reset_index(drop=True)
+
+def _changed_mask(old: pd.Series, new: pd.Series) -> np.ndarray:
+    old = old.reset_index(drop=True)
+    new = new.reset_index(drop=True)
+    if old.dtype != new.dtype:
+        # compare through the hashes so values of different dtypes still line up
+        return (pd.util.hash_array(old.astype(object).to_numpy())
+                != pd.util.hash_array(new.astype(object).to_numpy()))
+    both_null = old.isna().to_numpy() & new.isna().to_numpy()
+    equal = (old == new).fillna(False).to_numpy(dtype=bool)
+    return ~(equal | both_null)
+
+def compute_frame_diff(parent: pd.DataFrame, child: pd.DataFrame) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Vectorised delta between a commit's parent frame and its result.
+
+    Returns (delta, patch). delta is a small JSON-able description: column
+    changes, row multiset changes via hashed row keys, and per-column
+    changed-cell counts when rows still line up positionally. patch holds
+    the frames needed by apply_frame_diff, or None when the change cannot be
+    expressed as a positional patch.
+    Blocking; call it through run_cpu.
+    """
+    parent_columns = list(parent.columns)
+    child_columns = list(child.columns)
+    common = [c for c in child_columns if c in parent_columns]
+    added = [c for c in child_columns if c not in parent_columns]
+    removed = [c for c in parent_columns if c not in child_columns]
+
+    parent_counts = _row_hashes(parent, common).value_counts()
+    child_counts = _row_hashes(child, common).value_counts()
+    balance = child_counts.sub(parent_counts, fill_value=0)
+
+    delta = {
+        "row_count": {"parent": int(len(parent)), "child": int(len(child))},
+        "columns_added": [str(c) for c in added],
+        "columns_removed": [str(c) for c in removed],
+        "dtype_changes": {
+            str(c): [str(parent[c].dtype), str(child[c].dtype)]
+            for c in common if parent[c].dtype != child[c].dtype
+        },
+        "rows_added": int(balance[balance > 0].sum()),
+        "rows_removed": int(-balance[balance < 0].sum()),
+        "row_alignment": "none",
+        "cells_changed": {},
+        "changed_cells_sample": []
+    }
+
+    aligned = (len(parent) == len(child)
+               and len(set(parent_columns)) == len(parent_columns)
+               and len(set(child_columns)) == len(child_columns))
+    if not aligned:
+        return delta, None
+
+    delta["row_alignment"] = "positional"
+    # new columns and columns whose dtype changed are stored whole; the rest
+    # only at the rows that changed
+    retyped = [c for c in common if parent[c].dtype != child[c].dtype]
+    full_columns = added + retyped
+    changed_rows = np.zeros(len(child), dtype=bool)
+    changed_columns = []
+
+    for column in common:
+        mask = _changed_mask(parent[column], child[column])
+        count = int(mask.sum())
+        if not count:
+            continue
+
+        if column not in retyped:
+            changed_columns.append(column)
+            changed_rows |= mask
+        delta["cells_changed"][str(column)] = count
+
+        room = MAX_SAMPLE_CELLS - len(delta["changed_cells_sample"])
+        for row in np.flatnonzero(mask)[:max(room, 0)]:
+            delta["changed_cells_sample"].append({
+                "row": int(row),
+                "column": str(column),
+                "old": None if pd.isna(parent[column].iloc[row]) else str(parent[column].iloc[row]),
+                "new": None if pd.isna(child[column].iloc[row]) else str(child[column].iloc[row])
+            })
+
+    rows = np.flatnonzero(changed_rows)
+    patch_cells = len(rows) * len(changed_columns) + len(child) * len(full_columns)
+    total_cells = max(len(child) * len(child_columns), 1)
+    delta["change_ratio"] = round(patch_cells / total_cells, 6)
+
+    if patch_cells > MAX_PATCH_CELLS:
+        return delta, None
+
+    changed = child[changed_columns].iloc[rows].reset_index(drop=True)
+    changed.insert(0, "__row", rows)
+
+    patch = {
+        "column_order": child_columns,
+        "removed": removed,
+        "changed": changed,
+        "full_columns": child[full_columns].reset_index(drop=True)
+    }
+    return delta, patch
+
+def apply_frame_diff(parent: pd.DataFrame, patch: Dict) -> pd.DataFrame:
+    """Rebuilds the child frame from its parent and a positional patch."""
+    df = parent.drop(columns=patch["removed"]).reset_index(drop=True)
+
+    changed = patch["changed"]
+    rows = changed["__row"].to_numpy()
+    for column in changed.columns:
+        if column == "__row":
+            continue
+        values = df[column]
+        if values.dtype != changed[column].dtype:
+            values = values.astype(changed[column].dtype)
+        else:
+            values = values.copy()
+        values.iloc[rows] = changed[column].array
+        df[column] = values
+
+    for column in patch["full_columns"].columns:
+        df[column] = patch["full_columns"][column].array
+
+    return df[patch["column_order"]]
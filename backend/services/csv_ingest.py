@@ -0,0 +1,151 @@
+import csv
+import io
+import re
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from typing import Dict, Optional, Tuple
+
+# Parse options and column types are detected once per CSV snapshot and
+# stored as a "csv_format" dict next to it:
+#   {"delimiter": ",", "encoding": "utf8", "column_types": {"col": "int64", ...}}
+# Later loads hand the stored types to the pyarrow reader and skip inference.
+
+DEFAULT_CSV_FORMAT = {"delimiter": ",", "encoding": "utf8"}
+
+TIMESTAMP_PARSERS = [pa_csv.ISO8601, "%Y-%m-%d %H:%M:%S", "%m/%d/%Y", "%d/%m/%Y %H:%M:%S"]
+
+_SIMPLE_TYPES = {
+    "bool": pa.bool_(),
+    "int8": pa.int8(), "int16": pa.int16(), "int32": pa.int32(), "int64": pa.int64(),
+    "uint8": pa.uint8(), "uint16": pa.uint16(), "uint32": pa.uint32(), "uint64": pa.uint64(),
+    "float": pa.float32(), "double": pa.float64(),
+    "string": pa.string(), "large_string": pa.large_string()
+}
+_TIMESTAMP_TYPE = re.compile(r"^timestamp\[(s|ms|us|ns)(?:, tz=(.+))?\]$")
+
+def _type_from_string(name: str) -> Optional[pa.DataType]:
+    if name in _SIMPLE_TYPES:
+        return _SIMPLE_TYPES[name]
+    if name.startswith("dictionary<values=string"):
+        return pa.dictionary(pa.int32(), pa.string())
+    match = _TIMESTAMP_TYPE.match(name)
+    if match:
+        return pa.timestamp(match.group(1), tz=match.group(2))
+    return None
+
+def _normalise_type(t: pa.DataType) -> str:
+    if pa.types.is_date(t):
+        # pandas has no date dtype; keep dates as datetime64 rather than objects
+        return "timestamp[s]"
+    if pa.types.is_dictionary(t) and (pa.types.is_string(t.value_type) or pa.types.is_large_string(t.value_type)):
+        # the CSV reader only builds dictionaries with int32 indices
+        return "dictionary<values=string, indices=int32>"
+    return str(t)
+
+def detect_csv_options(sample: bytes) -> Dict:
+    """Encoding and delimiter from the first bytes of a file."""
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf8"
+        text = sample[3:].decode("utf-8", errors="ignore")
+    else:
+        try:
+            text = sample.decode("utf-8")
+            encoding = "utf8"
+        except UnicodeDecodeError as e:
+            # a multi-byte character cut at the end of the sample is still utf-8
+            if e.start >= len(sample) - 3:
+                text = sample[:e.start].decode("utf-8")
+                encoding = "utf8"
+            else:
+                text = sample.decode("latin-1")
+                encoding = "latin-1"
+
+    try:
+        delimiter = csv.Sniffer().sniff(text[:64 * 1024], delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+
+    return {"delimiter": delimiter, "encoding": encoding}
+
+# pd.read_csv's default na_values: the same cells load as NaN in string
+# columns too, so isna/fillna/dropna in generated code behave as before
+NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+             "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+             "n/a", "nan", "null"]
+
+def _read_table(source, csv_format: Dict, use_column_types: bool = True) -> pa.Table:
+    column_types = {}
+    if use_column_types:
+        for column, type_name in (csv_format.get("column_types") or {}).items():
+            arrow_type = _type_from_string(type_name)
+            if arrow_type is not None:
+                column_types[column] = arrow_type
+
+    return pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(use_threads=True, encoding=csv_format.get("encoding", "utf8")),
+        parse_options=pa_csv.ParseOptions(delimiter=csv_format.get("delimiter", ",")),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types,
+                                              timestamp_parsers=TIMESTAMP_PARSERS,
+                                              null_values=NA_VALUES,
+                                              strings_can_be_null=True)
+    )
+
+def infer_csv_format(sample: bytes, complete: bool) -> Dict:
+    """
+    Detects parse options and column types from a sample. An incomplete
+    sample is cut back to whole lines before inference.
+    """
+    csv_format = detect_csv_options(sample)
+
+    if not complete:
+        cut = sample.rfind(b"\n")
+        if cut != -1:
+            sample = sample[:cut + 1]
+
+    table = _read_table(io.BytesIO(sample), csv_format, use_column_types=False)
+    csv_format["column_types"] = {field.name: _normalise_type(field.type) for field in table.schema}
+    return csv_format
+
+def csv_format_from_frame(df: pd.DataFrame) -> Dict:
+    """
+    Format of a snapshot written with df.to_csv(index=False). The dtypes are
+    already known, so nothing has to be inferred on the next load.
+    """
+    column_types = {}
+    for column in df.columns:
+        try:
+            field_type = pa.Schema.from_pandas(df[[column]], preserve_index=False).field(0).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            continue
+        if _type_from_string(_normalise_type(field_type)) is not None:
+            column_types[str(column)] = _normalise_type(field_type)
+
+    return {**DEFAULT_CSV_FORMAT, "column_types": column_types}
+
+def read_csv_fast(path, csv_format: Optional[Dict] = None) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Loads a CSV with the multithreaded pyarrow reader. Returns the frame and
+    the format that was actually used; when the stored types no longer fit
+    the file they are re-inferred and the new format is returned.
+    path may also be a binary file-like object.
+    Blocking; call it through run_cpu.
+    """
+    csv_format = dict(csv_format or DEFAULT_CSV_FORMAT)
+
+    try:
+        table = _read_table(path, csv_format)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not csv_format.get("column_types"):
+            raise
+        if hasattr(path, "seek"):
+            path.seek(0)
+        table = _read_table(path, csv_format, use_column_types=False)
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_date(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.timestamp("s")))
+
+    csv_format["column_types"] = {field.name: _normalise_type(field.type) for field in table.schema}
+    return table.to_pandas(), csv_format
@@ -0,0 +1,88 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Tuple
+
+# string columns become categorical when distinct values / rows is at most this
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MIN_ROWS = 50
+
+_DATE_LIKE = re.compile(r"^\s*(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4})([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?\s*$")
+
+def _downcast_integer(s: pd.Series) -> pd.Series:
+    kind = "unsigned" if s.min() >= 0 else "integer"
+    return pd.to_numeric(s, downcast=kind)
+
+def _downcast_float(s: pd.Series) -> pd.Series:
+    if s.dtype == np.float32:
+        return s
+    narrow = s.astype(np.float32)
+    # only keep float32 when every value survives the round trip
+    if np.array_equal(narrow.astype(s.dtype).to_numpy(), s.to_numpy(), equal_nan=True):
+        return narrow
+    return s
+
+def _convert_strings(s: pd.Series) -> pd.Series:
+    non_null = s.dropna()
+    if non_null.empty or not all(isinstance(v, str) for v in non_null.head(1000)):
+        return s
+
+    sample = non_null.head(100)
+    if sample.map(lambda v: bool(_DATE_LIKE.match(v))).all():
+        try:
+            parsed = pd.to_datetime(s, errors="raise")
+            if parsed.isna().sum() == s.isna().sum():
+                return parsed
+        except (ValueError, TypeError, OverflowError):
+            pass
+
+    if len(s) >= CATEGORY_MIN_ROWS and non_null.nunique() / len(s) <= CATEGORY_MAX_RATIO:
+        return s.astype("category")
+    return s
+
+def _same_csv_text(old: pd.Series, new: pd.Series) -> bool:
+    return old.to_csv(index=False, header=False) == new.to_csv(index=False, header=False)
+
+def optimize_dtypes(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Downcasting pass for writing a commit snapshot: narrower ints, float32
+    and datetime64 where the CSV text stays the same, categoricals for
+    low-cardinality strings. Returns the new frame and a report for the
+    commit; keep working on the original frame, the narrow dtypes are not
+    safe for further arithmetic. Blocking; call it through run_cpu.
+    """
+    memory_before = int(df.memory_usage(deep=True).sum())
+    converted = {}
+    df = df.copy(deep=False)
+
+    for i, column in enumerate(df.columns):
+        s = df.iloc[:, i]
+        try:
+            if isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(s):
+                new = s
+            elif pd.api.types.is_integer_dtype(s) and s.notna().any():
+                new = _downcast_integer(s)
+            elif pd.api.types.is_float_dtype(s):
+                new = _downcast_float(s)
+            elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+                new = _convert_strings(s)
+            else:
+                new = s
+
+            # float32 prints shorter digits and dates print ISO, so the
+            # snapshot would no longer hold the same values
+            if new.dtype.kind in "fM" and new.dtype != s.dtype and not _same_csv_text(s, new):
+                new = s
+        except Exception as e:
+            print(f"Skipping dtype optimisation of column {column}: {e}")
+            new = s
+
+        if new.dtype != s.dtype:
+            converted[str(column)] = f"{s.dtype} -> {new.dtype}"
+            df.isetitem(i, new)
+
+    return df, {
+        "memory_bytes_before": memory_before,
+        "memory_bytes_after": int(df.memory_usage(deep=True).sum()),
+        "converted_columns": converted
+    }
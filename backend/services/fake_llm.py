@@ -0,0 +1,54 @@
+import os
+import json
+import asyncio
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+# Offline stand-in for Gemini, enabled with LLM_PROVIDER=fake.
+# The user instruction scripts the reply:
+#   "CODE: <python>"        -> CODE mode running <python>
+#   "CHECKOUT: <commit_id>" -> CONTEXT checkout
+#   "BRANCH: <commit_id>"   -> CONTEXT branch
+#   anything else           -> CHAT echo
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+
+def _user_instruction(text: str) -> str:
+    return text.split("User Instruction:")[-1].strip()
+
+def _reply_for(messages) -> str:
+    text = messages[-1].content
+
+    if "transformation history" in text:
+        return 'state: "recorded history"\naction: "replayed offline"\noutcome: "summary generated"'
+
+    query = _user_instruction(text)
+
+    if query.startswith("CODE:"):
+        code = query[len("CODE:"):].strip()
+        return json.dumps({
+            "mode": "CODE",
+            "key_steps": f"ran: {code[:60]}",
+            "executable_code": code,
+            "response": "Applied the transformation."
+        })
+
+    for prefix, action in (("CHECKOUT:", "checkout"), ("BRANCH:", "branch")):
+        if query.startswith(prefix):
+            return json.dumps({
+                "mode": "CONTEXT",
+                "action": action,
+                "target_commit_id": query[len(prefix):].strip(),
+                "response": f"{action} done."
+            })
+
+    return json.dumps({"mode": "CHAT", "response": f"echo: {query}"})
+
+def _invoke(prompt_value) -> AIMessage:
+    return AIMessage(content=_reply_for(prompt_value.to_messages()))
+
+async def _ainvoke(prompt_value) -> AIMessage:
+    if FAKE_LLM_LATENCY_MS:
+        await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+    return _invoke(prompt_value)
+
+fake_llm = RunnableLambda(_invoke, afunc=_ainvoke)
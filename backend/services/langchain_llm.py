@@ -4,9 +4,14 @@ import dotenv
 dotenv.load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MODEL = "fake" if LLM_PROVIDER == "fake" else os.getenv("LLM_MODEL", "gemini-2.5-flash")
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key = GEMINI_API_KEY,
-    temperature=0.3
-)
\ No newline at end of file
+if LLM_PROVIDER == "fake":
+    from services.fake_llm import fake_llm as llm
+else:
+    llm = ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        google_api_key = GEMINI_API_KEY,
+        temperature=0.3
+    )
@@ -60,6 +60,10 @@ transform_prompt = ChatPromptTemplate.from_messages([
         or
         with open(f"{{commit_dir}}/summary.md", "w") as f: f.write(summary)
 
+        If Previous Steps include an execution profile and the user asks for faster
+        or leaner code, rewrite the slowest lines it names: prefer vectorised
+        pandas / numpy over apply, iterrows and Python loops, and avoid needless copies.
+
         You are provided the DataFrame as a variable named `df`. 
         - Do NOT use `pd.read_csv()` or try to load 'df.csv'.
         - The DataFrame is already available in memory.
@@ -0,0 +1,74 @@
+import os
+import time
+from typing import Dict, Tuple
+from langchain_core.messages import AIMessage
+from services.langchain_llm import LLM_MODEL
+from metrics import observe_stage, record_llm_usage
+from tracing import tracer
+
+# USD per million tokens. The defaults are Gemini 2.5 Flash list prices;
+# cached input is the part of the prompt served from the provider's cache.
+LLM_PRICE_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_INPUT_PER_MTOK", "0.30"))
+LLM_PRICE_CACHED_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_MTOK", "0.075"))
+LLM_PRICE_OUTPUT_PER_MTOK = float(os.getenv("LLM_PRICE_OUTPUT_PER_MTOK", "2.50"))
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English and code; only used when the
+    # provider reports no usage (the fake LLM)
+    return max(1, len(text) // 4) if text else 0
+
+def estimate_cost(input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+    uncached = max(input_tokens - cached_input_tokens, 0)
+    cost = (uncached * LLM_PRICE_INPUT_PER_MTOK
+            + cached_input_tokens * LLM_PRICE_CACHED_INPUT_PER_MTOK
+            + output_tokens * LLM_PRICE_OUTPUT_PER_MTOK) / 1_000_000
+    return round(cost, 8)
+
+def _prompt_text(chain, inputs: Dict) -> str:
+    # chains are prompt | llm; render just the prompt half
+    prompt = getattr(chain, "first", chain)
+    return prompt.invoke(inputs).to_string()
+
+def usage_from_response(response: AIMessage, stage: str, latency_ms: float, prompt_text: str) -> Dict:
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata:
+        input_tokens = metadata.get("input_tokens", 0)
+        output_tokens = metadata.get("output_tokens", 0)
+        cached_input_tokens = (metadata.get("input_token_details") or {}).get("cache_read", 0)
+        estimated = False
+    else:
+        input_tokens = estimate_tokens(prompt_text)
+        output_tokens = estimate_tokens(response.content)
+        cached_input_tokens = 0
+        estimated = True
+
+    return {
+        "stage": stage,
+        "model": LLM_MODEL,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "latency_ms": round(latency_ms, 1),
+        "cost_usd": estimate_cost(input_tokens, output_tokens, cached_input_tokens),
+        "estimated": estimated
+    }
+
+async def ainvoke_metered(chain, inputs: Dict, stage: str) -> Tuple[AIMessage, Dict]:
+    """
+    chain.ainvoke(inputs) plus a usage record: tokens in and out, provider
+    cache hits, latency and estimated cost. stage names the call site
+    ("transform", "summary") for the per-session breakdown.
+    """
+    with tracer.start_as_current_span(f"llm.{stage}", attributes={"llm.model": LLM_MODEL}) as span:
+        started = time.perf_counter()
+        with observe_stage("llm"):
+            response = await chain.ainvoke(inputs)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        prompt_text = "" if getattr(response, "usage_metadata", None) else _prompt_text(chain, inputs)
+        usage = usage_from_response(response, stage, latency_ms, prompt_text)
+        span.set_attributes({f"llm.{field}": usage[field]
+                             for field in ("input_tokens", "output_tokens", "cached_input_tokens",
+                                           "cost_usd", "estimated")})
+    record_llm_usage(usage)
+    return response, usage
@@ -0,0 +1,124 @@
+import os
+import asyncio
+import traceback
+from collections import Counter
+from typing import Dict, List, Optional, Set
+from bson import ObjectId
+from models.commit import Commit
+from controllers.SessionController import get_session_by_session_id
+from controllers.CommitController import get_commit_by_id, update_commit
+from storage.storage_utils import delete_object
+from storage.snapshot_store import BUCKET_NAME, snapshot_key, replay_commit
+
+# Full CSV snapshots are kept for branch heads, branch points, the session
+# HEAD and every Nth snapshot along a lineage. Every other CODE commit keeps
+# only its code and is replayed from the nearest full snapshot on demand,
+# so a checkout replays at most N - 1 commits. 0 disables tiering.
+SNAPSHOT_EVERY_N = int(os.getenv("SNAPSHOT_EVERY_N", "0"))
+
+TIERING_FIELDS = ["commit_id", "parent_commit", "ancestors", "depth", "mode", "code",
+                  "success", "snapshot_kind", "content_hash", "replay_verified", "is_deleted"]
+
+_tiering_sessions: Set[str] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+def _owns_snapshot(doc: dict) -> bool:
+    # mirrors CommitGraphController.SNAPSHOT_OWNER_QUERY
+    return doc.get("success", False) and (
+        doc.get("parent_commit") is None or (doc.get("mode") == "CODE" and doc.get("code") is not None)
+    )
+
+def select_tiering_candidates(docs: Dict[str, dict], head: Optional[str], every_n: int) -> List[str]:
+    """Commit ids whose full snapshot can be dropped, shallowest first."""
+    children = Counter(d["parent_commit"] for d in docs.values() if d.get("parent_commit"))
+
+    def owner(commit_id: Optional[str]) -> Optional[str]:
+        doc = docs.get(commit_id)
+        if doc is None:
+            return None
+        for node in [commit_id] + list(reversed(doc.get("ancestors", []))):
+            if node in docs and _owns_snapshot(docs[node]):
+                return node
+        return None
+
+    pinned = [cid for cid, d in docs.items() if not d.get("is_deleted") and children[cid] == 0]
+    pinned += [cid for cid in docs if children[cid] >= 2]
+    pinned.append(head)
+    protected = {owner(cid) for cid in pinned}
+
+    candidates = []
+    for commit_id, doc in docs.items():
+        if not _owns_snapshot(doc):
+            continue
+        index = sum(1 for a in doc.get("ancestors", []) if a in docs and _owns_snapshot(docs[a]))
+        if index % every_n == 0 or commit_id in protected:
+            continue
+        if (doc.get("parent_commit") and doc.get("snapshot_kind", "full") == "full"
+                and doc.get("content_hash") and doc.get("replay_verified") is not False):
+            candidates.append(commit_id)
+
+    return sorted(candidates, key=lambda cid: docs[cid].get("depth", 0))
+
+async def tier_session_snapshots(session_id: str, every_n: int = SNAPSHOT_EVERY_N) -> dict:
+    """
+    Drops the full CSV of every commit the tiering policy does not pin,
+    after checking that replaying its code reproduces the stored content hash.
+    """
+    report = {"session_id": session_id, "tiered": [], "nondeterministic": [], "skipped": False}
+    if every_n <= 0 or session_id in _tiering_sessions:
+        report["skipped"] = True
+        return report
+
+    _tiering_sessions.add(session_id)
+    try:
+        session = await get_session_by_session_id(session_id)
+        if not session:
+            return report
+
+        projection = {field: 1 for field in TIERING_FIELDS}
+        projection["_id"] = 0
+        cursor = Commit.get_motor_collection().find({"session_id": ObjectId(session_id)}, projection)
+        docs = {str(d["commit_id"]): d async for d in cursor}
+
+        for commit_id in select_tiering_candidates(docs, session.head, every_n):
+            commit = await get_commit_by_id(commit_id)
+            try:
+                await replay_commit(commit)
+            except Exception as e:
+                print(f"Keeping full snapshot of commit {commit_id}: {e}")
+                await update_commit(commit_id, replay_verified=False)
+                report["nondeterministic"].append(commit_id)
+                continue
+
+            key = snapshot_key(session_id, commit_id)
+            # flip the commit first so readers stop asking S3 for the object
+            await update_commit(commit_id,
+                                generated_files=[f for f in commit.generated_files if f.url != key],
+                                snapshot_kind="replay",
+                                replay_verified=True)
+            await delete_object(BUCKET_NAME, key)
+            report["tiered"].append(commit_id)
+
+        return report
+    finally:
+        _tiering_sessions.discard(session_id)
+
+def pending_tiering_tasks() -> Set[asyncio.Task]:
+    """Tiering passes still running in the background."""
+    return set(_background_tasks)
+
+def schedule_tiering(session_id: str):
+    """Runs a tiering pass in the background when tiering is enabled."""
+    if SNAPSHOT_EVERY_N <= 0 or session_id in _tiering_sessions:
+        return
+
+    async def run():
+        try:
+            await tier_session_snapshots(session_id)
+        except Exception:
+            traceback.print_exc()
+
+    task = asyncio.create_task(run())
+    # the loop only keeps weak references to tasks
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
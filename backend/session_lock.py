@@ -0,0 +1,143 @@
+import os
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from redis_init import get_redis_cache
+from controllers.SessionController import claim_head_fence
+from metrics import SESSION_LOCK_WAIT, SESSION_LOCK_EVENTS
+from tracing import tracer
+
+# One transform per session at a time, across every worker: an in-process
+# FIFO queue per session, then a Redis lease shared by all workers. The
+# lease expires unless renewed, so a crashed worker frees its sessions;
+# HEAD writes also carry a fencing token from Mongo, so a request that
+# lost its lease can no longer move HEAD. Sessions never wait on each other.
+SESSION_LOCK_TTL_MS = int(os.getenv("SESSION_LOCK_TTL_MS", "30000"))
+SESSION_LOCK_WAIT_TIMEOUT_S = float(os.getenv("SESSION_LOCK_WAIT_TIMEOUT_S", "300"))
+SESSION_LOCK_POLL_MIN_MS = 20
+SESSION_LOCK_POLL_MAX_MS = 250
+
+class SessionLockTimeout(Exception):
+    """The session stayed busy for longer than SESSION_LOCK_WAIT_TIMEOUT_S."""
+
+class SessionLease:
+    def __init__(self, session_id: str, token: str, fence: Optional[int]):
+        self.session_id = session_id
+        self.token = token
+        # pass to update_session(fence=...) for every HEAD write
+        self.fence = fence
+        self.lost = False
+
+# session_id -> [in-process lock, requests holding or waiting for it]
+_local_locks: Dict[str, list] = {}
+
+def _lock_key(session_id: str) -> str:
+    return f"session_lock:{session_id}"
+
+def waiting_requests() -> int:
+    """Requests queued behind another one on their session, in this worker."""
+    return sum(max(users - 1, 0) for _, users in _local_locks.values())
+
+async def _acquire_redis(key: str, token: str, deadline: float) -> bool:
+    """Polls SET NX until it wins or the deadline passes; True if it had to wait."""
+    redis = get_redis_cache()
+    delay = SESSION_LOCK_POLL_MIN_MS / 1000
+    waited = False
+    while not await redis.set(key, token, nx=True, px=SESSION_LOCK_TTL_MS):
+        waited = True
+        if time.monotonic() + delay > deadline:
+            raise SessionLockTimeout(f"{key} is held by another worker")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, SESSION_LOCK_POLL_MAX_MS / 1000)
+    return waited
+
+async def _if_owner(key: str, token: str, action) -> bool:
+    """Runs action(pipe) atomically if the lease is still ours (WATCH/MULTI)."""
+    redis = get_redis_cache()
+    async with redis.pipeline(transaction=True) as pipe:
+        await pipe.watch(key)
+        if await pipe.get(key) != token:
+            await pipe.unwatch()
+            return False
+        pipe.multi()
+        action(pipe)
+        await pipe.execute()
+        return True
+
+async def _renew(lease: SessionLease):
+    key = _lock_key(lease.session_id)
+    while True:
+        await asyncio.sleep(SESSION_LOCK_TTL_MS / 3000)
+        try:
+            renewed = await _if_owner(key, lease.token, lambda pipe: pipe.pexpire(key, SESSION_LOCK_TTL_MS))
+        except Exception as e:
+            print(f"Session lease renewal failed for {lease.session_id}:", e)
+            continue
+        if not renewed:
+            lease.lost = True
+            SESSION_LOCK_EVENTS.labels(event="lost").inc()
+            print(f"Session lease for {lease.session_id} expired while in use")
+            return
+
+@asynccontextmanager
+async def session_lease(session_id: str, timeout: float = SESSION_LOCK_WAIT_TIMEOUT_S):
+    """
+    Holds the session's lease for the block, queueing behind earlier
+    requests on the same session. Raises SessionLockTimeout after timeout.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    entry = _local_locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    local_lock = entry[0]
+
+    key, token = _lock_key(session_id), uuid.uuid4().hex
+    holds_local = holds_redis = False
+    renewal = None
+    try:
+        with tracer.start_as_current_span("session_lock.acquire", attributes={"cellcraft.session_id": session_id}) as span:
+            # anyone else holding or queued on this session in this worker
+            contended = entry[1] > 1
+            try:
+                await asyncio.wait_for(local_lock.acquire(), timeout)
+                holds_local = True
+                try:
+                    contended = await _acquire_redis(key, token, deadline) or contended
+                    holds_redis = True
+                except SessionLockTimeout:
+                    raise
+                except Exception as e:
+                    # no Redis: still one request per session in this worker,
+                    # and the fence keeps other workers from clobbering HEAD
+                    SESSION_LOCK_EVENTS.labels(event="redis_error").inc()
+                    print(f"Session lease for {session_id} without Redis:", e)
+            except (asyncio.TimeoutError, SessionLockTimeout):
+                SESSION_LOCK_EVENTS.labels(event="timeout").inc()
+                raise SessionLockTimeout(f"Session {session_id} is busy with another request")
+            finally:
+                waited = time.monotonic() - started
+                SESSION_LOCK_WAIT.observe(waited)
+                span.set_attribute("session_lock.wait_ms", round(waited * 1000, 2))
+
+            if contended:
+                SESSION_LOCK_EVENTS.labels(event="contended").inc()
+
+        lease = SessionLease(session_id, token, await claim_head_fence(session_id))
+        if holds_redis:
+            renewal = asyncio.create_task(_renew(lease))
+        yield lease
+    finally:
+        if renewal:
+            renewal.cancel()
+        if holds_redis:
+            try:
+                await _if_owner(key, token, lambda pipe: pipe.delete(key))
+            except Exception as e:
+                print(f"Session lease release failed for {session_id}:", e)
+        if holds_local:
+            local_lock.release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            _local_locks.pop(session_id, None)
@@ -6,9 +6,12 @@ import hashlib
 import datetime
 import traceback
 from typing import Union, Optional
+from store import init_local_store, get_local_store
 
 SESSION_ROOT = "session_data"
+# legacy JSON store, imported into SESSION_STORE_DB on first start
 SESSION_STORE_FILE = os.path.join(SESSION_ROOT, "session_store.json")
+SESSION_STORE_DB = os.path.join(SESSION_ROOT, "session_store.db")
 SESSION_FILES_DIR = os.path.join(SESSION_ROOT, "session_files")
 
 def generate_commit_id(content: Union[str, bytes]) -> str:
@@ -24,16 +27,22 @@ def generate_commit_id(content: Union[str, bytes]) -> str:
     combined = content_str + now
     return hashlib.sha256(combined.encode("utf-8")).hexdigest()[:8]
 
+def _store():
+    try:
+        return get_local_store()
+    except RuntimeError:
+        # used outside the app (scripts); open the store on first use
+        os.makedirs(SESSION_ROOT, exist_ok=True)
+        return init_local_store(SESSION_STORE_DB, SESSION_STORE_FILE)
+
 # Load and save full session store
 def load_session_store():
-    if os.path.exists(SESSION_STORE_FILE):
-        with open(SESSION_STORE_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    return _store().list_sessions()
 
 def save_session_store(store):
-    with open(SESSION_STORE_FILE, "w") as f:
-        json.dump(store, f, indent=2)
+    # kept for callers that still pass the whole store; prefer _store().put_session
+    for session in store.values():
+        _store().put_session(session)
 
 def create_new_session(file_bytes: bytes, session_name: str) -> dict:
     try:
@@ -65,22 +74,17 @@ def create_new_session(file_bytes: bytes, session_name: str) -> dict:
             "error": None
         }
 
-        history_path = os.path.join(session_dir, f"{session_id}_transform_history.json")
-        with open(history_path, "w") as f:
-            json.dump([initial_commit], f, indent=2)
-
         session_info = {
             "session_id": session_id,
             "session_name": session_name,
             "head": commit_id,
             "last_csv_path": csv_path,
-            "history_path": history_path,
+            # history lives in the session store's commit log
+            "history_path": None,
             "session_dir": session_dir
         }
 
-        session_store = load_session_store()
-        session_store[session_id] = session_info
-        save_session_store(session_store)
+        _store().commit(session_info, initial_commit)
 
         return session_info
 
@@ -114,26 +118,15 @@ def apply_transform_and_checkpoint(session, df: pd.DataFrame, step: dict, commit
         **step
     }
 
-    # Update history
-    history_path = session["history_path"]
-    with open(history_path, "r") as f:
-        history = json.load(f)
-    history.append(commit_record)
-    with open(history_path, "w") as f:
-        json.dump(history, f, indent=2)
-
     session["head"] = commit_id
     session["last_csv_path"] = new_csv_path
 
-    session_store = load_session_store()
-    session_store[session_id] = session
-    save_session_store(session_store)
+    # Append to history and move HEAD in one transaction
+    _store().commit(session, commit_record)
 
     return session, commit_record
 
 def update_history(session, step: dict):
-    session_id = session["session_id"]
-    session_dir = session["session_dir"]
     parent_commit = session.get("head")
 
     # Generate new commit ID
@@ -148,26 +141,14 @@ def update_history(session, step: dict):
         **step
     }
 
-    # Append to history
-    with open(session["history_path"], "r") as f:
-        history = json.load(f)
-    history.append(commit_record)
-    with open(session["history_path"], "w") as f:
-        json.dump(history, f, indent=2)
-
-    # Update session head
+    # Update session head and append to history
     session["head"] = commit_id
-
-    # Save session store
-    session_store = load_session_store()
-    session_store[session_id] = session
-    save_session_store(session_store)
+    _store().commit(session, commit_record)
 
     return session, commit_record
 
 def list_commits(session: dict) -> list:
-    with open(session["history_path"], "r") as f:
-        history = json.load(f)
+    history = _store().get_history(session["session_id"], mode="CODE")
 
     return [
         {
@@ -181,7 +162,6 @@ def list_commits(session: dict) -> list:
     ]
 
 def branch_from_commit(session: dict, target_commit_id: str) -> dict:
-    session_id = session["session_id"]
     session_dir = session["session_dir"]
 
     source_csv = os.path.join(session_dir, f"{target_commit_id}.csv")
@@ -212,26 +192,14 @@ def branch_from_commit(session: dict, target_commit_id: str) -> dict:
         **branch_step
     }
 
-    # Append to history
-    with open(session["history_path"], "r") as f:
-        history = json.load(f)
-    history.append(commit_record)
-    with open(session["history_path"], "w") as f:
-        json.dump(history, f, indent=2)
-
-    # Update session state
+    # Update session state and append to history
     session["head"] = new_commit_id
     session["last_csv_path"] = new_csv_path
-
-    # Persist session changes
-    session_store = load_session_store()
-    session_store[session_id] = session
-    save_session_store(session_store)
+    _store().commit(session, commit_record)
 
     return session
 
 def set_head(session: dict, commit_id: str) -> dict:
-    session_id = session["session_id"]
     session_dir = session["session_dir"]
     csv_path = os.path.join(session_dir, f"{commit_id}\{commit_id}.csv")
 
@@ -242,8 +210,6 @@ def set_head(session: dict, commit_id: str) -> dict:
     session["last_csv_path"] = csv_path
 
     # Save back to session store
-    session_store = load_session_store()
-    session_store[session_id] = session
-    save_session_store(session_store)
+    _store().put_session(session)
 
     return session
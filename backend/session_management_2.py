@@ -1,24 +1,42 @@
-from storage.storage_utils import get_s3
-from storage.storage_utils import upload_file_from_path
+from storage.storage_utils import upload_file_from_path, supports_direct_upload, delete_object
+from storage.blob_store import local_cache_path
+from storage.storage_utils import (generate_presigned_post_url,
+                                   get_object_metadata,
+                                   read_object_range)
+from storage.streaming_ingest import (ingest_stream,
+                                      profile_csv_sample,
+                                      PROFILE_SAMPLE_BYTES)
 from controllers.SessionController import (create_session,
                                            update_session,
                                            get_session_by_session_id)
 from controllers.CommitController import (create_commit,
                                           update_commit,
-                                          get_commit_by_id)
+                                          get_commit_by_id,
+                                          get_initial_commit)
+from controllers.CommitGraphController import get_snapshot_commit
+from storage.snapshot_store import snapshot_key
 import tempfile
 import os
+from executors import run_io, run_cpu
 from models.requestModels.commit import GeneratedFile
 from dotenv import load_dotenv
 import traceback
 import pandas as pd
-from typing import Optional
+from typing import Optional, AsyncIterator
 
 load_dotenv()
 
 BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
-
-async def create_new_session(file_bytes: bytes, session_name: str) -> dict:
+DIRECT_UPLOAD_EXPIRY_SECONDS = int(os.getenv("DIRECT_UPLOAD_EXPIRY_SECONDS", "3600"))
+MAX_DIRECT_UPLOAD_BYTES = int(os.getenv("MAX_DIRECT_UPLOAD_BYTES", str(10 * 1024 ** 3)))
+
+async def create_new_session(chunks: AsyncIterator[bytes], session_name: str) -> dict:
+    """
+    Creates a session from an uploaded CSV streamed in chunks. The bytes go
+    straight to S3 (multipart) and to the local CSV cache used by
+    transform_csv, so memory use does not depend on the file size.
+    """
+    session_doc = commit_doc = s3_file_path = None
     try:
 
         # Create Session in DB
@@ -43,40 +61,153 @@ async def create_new_session(file_bytes: bytes, session_name: str) -> dict:
             error=None
         )
 
-        # Create temp file
-        temp_dir = tempfile.mkdtemp()
-        csv_path = os.path.join(temp_dir, f"{commit_doc.commit_id}.csv")
-        with open(csv_path, "wb") as f:
-            f.write(file_bytes)
-
-        # Upload to S3
-        s3_file_path = await upload_file_from_path(
+        # Stream to S3 and the local cache
+        filename = f"{commit_doc.commit_id}.csv"
+        s3_file_path = f"{session_doc.session_id}/{commit_doc.commit_id}/{filename}"
+        source_profile = await ingest_stream(
             bucket=BUCKET_NAME,
-            local_path=csv_path,
-            session_id=session_doc.session_id,
-            commit_id=commit_doc.commit_id,
-            filename=f"{commit_doc.commit_id}.csv"
+            s3_key=s3_file_path,
+            local_path=local_cache_path(s3_file_path),
+            chunks=chunks
         )
 
         # Create Commit in DB
         generated_file = GeneratedFile(
-            title=f"{commit_doc.commit_id}.csv",
+            title=filename,
             type="csv",
             url=s3_file_path
         )
 
-        await update_commit(commit_doc.commit_id, generated_files=[generated_file])
+        csv_format = source_profile.pop("csv_format", None)
+
+        await update_commit(commit_doc.commit_id, generated_files=[generated_file], csv_format=csv_format)
         session_info = await update_session(session_doc.session_id,
                              head=str(commit_doc.commit_id),
                              last_csv_path=f"{s3_file_path}",
-                             session_dir=f"{session_doc.session_id}/")
+                             session_dir=f"{session_doc.session_id}/",
+                             source_profile=source_profile,
+                             csv_format=csv_format)
         
         return session_info
 
     except Exception as e:
         traceback.print_exc()
         print(f"Error in create_new_session: {e}")
-        return {}
+        await _discard_partial_session(session_doc, commit_doc, s3_file_path)
+        raise
+
+async def _discard_partial_session(session_doc, commit_doc, s3_file_path: Optional[str]):
+    """Removes what a failed create_new_session already wrote, so no half-created session is left behind."""
+    if s3_file_path:
+        await delete_object(BUCKET_NAME, s3_file_path)
+        local_path = local_cache_path(s3_file_path)
+        if await run_io(os.path.exists, local_path):
+            await run_io(os.remove, local_path)
+    for doc in (commit_doc, session_doc):
+        if doc is None:
+            continue
+        try:
+            await doc.delete()
+        except Exception as e:
+            print(f"Failed to delete partial {type(doc).__name__} {doc.id}:", e)
+
+async def create_pending_session(session_name: str) -> dict:
+    """
+    First phase of a direct-to-S3 upload: creates the session and its
+    initial commit, and returns a presigned POST for the CSV key.
+    """
+    if not supports_direct_upload():
+        raise ValueError("Direct uploads need the S3 blob backend; use /create-session/stream")
+
+    session_doc = await create_session(
+        session_name=session_name,
+        head=None,
+        last_csv_path=None,
+        history_path=None,
+        session_dir=None,
+        upload_status="PENDING"
+    )
+
+    commit_doc = await create_commit(
+        session_id=str(session_doc.session_id),
+        query="Initial upload",
+        mode="CHAT",
+        key_steps="Initial file upload",
+        response=None,
+        code=None,
+        parent_commit=None,
+        generated_files=[],
+        success=True,
+        error=None
+    )
+
+    s3_file_path = f"{session_doc.session_id}/{commit_doc.commit_id}/{commit_doc.commit_id}.csv"
+    presigned_post = await generate_presigned_post_url(
+        BUCKET_NAME,
+        s3_file_path,
+        expires_in=DIRECT_UPLOAD_EXPIRY_SECONDS,
+        conditions=[["content-length-range", 1, MAX_DIRECT_UPLOAD_BYTES]]
+    )
+
+    return {
+        "session_id": str(session_doc.session_id),
+        "commit_id": str(commit_doc.commit_id),
+        "s3_key": s3_file_path,
+        "upload": presigned_post
+    }
+
+async def finalize_uploaded_session(session_id: str):
+    """
+    Second phase: verifies the uploaded object and points the session at
+    it. Safe to call more than once (client finalise + S3 event).
+    """
+    session_doc = await get_session_by_session_id(session_id)
+    if not session_doc:
+        raise ValueError(f"Session {session_id} not found")
+
+    if session_doc.upload_status != "PENDING":
+        return session_doc
+
+    commit_doc = await get_initial_commit(session_id)
+    if not commit_doc:
+        raise ValueError(f"Session {session_id} has no initial commit")
+
+    filename = f"{commit_doc.commit_id}.csv"
+    s3_file_path = f"{session_id}/{commit_doc.commit_id}/{filename}"
+
+    metadata = await get_object_metadata(BUCKET_NAME, s3_file_path)
+    if not metadata or metadata.get("ContentLength", 0) == 0:
+        raise FileNotFoundError(f"Upload for session {session_id} not found in S3")
+
+    # profile from a ranged read of the head of the object, never the whole file
+    size = metadata["ContentLength"]
+    sample = await read_object_range(BUCKET_NAME, s3_file_path, 0, min(size, PROFILE_SAMPLE_BYTES) - 1)
+
+    source_profile = {
+        "size_bytes": size,
+        "etag": metadata.get("ETag", "").strip('"')
+    }
+    try:
+        source_profile.update(await run_cpu(profile_csv_sample, sample, size <= len(sample)))
+    except Exception as e:
+        raise ValueError(f"Uploaded file is not a readable CSV: {e}") from e
+
+    generated_file = GeneratedFile(
+        title=filename,
+        type="csv",
+        url=s3_file_path
+    )
+
+    csv_format = source_profile.pop("csv_format", None)
+
+    await update_commit(str(commit_doc.commit_id), generated_files=[generated_file], csv_format=csv_format)
+    return await update_session(session_id,
+                                head=str(commit_doc.commit_id),
+                                last_csv_path=s3_file_path,
+                                session_dir=f"{session_id}/",
+                                source_profile=source_profile,
+                                upload_status="READY",
+                                csv_format=csv_format)
 
 async def apply_transform_and_checkpoint(session_id: str, df: pd.DataFrame, step: dict):
     # 1. Get session document
@@ -103,11 +234,11 @@ async def apply_transform_and_checkpoint(session_id: str, df: pd.DataFrame, step
     commit_id = str(commit_doc.commit_id)
 
     # 3. Save CSV locally and upload to S3
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = await run_io(tempfile.mkdtemp)
     local_csv_path = os.path.join(temp_dir, f"{commit_id}.csv")
-    df.to_csv(local_csv_path, index=False)
+    await run_cpu(df.to_csv, local_csv_path, index=False)
 
-    s3_file_path = upload_file_from_path(
+    s3_file_path = await upload_file_from_path(
         bucket=BUCKET_NAME,
         local_path=local_csv_path,
         session_id=session_id,
@@ -133,28 +264,25 @@ async def apply_transform_and_checkpoint(session_id: str, df: pd.DataFrame, step
 
     return session_doc, commit_doc
 
-async def branch_from_commit(session_id: str, parent_commit_id: str) -> dict:
+async def branch_from_commit(session_id: str, parent_commit_id: str, fence: Optional[int] = None) -> dict:
+    """
+    Starts a branch at parent_commit_id. The branch commit is a pure metadata
+    reference to the snapshot already in S3, so nothing is downloaded or
+    copied; the DataFrame is only materialised when a CODE request needs it.
+    """
     # 1. Get session info
     session = await get_session_by_session_id(session_id)
     if not session:
         raise ValueError(f"Session {session_id} not found")
 
-    # 2. Get CSV key for target commit (assume it's stored or same as head)
-    temp_path = f"session_files/{session_id}/{parent_commit_id}/{parent_commit_id}.csv"
-
-    # 3. Download the original CSV file to a temp file
-    s3 = get_s3()
-    s3.download_file(
-        BUCKET_NAME,
-        f"session_files/{session_id}/{parent_commit_id}/{parent_commit_id}.csv",
-        temp_path
-    )
+    # 2. Resolve the snapshot holding the data state at the target commit
+    source = await _resolve_snapshot(session_id, parent_commit_id)
 
-    # 4. Create new commit document (child of target_commit_id)
+    # 3. Create new commit document (child of target_commit_id)
     commit_doc = await create_commit(
         session_id=session_id,
         query=f"Branched from {parent_commit_id}",
-        mode="CODE",
+        mode="CONTEXT",
         key_steps="Branch created",
         response=None,
         code=None,
@@ -163,41 +291,36 @@ async def branch_from_commit(session_id: str, parent_commit_id: str) -> dict:
         success=True,
         error=None
     )
-    new_commit_id = str(commit_doc.commit_id)
 
-
-    # 5. Upload copied CSV to new S3 path
-    s3_file_path = upload_file_from_path(
-        bucket=BUCKET_NAME,
-        local_path=temp_path,
-        session_id=session_id,
-        commit_id=new_commit_id,
-        filename=f"{new_commit_id}.csv"
-    )
-
-    # 6. Update commit with new file info
-    generated_file = GeneratedFile(
-        name=f"{new_commit_id}.csv",
-        file_type="csv",
-        url=f"session_files/{session_id}/{parent_commit_id}/{parent_commit_id}.csv"
-    )
-    
-    commit_doc = await update_commit(new_commit_id, generated_files=[generated_file])
-
-    # 7. Update session head + last_csv_path
+    # 4. Point HEAD at the branch and last_csv_path at the shared snapshot
     session_doc = await update_session(
         session_id=session_id,
-        head=new_commit_id,
-        last_csv_path=s3_file_path
+        head=str(commit_doc.commit_id),
+        last_csv_path=snapshot_key(session_id, str(source.commit_id)),
+        csv_format=source.csv_format,
+        fence=fence
     )
 
     return session_doc, commit_doc
 
-async def set_head(session_id: str, commit_id: str) -> dict:
-    session_doc = get_session_by_session_id(session_id)
-    commit_doc = get_commit_by_id(commit_id)
+async def set_head(session_id: str, commit_id: str, fence: Optional[int] = None) -> dict:
+    """Checks out commit_id; like branching this only moves references."""
+    source = await _resolve_snapshot(session_id, commit_id)
 
-    session_doc = await update_session(head=commit_doc.commit_id,
-                                       last_csv_path=f"{commit_doc.commit_id}\{commit_doc.commit_id}.csv")
+    session_doc = await update_session(session_id=session_id,
+                                       head=commit_id,
+                                       last_csv_path=snapshot_key(session_id, str(source.commit_id)),
+                                       csv_format=source.csv_format,
+                                       fence=fence)
 
     return session_doc
+
+async def _resolve_snapshot(session_id: str, commit_id: str):
+    commit = await get_commit_by_id(commit_id)
+    if not commit or str(commit.session_id) != session_id:
+        raise ValueError(f"Commit {commit_id} not found in session {session_id}")
+
+    source = await get_snapshot_commit(commit_id)
+    if not source:
+        raise ValueError(f"Commit {commit_id} has no data snapshot to check out")
+    return source
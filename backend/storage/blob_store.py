@@ -0,0 +1,452 @@
+import os
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+from dotenv import load_dotenv
+from executors import run_io, run_s3
+
+load_dotenv()
+
+# Where session artifacts live. "s3" (default) keeps them in S3_BUCKET_NAME;
+# "local" keeps them on disk under BLOB_LOCAL_ROOT and needs no S3 at all;
+# "memory" is for tests and benchmarks.
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "s3")
+# working copies of snapshots and commit folders, keyed like the blobs
+LOCAL_CACHE_DIR = os.getenv("LOCAL_CACHE_DIR", "session_files")
+BLOB_LOCAL_ROOT = os.getenv("BLOB_LOCAL_ROOT", LOCAL_CACHE_DIR)
+# url prefix the app serves blobs under when there is nothing to presign
+BLOB_URL_PREFIX = os.getenv("BLOB_URL_PREFIX", "/static")
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+# S3 requires every part but the last to be at least 5 MiB
+MULTIPART_PART_SIZE = int(os.getenv("INGEST_PART_SIZE", str(8 * 1024 * 1024)))
+
+def local_cache_path(key: str) -> str:
+    """Local working copy of a blob: <LOCAL_CACHE_DIR>/<key>."""
+    return os.path.join(LOCAL_CACHE_DIR, key)
+
+class BlobWriter(ABC):
+    """Incremental writer returned by BlobStore.open_writer."""
+
+    @abstractmethod
+    async def write(self, chunk: bytes):
+        ...
+
+    @abstractmethod
+    async def close(self) -> int:
+        """Publishes the blob and returns its size."""
+
+    @abstractmethod
+    async def abort(self):
+        ...
+
+class BlobStore(ABC):
+    """
+    Key/value storage for session artifacts. Keys are "/"-separated paths
+    such as <session_id>/<commit_id>/<commit_id>.csv. Ranges are inclusive
+    byte offsets, like HTTP Range headers.
+    """
+
+    @abstractmethod
+    async def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None):
+        ...
+
+    @abstractmethod
+    async def put_file(self, key: str, path: str):
+        ...
+
+    @abstractmethod
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def read_range(self, key: str, start: int, end: int) -> bytes:
+        ...
+
+    @abstractmethod
+    async def stream(self, key: str, start: int = 0, end: Optional[int] = None,
+                     chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        ...
+
+    @abstractmethod
+    async def download_to(self, key: str, path: str):
+        ...
+
+    @abstractmethod
+    async def head(self, key: str) -> Optional[Dict]:
+        """{"size", "etag", "content_type"} or None when the key does not exist."""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def list(self, prefix: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def open_writer(self, key: str) -> BlobWriter:
+        ...
+
+    def url_for(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        return f"{BLOB_URL_PREFIX}/{key}"
+
+    def local_path(self, key: str) -> Optional[str]:
+        """A file that can be served or read in place, if the backend has one."""
+        return None
+
+# === S3 ===
+
+class _S3Writer(BlobWriter):
+    def __init__(self, store: "S3BlobStore", key: str):
+        self._store = store
+        self._key = key
+        self._upload_id = None
+        self._parts = []
+        self._buffer = bytearray()
+        self._size = 0
+
+    async def start(self):
+        response = await run_s3(self._store.s3.create_multipart_upload, Bucket=self._store.bucket, Key=self._key)
+        self._upload_id = response["UploadId"]
+
+    async def write(self, chunk: bytes):
+        self._buffer.extend(chunk)
+        self._size += len(chunk)
+        if len(self._buffer) >= MULTIPART_PART_SIZE:
+            await self._flush_part()
+
+    async def _flush_part(self):
+        part_number = len(self._parts) + 1
+        body = bytes(self._buffer)
+        self._buffer.clear()
+
+        response = await run_s3(self._store.s3.upload_part,
+                                Bucket=self._store.bucket,
+                                Key=self._key,
+                                UploadId=self._upload_id,
+                                PartNumber=part_number,
+                                Body=body)
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+    async def close(self) -> int:
+        if self._buffer or not self._parts:
+            await self._flush_part()
+        await run_s3(self._store.s3.complete_multipart_upload,
+                     Bucket=self._store.bucket,
+                     Key=self._key,
+                     UploadId=self._upload_id,
+                     MultipartUpload={"Parts": self._parts})
+        return self._size
+
+    async def abort(self):
+        if self._upload_id:
+            await run_s3(self._store.s3.abort_multipart_upload,
+                         Bucket=self._store.bucket, Key=self._key, UploadId=self._upload_id)
+
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    @property
+    def s3(self):
+        from s3_init import get_s3
+        return get_s3()
+
+    async def put_bytes(self, key, data, content_type=None):
+        extra = {"ContentType": content_type} if content_type else {}
+        await run_s3(self.s3.put_object, Bucket=self.bucket, Key=key, Body=data, **extra)
+
+    async def put_file(self, key, path):
+        await run_s3(self.s3.upload_file, path, self.bucket, key)
+
+    async def get_bytes(self, key):
+        try:
+            response = await run_s3(self.s3.get_object, Bucket=self.bucket, Key=key)
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return await run_s3(response["Body"].read)
+
+    async def read_range(self, key, start, end):
+        response = await run_s3(self.s3.get_object, Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end}")
+        return await run_s3(response["Body"].read)
+
+    async def stream(self, key, start=0, end=None, chunk_size=STREAM_CHUNK_SIZE):
+        extra = {}
+        if start or end is not None:
+            extra["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await run_s3(self.s3.get_object, Bucket=self.bucket, Key=key, **extra)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await run_s3(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def download_to(self, key, path):
+        await run_s3(self.s3.download_file, self.bucket, key, path)
+
+    async def head(self, key):
+        try:
+            response = await run_s3(self.s3.head_object, Bucket=self.bucket, Key=key)
+        except Exception:
+            return None
+        return {
+            "size": response["ContentLength"],
+            "etag": response.get("ETag", "").strip('"'),
+            "content_type": response.get("ContentType")
+        }
+
+    async def delete(self, key):
+        await run_s3(self.s3.delete_object, Bucket=self.bucket, Key=key)
+
+    async def list(self, prefix):
+        keys = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        pages = await run_s3(lambda: list(paginator.paginate(Bucket=self.bucket, Prefix=prefix)))
+        for page in pages:
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return keys
+
+    async def open_writer(self, key):
+        writer = _S3Writer(self, key)
+        await writer.start()
+        return writer
+
+    def url_for(self, key, expires_in=3600):
+        # presigning is a local HMAC computation, no network round-trip
+        return self.s3.generate_presigned_url("get_object",
+                                              Params={"Bucket": self.bucket, "Key": key},
+                                              ExpiresIn=expires_in)
+
+# === Local disk ===
+
+class _LocalWriter(BlobWriter):
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+        self._tmp_path = None
+        self._size = 0
+
+    async def start(self):
+        await run_io(os.makedirs, os.path.dirname(self._path), exist_ok=True)
+        fd, self._tmp_path = await run_io(tempfile.mkstemp, dir=os.path.dirname(self._path), suffix=".part")
+        self._file = await run_io(os.fdopen, fd, "wb")
+
+    async def write(self, chunk: bytes):
+        self._size += len(chunk)
+        await run_io(self._file.write, chunk)
+
+    async def close(self) -> int:
+        await run_io(self._file.close)
+        # rename is atomic, so concurrent writers of one key never interleave
+        await run_io(os.replace, self._tmp_path, self._path)
+        return self._size
+
+    async def abort(self):
+        await run_io(self._file.close)
+        await run_io(os.remove, self._tmp_path)
+
+def _read_file_range(path: str, start: int, end: Optional[int]) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read() if end is None else f.read(end - start + 1)
+
+def _write_file_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _copy_file_atomic(src: str, path: str):
+    if os.path.abspath(src) == os.path.abspath(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    os.close(fd)
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, path)
+
+def _file_info(path: str) -> Optional[Dict]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # size + mtime is enough to tell versions of a local file apart
+    etag = hashlib.md5(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    return {"size": stat.st_size, "etag": etag, "content_type": None}
+
+def _list_files(root: str, prefix: str) -> List[str]:
+    base = os.path.join(root, os.path.dirname(prefix))
+    keys = []
+    for directory, _, filenames in os.walk(base):
+        for filename in filenames:
+            if filename.endswith(".part"):
+                continue
+            key = os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, "/")
+            if key.startswith(prefix):
+                keys.append(key)
+    return sorted(keys)
+
+class LocalBlobStore(BlobStore):
+    """
+    Blobs as files under root. With root == LOCAL_CACHE_DIR the blob and the
+    local working copy are the same file, so uploads and downloads are free.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    async def put_bytes(self, key, data, content_type=None):
+        await run_io(_write_file_atomic, self._path(key), data)
+
+    async def put_file(self, key, path):
+        await run_io(_copy_file_atomic, path, self._path(key))
+
+    async def get_bytes(self, key):
+        try:
+            return await run_io(_read_file_range, self._path(key), 0, None)
+        except FileNotFoundError:
+            return None
+
+    async def read_range(self, key, start, end):
+        return await run_io(_read_file_range, self._path(key), start, end)
+
+    async def stream(self, key, start=0, end=None, chunk_size=STREAM_CHUNK_SIZE):
+        f = await run_io(open, self._path(key), "rb")
+        try:
+            await run_io(f.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = await run_io(f.read, chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await run_io(f.close)
+
+    async def download_to(self, key, path):
+        if not await run_io(os.path.exists, self._path(key)):
+            raise FileNotFoundError(f"Blob {key} not found")
+        await run_io(_copy_file_atomic, self._path(key), path)
+
+    async def head(self, key):
+        return await run_io(_file_info, self._path(key))
+
+    async def delete(self, key):
+        try:
+            await run_io(os.remove, self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def list(self, prefix):
+        return await run_io(_list_files, self.root, prefix)
+
+    async def open_writer(self, key):
+        writer = _LocalWriter(self._path(key))
+        await writer.start()
+        return writer
+
+    def local_path(self, key):
+        return self._path(key)
+
+# === Memory ===
+
+class _MemoryWriter(BlobWriter):
+    def __init__(self, store: "MemoryBlobStore", key: str):
+        self._store = store
+        self._key = key
+        self._buffer = bytearray()
+
+    async def write(self, chunk: bytes):
+        self._buffer.extend(chunk)
+
+    async def close(self) -> int:
+        await self._store.put_bytes(self._key, bytes(self._buffer))
+        return len(self._buffer)
+
+    async def abort(self):
+        self._buffer.clear()
+
+class MemoryBlobStore(BlobStore):
+    def __init__(self):
+        self._blobs: Dict[str, bytes] = {}
+        self._content_types: Dict[str, Optional[str]] = {}
+
+    async def put_bytes(self, key, data, content_type=None):
+        self._blobs[key] = bytes(data)
+        self._content_types[key] = content_type
+
+    async def put_file(self, key, path):
+        await self.put_bytes(key, await run_io(_read_file_range, path, 0, None))
+
+    async def get_bytes(self, key):
+        return self._blobs.get(key)
+
+    async def read_range(self, key, start, end):
+        return self._blobs[key][start:end + 1]
+
+    async def stream(self, key, start=0, end=None, chunk_size=STREAM_CHUNK_SIZE):
+        data = self._blobs[key]
+        stop = len(data) if end is None else min(end + 1, len(data))
+        for offset in range(start, stop, chunk_size):
+            yield data[offset:min(offset + chunk_size, stop)]
+            await asyncio.sleep(0)
+
+    async def download_to(self, key, path):
+        if key not in self._blobs:
+            raise FileNotFoundError(f"Blob {key} not found")
+        await run_io(_write_file_atomic, path, self._blobs[key])
+
+    async def head(self, key):
+        data = self._blobs.get(key)
+        if data is None:
+            return None
+        return {"size": len(data), "etag": hashlib.md5(data).hexdigest(),
+                "content_type": self._content_types.get(key)}
+
+    async def delete(self, key):
+        self._blobs.pop(key, None)
+        self._content_types.pop(key, None)
+
+    async def list(self, prefix):
+        return sorted(k for k in self._blobs if k.startswith(prefix))
+
+    async def open_writer(self, key):
+        return _MemoryWriter(self, key)
+
+blob_store = None
+
+def init_blob_store(backend: str = BLOB_BACKEND) -> BlobStore:
+    global blob_store
+    if backend == "s3":
+        blob_store = S3BlobStore(os.getenv("S3_BUCKET_NAME"))
+    elif backend == "local":
+        blob_store = LocalBlobStore(BLOB_LOCAL_ROOT)
+    elif backend == "memory":
+        blob_store = MemoryBlobStore()
+    else:
+        raise ValueError(f"Unknown BLOB_BACKEND: {backend}")
+    print(f"Blob store: {backend}")
+    return blob_store
+
+def get_blob_store() -> BlobStore:
+    if blob_store is None:
+        # scripts and stand-ins that never ran startup get the configured backend
+        return init_blob_store()
+    return blob_store
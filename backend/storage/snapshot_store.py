@@ -0,0 +1,264 @@
+import io
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import pandas as pd
+from typing import Dict, Optional, Tuple
+from executors import run_io, run_cpu, run_exec
+from controllers.CommitController import get_commit_by_id
+from controllers.CommitGraphController import get_snapshot_commit
+from storage.storage_utils import upload_bytes, download_bytes, download_file, read_object_range
+from storage.blob_store import local_cache_path
+from services.csv_ingest import read_csv_fast
+from services.commit_diff import compute_frame_diff, apply_frame_diff, frame_content_hash
+from services.code_executor import execute_generated_code
+from services.dtype_optimizer import optimize_dtypes
+
+BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+
+# Commit diffs live next to, not inside, the commit folder so they never show
+# up as generated files:
+#   <session_id>/_diffs/<commit_id>/delta.json       counts, column changes, sample cells
+#   <session_id>/_diffs/<commit_id>/changed.parquet  changed cells (+ __row position)
+#   <session_id>/_diffs/<commit_id>/columns.parquet  whole added or retyped columns
+DIFF_PREFIX = "_diffs"
+
+# A CODE commit whose patch touches at most this fraction of the cells is
+# stored as parent + patch instead of a full CSV upload. 0 disables it.
+DELTA_STORAGE_MAX_RATIO = float(os.getenv("COMMIT_DELTA_MAX_RATIO", "0"))
+
+# bytes read from the start of a snapshot to build the LLM preview
+PREVIEW_BYTES = int(os.getenv("SNAPSHOT_PREVIEW_BYTES", str(256 * 1024)))
+
+# snapshots being downloaded or rebuilt, so concurrent loads share the work
+_materializing: Dict[str, asyncio.Future] = {}
+
+def snapshot_key(session_id: str, commit_id: str) -> str:
+    return f"{session_id}/{commit_id}/{commit_id}.csv"
+
+def diff_key(session_id: str, commit_id: str, name: str) -> str:
+    return f"{session_id}/{DIFF_PREFIX}/{commit_id}/{name}"
+
+def _frame_to_parquet(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def _frame_from_parquet(data: bytes) -> pd.DataFrame:
+    return pd.read_parquet(io.BytesIO(data))
+
+def _commit_id_from_key(csv_key: str) -> str:
+    # <session_id>/<commit_id>/<commit_id>.csv
+    return os.path.splitext(os.path.basename(csv_key))[0]
+
+async def store_commit_diff(session_id: str, commit_id: str, delta: Dict,
+                            patch: Optional[Dict]) -> bool:
+    """
+    Uploads a commit's delta and, when there is one, its patch.
+    Returns True when the patch was stored and can rebuild the snapshot.
+    """
+    patch_stored = False
+    if patch is not None:
+        try:
+            changed = await run_cpu(_frame_to_parquet, patch["changed"])
+            full_columns = await run_cpu(_frame_to_parquet, patch["full_columns"])
+            delta = {**delta, "patch": {
+                "column_order": patch["column_order"],
+                "removed": patch["removed"],
+                "parent_csv": patch.get("parent_csv"),
+                "parent_csv_format": patch.get("parent_csv_format")
+            }}
+            await upload_bytes(BUCKET_NAME, diff_key(session_id, commit_id, "changed.parquet"), changed)
+            await upload_bytes(BUCKET_NAME, diff_key(session_id, commit_id, "columns.parquet"), full_columns)
+            patch_stored = True
+        except Exception as e:
+            # e.g. non-string column names or mixed-type object columns
+            print(f"Skipping patch for commit {commit_id}: {e}")
+            delta = {k: v for k, v in delta.items() if k != "patch"}
+
+    await upload_bytes(BUCKET_NAME, diff_key(session_id, commit_id, "delta.json"),
+                       json.dumps(delta, default=str).encode("utf-8"), content_type="application/json")
+    return patch_stored
+
+async def load_commit_diff(session_id: str, commit_id: str) -> Optional[Dict]:
+    data = await download_bytes(BUCKET_NAME, diff_key(session_id, commit_id, "delta.json"))
+    if data is None:
+        return None
+    return json.loads(data)
+
+async def load_commit_patch(session_id: str, commit_id: str) -> Optional[Dict]:
+    delta = await load_commit_diff(session_id, commit_id)
+    if not delta or "patch" not in delta:
+        return None
+
+    changed = await download_bytes(BUCKET_NAME, diff_key(session_id, commit_id, "changed.parquet"))
+    full_columns = await download_bytes(BUCKET_NAME, diff_key(session_id, commit_id, "columns.parquet"))
+    if changed is None or full_columns is None:
+        return None
+
+    return {
+        **delta["patch"],
+        "changed": await run_cpu(_frame_from_parquet, changed),
+        "full_columns": await run_cpu(_frame_from_parquet, full_columns)
+    }
+
+async def ensure_local_snapshot(csv_key: str) -> str:
+    """
+    Local path of a commit's CSV snapshot. Full snapshots are downloaded,
+    delta commits are rebuilt from their parent and patch, and tiered
+    commits by replaying their code. The local file doubles as the cache.
+    """
+    local_path = local_cache_path(csv_key)
+    if await run_io(os.path.exists, local_path):
+        return local_path
+
+    if csv_key in _materializing:
+        return await asyncio.shield(_materializing[csv_key])
+
+    future = asyncio.get_running_loop().create_future()
+    _materializing[csv_key] = future
+    try:
+        await _fetch_snapshot(csv_key, local_path)
+        future.set_result(local_path)
+        return local_path
+    except Exception as e:
+        future.set_exception(e)
+        # nobody may be waiting; mark the exception as retrieved
+        future.exception()
+        raise
+    finally:
+        # the owner was cancelled: fail the waiters instead of leaving them hanging
+        if not future.done():
+            future.set_exception(RuntimeError(f"Loading {csv_key} was cancelled"))
+            future.exception()
+        _materializing.pop(csv_key, None)
+
+async def _fetch_snapshot(csv_key: str, local_path: str):
+    await run_io(os.makedirs, os.path.dirname(local_path), exist_ok=True)
+
+    commit = await get_commit_by_id(_commit_id_from_key(csv_key))
+    if commit is None or commit.snapshot_kind == "full":
+        try:
+            await download_file(BUCKET_NAME, csv_key, local_path)
+            return
+        except Exception:
+            # the snapshot may have been tiered away since the commit was read
+            commit = await get_commit_by_id(_commit_id_from_key(csv_key))
+            if commit is None or commit.snapshot_kind == "full":
+                raise
+
+    if commit.snapshot_kind == "delta":
+        df = await materialize_delta_commit(str(commit.session_id), str(commit.commit_id))
+    else:
+        df = await replay_commit(commit)
+
+    # write under a temporary name so a concurrent reader never sees half a file
+    tmp_path = f"{local_path}.{os.getpid()}.tmp"
+    await run_cpu(df.to_csv, tmp_path, index=False)
+    await run_io(os.replace, tmp_path, local_path)
+
+def _read_head(path: str, size: int) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(size)
+
+async def load_snapshot_preview(csv_key: str, csv_format: Optional[Dict], rows: int = 5) -> pd.DataFrame:
+    """
+    First rows of a snapshot without materialising it. The local copy or a
+    ranged S3 read of the head of the object is enough for a preview; only
+    delta and tiered commits, which have no object, are rebuilt first.
+    """
+    head = None
+    local_path = local_cache_path(csv_key)
+    if await run_io(os.path.exists, local_path):
+        head = await run_io(_read_head, local_path, PREVIEW_BYTES)
+    else:
+        commit = await get_commit_by_id(_commit_id_from_key(csv_key))
+        if commit is None or commit.snapshot_kind == "full":
+            try:
+                head = await read_object_range(BUCKET_NAME, csv_key, 0, PREVIEW_BYTES - 1)
+            except Exception as e:
+                print(f"Ranged preview read of {csv_key} failed: {e}")
+
+    if head is None:
+        head = await run_io(_read_head, await ensure_local_snapshot(csv_key), PREVIEW_BYTES)
+
+    if len(head) >= PREVIEW_BYTES:
+        head = head[:head.rfind(b"\n") + 1]
+
+    try:
+        df, _ = await run_cpu(read_csv_fast, io.BytesIO(head), csv_format)
+    except Exception:
+        # e.g. a quoted field spanning the cut; fall back to the whole file
+        df, _ = await run_cpu(read_csv_fast, await ensure_local_snapshot(csv_key), csv_format)
+    return df.head(rows)
+
+async def replay_commit(commit) -> pd.DataFrame:
+    """
+    Re-runs a CODE commit's code on its parent snapshot and checks the
+    result against the content hash recorded when the commit was made.
+    """
+    session_id = str(commit.session_id)
+    source = await get_snapshot_commit(commit.parent_commit)
+    if source is None:
+        raise FileNotFoundError(f"No parent snapshot to replay commit {commit.commit_id} from")
+
+    parent_path = await ensure_local_snapshot(snapshot_key(session_id, str(source.commit_id)))
+    parent_df, _ = await run_cpu(read_csv_fast, parent_path, source.csv_format)
+
+    # charts and other side outputs of the replay are thrown away
+    scratch_dir = await run_io(tempfile.mkdtemp)
+    try:
+        df = await run_exec(execute_generated_code, commit.code, parent_df, scratch_dir)
+    finally:
+        await run_io(shutil.rmtree, scratch_dir, ignore_errors=True)
+
+    if commit.dtype_report is not None:
+        df, _ = await run_cpu(optimize_dtypes, df)
+
+    content_hash = await run_cpu(frame_content_hash, df)
+    if commit.content_hash and content_hash != commit.content_hash:
+        raise ValueError(f"Replay of commit {commit.commit_id} is not deterministic")
+    return df
+
+async def materialize_delta_commit(session_id: str, commit_id: str) -> pd.DataFrame:
+    patch = await load_commit_patch(session_id, commit_id)
+    if patch is None:
+        raise FileNotFoundError(f"No snapshot or patch stored for commit {commit_id}")
+
+    parent_path = await ensure_local_snapshot(patch["parent_csv"])
+    parent_df, _ = await run_cpu(read_csv_fast, parent_path, patch["parent_csv_format"])
+    return await run_cpu(apply_frame_diff, parent_df, patch)
+
+async def record_commit_diff(session, commit_id: str, parent_df: pd.DataFrame,
+                             df: pd.DataFrame) -> Tuple[Optional[Dict], str, str]:
+    """
+    Diffs a CODE commit's result against the frame it was run on and stores
+    the delta. Returns (diff_summary, content_hash, snapshot_kind); the kind
+    is "delta" only when the stored patch was verified to rebuild df exactly.
+    """
+    session_id = str(session.session_id)
+    content_hash = await run_cpu(frame_content_hash, df)
+    snapshot_kind = "full"
+    try:
+        delta, patch = await run_cpu(compute_frame_diff, parent_df, df)
+
+        if patch is not None:
+            patch["parent_csv"] = session.last_csv_path
+            patch["parent_csv_format"] = session.csv_format
+            if DELTA_STORAGE_MAX_RATIO and delta["change_ratio"] <= DELTA_STORAGE_MAX_RATIO:
+                rebuilt = await run_cpu(apply_frame_diff, parent_df, patch)
+                if await run_cpu(frame_content_hash, rebuilt) == content_hash:
+                    snapshot_kind = "delta"
+
+        patch_stored = await store_commit_diff(session_id, commit_id, delta, patch)
+        if not patch_stored:
+            snapshot_kind = "full"
+    except Exception as e:
+        # the diff is an extra; never fail the commit over it
+        print(f"Failed to diff commit {commit_id}: {e}")
+        return None, content_hash, "full"
+
+    diff_summary = {k: v for k, v in delta.items() if k != "changed_cells_sample"}
+    return diff_summary, content_hash, snapshot_kind
@@ -1,87 +1,158 @@
 from s3_init import get_s3
+from storage.blob_store import get_blob_store, S3BlobStore
+from executors import run_io
 import os
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Optional
+from tracing import traced
 
+# Every function goes through the configured BlobStore; the bucket arguments
+# are kept for existing callers and only matter for the S3 backend.
+
+@traced()
 async def get_file_list(bucket: str, session_id: str, commit_id: str) -> List[str]:
-    s3 = get_s3()
     prefix = f"{session_id}/{commit_id}/"
     try:
-        response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        contents = response.get("Contents", [])
-        return [obj["Key"] for obj in contents]
+        return await get_blob_store().list(prefix)
     except Exception as e:
         print("Error listing files:", e)
         return []
 
+@traced()
 async def generate_presigned_get_url(bucket: str, s3_file_path: str, expires_in: int = 3600) -> str:
-    s3 = get_s3()
     try:
-        return s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": s3_file_path},
-            ExpiresIn=expires_in
-        )
+        return get_blob_store().url_for(s3_file_path, expires_in)
     except Exception as e:
         print("Error generating GET URL:", e)
         return None
 
-async def generate_presigned_post_url(bucket: str, s3_file_path: str, expires_in: int = 3600):
+@traced()
+async def generate_presigned_get_urls(bucket: str, s3_file_paths: List[str], expires_in: int = 3600) -> Dict[str, str]:
+    """
+    Presigns many GET urls at once. Presigning is a local HMAC computation,
+    so this never touches the network.
+    """
+    store = get_blob_store()
+    signed_urls = {}
+    for s3_file_path in s3_file_paths:
+        try:
+            signed_urls[s3_file_path] = store.url_for(s3_file_path, expires_in)
+        except Exception as e:
+            print(f"Error generating GET URL for {s3_file_path}:", e)
+    return signed_urls
+
+def supports_direct_upload() -> bool:
+    return isinstance(get_blob_store(), S3BlobStore)
+
+@traced()
+async def generate_presigned_post_url(bucket: str, s3_file_path: str, expires_in: int = 3600,
+                                      conditions: Optional[List] = None):
+    """Browser-to-S3 upload form; only the S3 backend can issue one."""
+    if not supports_direct_upload():
+        return None
+
     s3 = get_s3()
     try:
         return s3.generate_presigned_post(
             Bucket=bucket,
             Key=s3_file_path,
+            Conditions=conditions,
             ExpiresIn=expires_in
         )
     except Exception as e:
         print("Error generating POST URL:", e)
         return None
 
+@traced()
+async def get_object_metadata(bucket: str, s3_file_path: str) -> Optional[Dict]:
+    try:
+        info = await get_blob_store().head(s3_file_path)
+    except Exception as e:
+        print("Error reading object metadata:", e)
+        return None
+    if info is None:
+        return None
+    return {"ContentLength": info["size"], "ETag": info["etag"], "ContentType": info["content_type"]}
+
+@traced()
+async def read_object_range(bucket: str, s3_file_path: str, start: int, end: int) -> bytes:
+    """Reads bytes [start, end] (inclusive) of an object."""
+    return await get_blob_store().read_range(s3_file_path, start, end)
+
+@traced()
+async def upload_bytes(bucket: str, s3_file_path: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+    await get_blob_store().put_bytes(s3_file_path, data, content_type)
+    return s3_file_path
+
+@traced()
+async def download_bytes(bucket: str, s3_file_path: str) -> Optional[bytes]:
+    """Whole object as bytes, or None when it does not exist."""
+    return await get_blob_store().get_bytes(s3_file_path)
+
+@traced()
+async def download_file(bucket: str, s3_file_path: str, local_path: str):
+    await get_blob_store().download_to(s3_file_path, local_path)
+
+@traced()
+async def delete_object(bucket: str, s3_file_path: str) -> bool:
+    try:
+        await get_blob_store().delete(s3_file_path)
+        return True
+    except Exception as e:
+        print(f"Failed to delete {s3_file_path}:", e)
+        return False
+
+@traced()
 async def upload_file_from_path(bucket: str, local_path: str, session_id: str, commit_id: str, filename: str) -> str:
-    s3 = get_s3()
     s3_file_path = f"{session_id}/{commit_id}/{filename}"
     try:
-        s3.upload_file(local_path, bucket, s3_file_path)
+        await get_blob_store().put_file(s3_file_path, local_path)
         return s3_file_path
     except Exception as e:
         print("Upload failed:", e)
         return None
 
-async def upload_commit_folder(bucket: str, local_folder_path: str, session_id: str, commit_id: str) -> List[Dict]:
+def get_file_type(filename: str) -> str:
+    ext = filename.split('.')[-1]
+    if ext == 'csv':
+        return "dataframe"
+    elif ext in ['png','jpg','jpeg']:
+        return 'chart'
+    elif ext == 'md':
+        return "readme"
+    return ext
+
+@traced()
+async def upload_commit_folder(bucket: str, local_folder_path: str, session_id: str, commit_id: str,
+                               exclude: Optional[List[str]] = None) -> List[Dict]:
     """
-    Uploads all files in a local commit folder to S3.
+    Uploads all files in a local commit folder to S3, in parallel.
+    Filenames in exclude stay local.
 
     Returns:
         A list of dicts containing file metadata for Commit.generated_files.
     """
-    s3 = get_s3()
-    uploaded_files = []
+    store = get_blob_store()
 
-    for filename in os.listdir(local_folder_path):
+    async def upload(filename: str):
         file_path = os.path.join(local_folder_path, filename)
+        s3_file_path = f"{session_id}/{commit_id}/{filename}"
+        try:
+            await store.put_file(s3_file_path, file_path)
+            return {
+                "title": filename,
+                "type": get_file_type(s3_file_path),
+                "url": s3_file_path
+            }
+        except Exception as e:
+            print(f"Failed to upload {filename}: {e}")
+            return None
+
+    def list_files():
+        return [f for f in os.listdir(local_folder_path)
+                if os.path.isfile(os.path.join(local_folder_path, f)) and f not in (exclude or [])]
+
+    filenames = await run_io(list_files)
+    results = await asyncio.gather(*[upload(f) for f in filenames])
 
-        if os.path.isfile(file_path):
-            s3_file_path = f"{session_id}/{commit_id}/{filename}"
-            try:
-                s3.upload_file(file_path, bucket, s3_file_path)
-
-                file_type = ""
-                ext = s3_file_path.split('.')[-1]
-                if ext == 'csv':
-                    file_type = "dataframe"
-                elif ext in ['png','jpg','jpeg']:
-                    file_type = 'chart'
-                elif ext == 'md':
-                    file_type = "readme"
-                else:
-                    file_type = ext
-
-                uploaded_files.append({
-                    "title": filename,
-                    "type": file_type,
-                    "url": s3_file_path
-                })
-            except Exception as e:
-                print(f"Failed to upload {filename}: {e}")
-
-    return uploaded_files
+    return [r for r in results if r is not None]
@@ -0,0 +1,129 @@
+from executors import run_io, run_cpu
+from storage.blob_store import get_blob_store
+import os
+import io
+import hashlib
+import pandas as pd
+from services.csv_ingest import infer_csv_format, read_csv_fast
+from typing import AsyncIterator, Optional, Dict
+
+PROFILE_SAMPLE_BYTES = int(os.getenv("INGEST_PROFILE_SAMPLE_BYTES", str(4 * 1024 * 1024)))
+
+def profile_csv_sample(sample: bytes, complete: bool) -> Dict:
+    """
+    Column level profile of the first rows of the upload, plus the detected
+    csv_format. A partial sample is truncated to whole lines so a cut-off
+    trailing row does not skew it.
+    """
+    csv_format = infer_csv_format(sample, complete)
+
+    if not complete:
+        cut = sample.rfind(b"\n")
+        if cut != -1:
+            sample = sample[:cut + 1]
+
+    df, _ = read_csv_fast(io.BytesIO(sample), csv_format)
+    columns = []
+    for name in df.columns:
+        col = df[name]
+        entry = {
+            "name": str(name),
+            "dtype": str(col.dtype),
+            "null_count": int(col.isna().sum()),
+            "distinct_count": int(col.nunique(dropna=True))
+        }
+        if pd.api.types.is_numeric_dtype(col) and col.notna().any():
+            entry["min"] = float(col.min())
+            entry["max"] = float(col.max())
+        columns.append(entry)
+
+    return {"sample_rows": int(len(df)), "columns": columns, "csv_format": csv_format}
+
+class StreamingCsvIngest:
+    """
+    Pipes an upload into a blob store writer (S3 multipart for the S3
+    backend) and a local cache file at the same time, hashing and counting
+    rows as the bytes go past. Memory stays bounded by the multipart part
+    size + PROFILE_SAMPLE_BYTES.
+    """
+
+    def __init__(self, bucket: str, s3_key: str, local_path: str):
+        self.bucket = bucket
+        self.s3_key = s3_key
+        self.local_path = local_path
+
+        self._store = get_blob_store()
+        self._writer = None
+        self._local_file = None
+
+        self._sha256 = hashlib.sha256()
+        self._bytes = 0
+        self._newlines = 0
+        self._last_byte = b""
+        self._sample = bytearray()
+
+    async def start(self):
+        self._writer = await self._store.open_writer(self.s3_key)
+
+        # a local blob store may already keep the blob at the cache path
+        if self._store.local_path(self.s3_key) != os.path.abspath(self.local_path):
+            await run_io(os.makedirs, os.path.dirname(self.local_path), exist_ok=True)
+            self._local_file = await run_io(open, self.local_path, "wb")
+
+    async def write(self, chunk: bytes):
+        if not chunk:
+            return
+
+        self._sha256.update(chunk)
+        self._bytes += len(chunk)
+        self._newlines += chunk.count(b"\n")
+        self._last_byte = chunk[-1:]
+        if len(self._sample) < PROFILE_SAMPLE_BYTES:
+            self._sample.extend(chunk[:PROFILE_SAMPLE_BYTES - len(self._sample)])
+
+        if self._local_file:
+            await run_io(self._local_file.write, chunk)
+        await self._writer.write(chunk)
+
+    async def finish(self) -> Dict:
+        await self._writer.close()
+        if self._local_file:
+            await run_io(self._local_file.close)
+
+        # physical lines, header excluded; a final row without a trailing newline still counts
+        lines = self._newlines + (1 if self._bytes and self._last_byte != b"\n" else 0)
+
+        profile = {
+            "sha256": self._sha256.hexdigest(),
+            "size_bytes": self._bytes,
+            "row_count": max(lines - 1, 0)
+        }
+        try:
+            profile.update(await run_cpu(profile_csv_sample, bytes(self._sample),
+                                         self._bytes <= len(self._sample)))
+        except Exception as e:
+            print("Failed to profile upload sample:", e)
+
+        return profile
+
+    async def abort(self):
+        try:
+            if self._writer:
+                await self._writer.abort()
+        finally:
+            if self._local_file:
+                await run_io(self._local_file.close)
+                await run_io(os.remove, self.local_path)
+
+async def ingest_stream(bucket: str, s3_key: str, local_path: str,
+                        chunks: AsyncIterator[bytes]) -> Optional[Dict]:
+    ingest = StreamingCsvIngest(bucket, s3_key, local_path)
+    try:
+        # inside the try: a failure after the writer opened must still abort it
+        await ingest.start()
+        async for chunk in chunks:
+            await ingest.write(chunk)
+        return await ingest.finish()
+    except Exception:
+        await ingest.abort()
+        raise
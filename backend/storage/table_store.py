@@ -0,0 +1,200 @@
+import io
+import os
+import json
+import asyncio
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, List, Optional, Tuple
+from executors import run_io, run_cpu
+from controllers.CommitGraphController import get_snapshot_commit
+from storage.blob_store import get_blob_store, local_cache_path
+from storage.snapshot_store import snapshot_key, ensure_local_snapshot
+from cache.local_lru_cache import LocalLRUCache
+from services.csv_ingest import read_csv_fast
+
+# Columnar copy of a commit's snapshot for paging through it:
+#   <session_id>/_tables/<commit_id>.parquet
+# Built on first access from the CSV snapshot and kept in the blob store, so
+# later pages on any worker read just the footer and the row groups they need.
+TABLE_PREFIX = "_tables"
+
+TABLE_ROW_GROUP_ROWS = int(os.getenv("TABLE_ROW_GROUP_ROWS", "65536"))
+
+# sizes and parquet footers of recently read tables; commits never change,
+# so a cached remote table costs one ranged read per page
+TABLE_METADATA_CACHE_SIZE = int(os.getenv("TABLE_METADATA_CACHE_SIZE", "256"))
+
+# key -> (size, footer); read and filled from io-pool threads
+_metadata_cache = LocalLRUCache(maxsize=TABLE_METADATA_CACHE_SIZE)
+
+# tables being built, so concurrent first requests share the work
+_building: Dict[str, asyncio.Future] = {}
+
+def table_key(session_id: str, commit_id: str) -> str:
+    return f"{session_id}/{TABLE_PREFIX}/{commit_id}.parquet"
+
+class _BlobFile(io.RawIOBase):
+    """
+    Read-only, seekable view of a blob for pyarrow. Every read is a ranged
+    read scheduled on the event loop; it must be used from a worker thread.
+    """
+
+    def __init__(self, key: str, size: int, loop: asyncio.AbstractEventLoop):
+        self.key = key
+        self.size = size
+        self.loop = loop
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = self.size + offset
+        return self.position
+
+    def readinto(self, buffer):
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        data = asyncio.run_coroutine_threadsafe(
+            get_blob_store().read_range(self.key, self.position, end - 1), self.loop
+        ).result()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+def _write_table(csv_path: str, csv_format: Optional[Dict], path: str):
+    df, _ = read_csv_fast(csv_path, csv_format)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=TABLE_ROW_GROUP_ROWS)
+    os.replace(tmp_path, path)
+
+async def _build_table(session_id: str, owner, key: str, local_path: str):
+    csv_path = await ensure_local_snapshot(snapshot_key(session_id, str(owner.commit_id)))
+    await run_cpu(_write_table, csv_path, owner.csv_format, local_path)
+    try:
+        await get_blob_store().put_file(key, local_path)
+    except Exception as e:
+        # the local copy still serves this worker
+        print(f"Failed to upload table {key}: {e}")
+
+async def ensure_table(session_id: str, commit_id: str) -> Tuple[str, Optional[str], Optional[int]]:
+    """
+    Returns (key, local_path, size) of the table behind a commit. local_path
+    is None when the table is only in a remote blob store and should be read
+    by ranges rather than downloaded; size is then the object size.
+    """
+    owner = await get_snapshot_commit(commit_id)
+    if owner is None:
+        raise FileNotFoundError(f"No snapshot for commit {commit_id}")
+
+    key = table_key(session_id, str(owner.commit_id))
+    store = get_blob_store()
+    local_path = store.local_path(key) or local_cache_path(key)
+    if await run_io(os.path.exists, local_path):
+        return key, local_path, None
+    cached_size, _ = _metadata_cache.get(key) or (None, None)
+    if cached_size is not None:
+        return key, None, cached_size
+    info = await store.head(key)
+    if info is not None:
+        return key, None, info["size"]
+
+    if key in _building:
+        await asyncio.shield(_building[key])
+        return key, local_path, None
+
+    future = asyncio.get_running_loop().create_future()
+    _building[key] = future
+    try:
+        await _build_table(session_id, owner, key, local_path)
+        future.set_result(local_path)
+        return key, local_path, None
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        # the owner was cancelled: fail the waiters instead of leaving them hanging
+        if not future.done():
+            future.set_exception(RuntimeError(f"Building {key} was cancelled"))
+            future.exception()
+        _building.pop(key, None)
+
+def _open_table(key: str, local_path: Optional[str], size: Optional[int],
+                loop: asyncio.AbstractEventLoop) -> pq.ParquetFile:
+    source = local_path if local_path else _BlobFile(key, size, loop)
+    _, metadata = _metadata_cache.get(key) or (None, None)
+    parquet_file = pq.ParquetFile(source, metadata=metadata)
+    if metadata is None:
+        _metadata_cache.set(key, (size, parquet_file.metadata))
+    return parquet_file
+
+def _row_groups_for(metadata: pq.FileMetaData, start: int, stop: int) -> Tuple[List[int], int]:
+    """Row groups covering rows [start, stop), and the first row of the first one."""
+    groups, first_row, row = [], None, 0
+    for i in range(metadata.num_row_groups):
+        count = metadata.row_group(i).num_rows
+        if row + count > start and row < stop:
+            groups.append(i)
+            if first_row is None:
+                first_row = row
+        row += count
+        if row >= stop:
+            break
+    return groups, first_row or 0
+
+def _read_page(parquet_file: pq.ParquetFile, columns: Optional[List[str]],
+               offset: int, limit: int) -> Dict:
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    total_rows = metadata.num_rows
+    names = columns or schema.names
+
+    unknown = [c for c in names if c not in schema.names]
+    if unknown:
+        raise KeyError(f"Unknown columns: {', '.join(unknown)}")
+
+    stop = min(offset + limit, total_rows)
+    groups, first_row = _row_groups_for(metadata, offset, stop)
+    if groups:
+        table = parquet_file.read_row_groups(groups, columns=names, use_threads=False)
+        table = table.slice(offset - first_row, stop - offset)
+    else:
+        table = schema.empty_table().select(names)
+
+    df = table.to_pandas()
+    return {
+        "columns": [{"name": name, "dtype": str(df[name].dtype)} for name in names],
+        "rows": json.loads(df.to_json(orient="values", date_format="iso")),
+        "offset": offset,
+        "total_rows": total_rows,
+        "row_groups_read": len(groups)
+    }
+
+async def read_table_page(session_id: str, commit_id: str, offset: int, limit: int,
+                          columns: Optional[List[str]] = None) -> Dict:
+    """
+    Rows [offset, offset + limit) of a commit's table, optionally only some
+    columns. Reads just the row groups that overlap the page.
+    """
+    key, local_path, size = await ensure_table(session_id, commit_id)
+    loop = asyncio.get_running_loop()
+    # blocking: ranged reads go back through the loop, so this runs in a thread
+    def read():
+        return _read_page(_open_table(key, local_path, size, loop), columns, offset, limit)
+    return await run_io(read)
@@ -1 +1,187 @@
-session_cache = {}
\ No newline at end of file
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+# Embedded store for the local/offline deployment mode (session_management.py).
+# One SQLite file in WAL mode: readers never block the writer and every
+# process opens its own connections, so several workers can share it.
+# Commit history is append-only; a commit is one INSERT, never a rewrite.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE TABLE IF NOT EXISTS commits (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    commit_id TEXT NOT NULL,
+    parent_commit TEXT,
+    mode TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS commits_session_seq ON commits (session_id, seq);
+CREATE UNIQUE INDEX IF NOT EXISTS commits_session_commit ON commits (session_id, commit_id);
+"""
+
+BUSY_TIMEOUT_MS = int(os.getenv("LOCAL_STORE_BUSY_TIMEOUT_MS", "5000"))
+
+class LocalSessionStore:
+    """Sessions keyed by id plus an append-only commit log per session."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # every thread's connection, so close() can reach them all
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # still used by one thread only; close() runs on another one
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def _write(self) -> "_Transaction":
+        return _Transaction(self._conn())
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_sessions(self) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT session_id, data FROM sessions").fetchall()
+        return {session_id: json.loads(data) for session_id, data in rows}
+
+    def put_session(self, session: Dict):
+        with self._write() as conn:
+            self._put_session(conn, session)
+
+    def commit(self, session: Dict, record: Dict):
+        """Appends record to the session's history and saves the session, atomically."""
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO commits (session_id, commit_id, parent_commit, mode, data) VALUES (?, ?, ?, ?, ?)",
+                (session["session_id"], record["commit_id"], record.get("parent_commit"),
+                 record.get("mode"), json.dumps(record))
+            )
+            self._put_session(conn, session)
+
+    def get_history(self, session_id: str, mode: Optional[str] = None) -> List[Dict]:
+        query = "SELECT data FROM commits WHERE session_id = ?"
+        params = [session_id]
+        if mode is not None:
+            query += " AND mode = ?"
+            params.append(mode)
+        rows = self._conn().execute(query + " ORDER BY seq", params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def has_commit(self, session_id: str, commit_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM commits WHERE session_id = ? AND commit_id = ?",
+                                   (session_id, commit_id)).fetchone()
+        return row is not None
+
+    def is_empty(self) -> bool:
+        return self._conn().execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None
+
+    def import_json_store(self, store_file: str) -> int:
+        """One-off import of a legacy session_store.json and its history files."""
+        with open(store_file, "r") as f:
+            sessions = json.load(f)
+
+        with self._write() as conn:
+            for session in sessions.values():
+                history_path = session.get("history_path")
+                if history_path and os.path.exists(history_path):
+                    with open(history_path, "r") as f:
+                        history = json.load(f)
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO commits (session_id, commit_id, parent_commit, mode, data) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [(session["session_id"], h["commit_id"], h.get("parent_commit"),
+                          h.get("mode"), json.dumps(h)) for h in history if h.get("commit_id")]
+                    )
+                self._put_session(conn, session)
+        return len(sessions)
+
+    def close(self):
+        """
+        Checkpoints the WAL into the database file and closes the
+        connections of every thread. Using the store afterwards reopens.
+        """
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        if conns:
+            try:
+                conns[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                print(f"WAL checkpoint of {self.path} failed:", e)
+        for conn in conns:
+            conn.close()
+
+    @staticmethod
+    def _put_session(conn: sqlite3.Connection, session: Dict):
+        conn.execute(
+            "INSERT INTO sessions (session_id, data) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, "
+            "updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')",
+            (session["session_id"], json.dumps(session))
+        )
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT around a block; takes the write lock up front."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._owner = True
+        else:
+            self._owner = False
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._owner:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+local_store = None
+
+def init_local_store(path: str, legacy_store_file: Optional[str] = None) -> LocalSessionStore:
+    global local_store
+    local_store = LocalSessionStore(path)
+
+    if legacy_store_file and os.path.exists(legacy_store_file) and local_store.is_empty():
+        try:
+            count = local_store.import_json_store(legacy_store_file)
+            print(f"Imported {count} sessions from {legacy_store_file}")
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Could not import {legacy_store_file}: {e}")
+    return local_store
+
+def close_local_store():
+    global local_store
+    if local_store is not None:
+        local_store.close()
+        local_store = None
+
+def get_local_store() -> LocalSessionStore:
+    if local_store is None:
+        raise RuntimeError("Local session store is not initialized yet. Call init_local_store() first.")
+    return local_store
@@ -0,0 +1,38 @@
+"""
+Behaviour tests against the offline stand-ins (mongomock-motor, fakeredis,
+moto), the same ones the benchmarks use.
+
+    cd backend
+    pip install -r tests/requirements.txt
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.standins import configure_standin_env, start_standins
+
+# the app modules read their settings at import time
+configure_standin_env()
+os.chdir(os.environ["SESSION_ROOT"])
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def standins():
+    """Fresh in-memory Mongo, Redis and S3 for one test."""
+    aws = await start_standins()
+    yield
+    aws.stop()
+
+@pytest.fixture
+async def session_id(standins):
+    from controllers.SessionController import create_session
+
+    session = await create_session(session_name="test")
+    return str(session.session_id)
@@ -0,0 +1,61 @@
+import pytest
+
+from controllers.CommitController import create_commit
+from controllers.CommitGraphController import (get_ancestors, get_descendants, get_lowest_common_ancestor,
+                                               get_lineage_diff, get_snapshot_commit)
+
+pytestmark = pytest.mark.anyio
+
+async def _commit(session_id: str, parent=None, mode: str = "CODE", code="df['x'] = 1") -> str:
+    commit = await create_commit(session_id=session_id, query=mode, mode=mode, code=code,
+                                 parent_commit=parent)
+    return str(commit.commit_id)
+
+@pytest.fixture
+async def dag(session_id):
+    """
+        root - a - b
+                \\
+                 c (CHAT) - d (CHAT)
+    """
+    root = await _commit(session_id, mode="CODE", code=None)
+    a = await _commit(session_id, root)
+    b = await _commit(session_id, a)
+    c = await _commit(session_id, a, mode="CHAT", code=None)
+    d = await _commit(session_id, c, mode="CHAT", code=None)
+    return {"root": root, "a": a, "b": b, "c": c, "d": d}
+
+async def test_ancestors_are_root_first(dag):
+    ancestors = await get_ancestors(dag["d"])
+    assert [str(n.commit_id) for n in ancestors] == [dag["root"], dag["a"], dag["c"]]
+    assert [n.depth for n in ancestors] == [0, 1, 2]
+
+async def test_root_has_no_ancestors(dag):
+    assert await get_ancestors(dag["root"]) == []
+
+async def test_descendants_cover_every_branch(dag):
+    descendants = await get_descendants(dag["a"])
+    assert {str(n.commit_id) for n in descendants} == {dag["b"], dag["c"], dag["d"]}
+    assert [n.depth for n in descendants] == sorted(n.depth for n in descendants)
+
+async def test_lowest_common_ancestor(dag):
+    assert await get_lowest_common_ancestor(dag["b"], dag["d"]) == dag["a"]
+    assert await get_lowest_common_ancestor(dag["d"], dag["c"]) == dag["c"]
+    assert await get_lowest_common_ancestor(dag["b"], dag["b"]) == dag["b"]
+
+async def test_lowest_common_ancestor_of_unknown_commit(dag):
+    assert await get_lowest_common_ancestor(dag["b"], "0" * 24) is None
+    assert await get_lowest_common_ancestor(dag["b"], "not-an-id") is None
+
+async def test_lineage_diff(dag):
+    diff = await get_lineage_diff(dag["b"], dag["d"])
+    assert diff == {
+        "lowest_common_ancestor": dag["a"],
+        "only_in_a": [dag["b"]],
+        "only_in_b": [dag["c"], dag["d"]]
+    }
+
+async def test_snapshot_commit_skips_chat_commits(dag):
+    assert str((await get_snapshot_commit(dag["d"])).commit_id) == dag["a"]
+    assert str((await get_snapshot_commit(dag["b"])).commit_id) == dag["b"]
+    assert str((await get_snapshot_commit(dag["root"])).commit_id) == dag["root"]
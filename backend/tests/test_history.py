@@ -0,0 +1,76 @@
+import httpx
+import pytest
+
+from controllers.CommitController import create_commit
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def client(standins):
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+async def commits(session_id):
+    # two pairs share a timestamp, so pages must also break ties on _id
+    ids, parent = [], None
+    for timestamp in ["2024-01-01T00:00:00", "2024-01-02T00:00:00", "2024-01-02T00:00:00",
+                      "2024-01-03T00:00:00", "2024-01-03T00:00:00"]:
+        commit = await create_commit(session_id=session_id, query="q", mode="CHAT", response="r",
+                                     timestamp=timestamp, parent_commit=parent)
+        parent = str(commit.commit_id)
+        ids.append(parent)
+    return ids
+
+@pytest.mark.parametrize("path, key", [("/version-history", "commits"), ("/chat-history", "chat_history")])
+async def test_pages_cover_every_commit_once(client, session_id, commits, path, key):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"session_id": session_id, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = (await client.get(path, params=params)).json()
+        seen += [c["commit_id"] for c in body[key]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == commits
+    assert pages == 3
+
+async def test_fields_selects_the_projection(client, session_id, commits):
+    body = (await client.get("/chat-history", params={"session_id": session_id, "fields": "query"})).json()
+    assert set(body["chat_history"][0]) == {"commit_id", "timestamp", "query"}
+
+async def test_unknown_field_and_bad_cursor_are_rejected(client, session_id, commits):
+    response = await client.get("/chat-history", params={"session_id": session_id, "fields": "query,nope"})
+    assert response.status_code == 400
+    response = await client.get("/version-history", params={"session_id": session_id, "cursor": "%%%"})
+    assert response.status_code == 400
+
+async def test_unchanged_history_is_not_modified(client, session_id, commits):
+    params = {"session_id": session_id}
+    first = await client.get("/version-history", params=params)
+    etag = first.headers["etag"]
+
+    again = await client.get("/version-history", params=params)
+    # server_time moves on every call but must not change the validator
+    assert again.json()["server_time"] != first.json()["server_time"]
+    assert again.headers["etag"] == etag
+
+    not_modified = await client.get("/version-history", params=params, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+async def test_new_commit_changes_the_etag(client, session_id, commits):
+    params = {"session_id": session_id}
+    etag = (await client.get("/chat-history", params=params)).headers["etag"]
+
+    await create_commit(session_id=session_id, query="q", mode="CHAT", response="r",
+                        timestamp="2024-01-04T00:00:00", parent_commit=commits[-1])
+
+    response = await client.get("/chat-history", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()["chat_history"]) == len(commits) + 1
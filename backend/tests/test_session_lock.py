@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from controllers.SessionController import HeadConflictError, get_session_head, update_session
+from redis_init import get_redis_cache
+from session_lock import SessionLockTimeout, session_lease, waiting_requests
+
+pytestmark = pytest.mark.anyio
+
+async def test_requests_on_one_session_run_in_order(session_id):
+    events = []
+
+    async def transform(name: str):
+        async with session_lease(session_id):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.02)
+            events.append(f"{name} end")
+
+    first = asyncio.create_task(transform("first"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(transform("second"))
+    await asyncio.sleep(0.01)
+    assert waiting_requests() == 1
+
+    await asyncio.gather(first, second)
+    assert events == ["first start", "first end", "second start", "second end"]
+    assert waiting_requests() == 0
+
+async def test_sessions_do_not_wait_on_each_other(standins):
+    from controllers.SessionController import create_session
+
+    a, b = [str((await create_session(session_name=name)).session_id) for name in "ab"]
+    async with session_lease(a):
+        async with session_lease(b, timeout=0.5) as lease:
+            assert lease.session_id == b
+
+async def test_lease_is_released_in_redis(session_id):
+    async with session_lease(session_id):
+        assert await get_redis_cache().get(f"session_lock:{session_id}") is not None
+    assert await get_redis_cache().get(f"session_lock:{session_id}") is None
+
+async def test_busy_session_times_out(session_id):
+    async with session_lease(session_id):
+        with pytest.raises(SessionLockTimeout):
+            async with session_lease(session_id, timeout=0.05):
+                pass
+
+async def test_lease_held_by_another_worker_times_out(session_id):
+    # no local holder: only the Redis key of another worker is in the way
+    await get_redis_cache().set(f"session_lock:{session_id}", "other-worker", px=60000)
+    with pytest.raises(SessionLockTimeout):
+        async with session_lease(session_id, timeout=0.1):
+            pass
+
+async def test_every_lease_claims_a_newer_fence(session_id):
+    async with session_lease(session_id) as first:
+        pass
+    async with session_lease(session_id) as second:
+        pass
+    assert second.fence > first.fence
+
+async def test_stale_fence_cannot_move_head(session_id):
+    async with session_lease(session_id) as stale:
+        pass
+    async with session_lease(session_id) as current:
+        with pytest.raises(HeadConflictError):
+            await update_session(session_id, head="stale", fence=stale.fence)
+        await update_session(session_id, head="current", fence=current.fence)
+    assert await get_session_head(session_id) == "current"
+
+async def test_head_moved_since_read_is_a_conflict(session_id):
+    await update_session(session_id, head="a")
+    async with session_lease(session_id) as lease:
+        with pytest.raises(HeadConflictError):
+            await update_session(session_id, head="c", expected_head="b", fence=lease.fence)
+        await update_session(session_id, head="b", expected_head="a", fence=lease.fence)
+    assert await get_session_head(session_id) == "b"
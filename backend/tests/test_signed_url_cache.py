@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from cache import signed_url_cache
+from cache.signed_url_cache import get_signed_url, get_signed_urls, local_url_cache
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def signer(standins, monkeypatch):
+    """Counts presign calls; set release to hold them until the test is ready."""
+    state = {"calls": [], "release": None}
+
+    async def sign(bucket, s3_file_path, method):
+        state["calls"].append(s3_file_path)
+        if state["release"] is not None:
+            await state["release"].wait()
+        return f"https://signed/{s3_file_path}"
+
+    local_url_cache.clear()
+    monkeypatch.setattr(signed_url_cache, "_sign", sign)
+    yield state
+    local_url_cache.clear()
+
+async def test_concurrent_requests_sign_once(signer):
+    signer["release"] = asyncio.Event()
+    tasks = [asyncio.create_task(get_signed_url("bucket", "s/c/a.png")) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    signer["release"].set()
+
+    assert await asyncio.gather(*tasks) == ["https://signed/s/c/a.png"] * 5
+    assert signer["calls"] == ["s/c/a.png"]
+    assert not signed_url_cache._inflight
+
+async def test_later_requests_are_served_from_the_cache(signer):
+    await get_signed_url("bucket", "s/c/a.png")
+    local_url_cache.clear()
+    # the local tier is gone, Redis still has it
+    assert await get_signed_url("bucket", "s/c/a.png") == "https://signed/s/c/a.png"
+    assert await get_signed_url("bucket", "s/c/a.png") == "https://signed/s/c/a.png"
+    assert signer["calls"] == ["s/c/a.png"]
+
+async def test_batch_reuses_cached_urls(signer):
+    await get_signed_url("bucket", "s/c/a.png")
+    urls = await get_signed_urls("bucket", ["s/c/a.png", "s/c/b.png", "s/c/b.png"])
+    assert set(urls) == {"s/c/a.png", "s/c/b.png"}
+    assert urls["s/c/a.png"] == "https://signed/s/c/a.png"
+    # the miss was signed by the batch and is cached for the single lookup too
+    assert await get_signed_url("bucket", "s/c/b.png") == urls["s/c/b.png"]
+    assert signer["calls"] == ["s/c/a.png"]
+
+async def test_waiters_are_released_when_the_owner_is_cancelled(signer):
+    signer["release"] = asyncio.Event()
+    owner = asyncio.create_task(get_signed_url("bucket", "s/c/a.png"))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(get_signed_url("bucket", "s/c/a.png"))
+    await asyncio.sleep(0.01)
+
+    owner.cancel()
+    assert await asyncio.wait_for(waiter, 1) is None
+    assert not signed_url_cache._inflight
+
+    # nothing was cached, so the next request signs again
+    signer["release"].set()
+    assert await get_signed_url("bucket", "s/c/a.png") == "https://signed/s/c/a.png"
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from fastapi.responses import JSONResponse
+
+from cache import transform_results
+from cache.transform_results import REPLAYED_HEADER, coalesce_transform, local_result_cache, submission_key
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def transform(standins):
+    """A transform that counts its runs; set release to hold it while running."""
+    state = {"runs": 0, "release": None, "status": 200}
+
+    async def run():
+        state["runs"] += 1
+        if state["release"] is not None:
+            await state["release"].wait()
+        return JSONResponse(content={"run": state["runs"]}, status_code=state["status"])
+
+    local_result_cache.clear()
+    state["run"] = run
+    yield state
+    local_result_cache.clear()
+
+def test_idempotency_key_ignores_head():
+    assert submission_key("s", "head1", "q", "k") == submission_key("s", "head2", "q", "k")
+    assert submission_key("s", "head1", "q", None) != submission_key("s", "head2", "q", None)
+    assert submission_key("s", "head1", "q", "k") != submission_key("s", "head1", "q", None)
+    assert submission_key("s1", "head1", "q", "k") != submission_key("s2", "head1", "q", "k")
+
+@pytest.mark.parametrize("retain", [True, False])
+async def test_concurrent_duplicates_share_one_run(transform, retain):
+    transform["release"] = asyncio.Event()
+    tasks = [asyncio.create_task(coalesce_transform("k", "q", transform["run"], retain=retain)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    transform["release"].set()
+
+    results = await asyncio.gather(*tasks)
+    assert [served for _, served in results] == ["run", "inflight", "inflight"]
+    assert {response.body for response, _ in results} == {b'{"run":1}'}
+    assert results[1][0].headers[REPLAYED_HEADER] == "true"
+    assert transform["runs"] == 1
+    assert not transform_results._inflight
+
+async def test_keyed_retry_replays_the_result(transform):
+    await coalesce_transform("k", "q", transform["run"], retain=True)
+    local_result_cache.clear()
+    # the local tier is gone, Redis still has it
+    response, served = await coalesce_transform("k", "q", transform["run"], retain=True)
+
+    assert served == "replay"
+    assert response.body == b'{"run":1}'
+    assert response.headers[REPLAYED_HEADER] == "true"
+    assert transform["runs"] == 1
+
+async def test_keyless_resubmission_runs_again(transform):
+    await coalesce_transform("k", "q", transform["run"], retain=False)
+    response, served = await coalesce_transform("k", "q", transform["run"], retain=False)
+
+    assert served == "run"
+    assert response.body == b'{"run":2}'
+    assert transform["runs"] == 2
+
+async def test_key_reused_for_another_query_is_rejected(transform):
+    await coalesce_transform("k", "q", transform["run"], retain=True)
+    response, served = await coalesce_transform("k", "other", transform["run"], retain=True)
+
+    assert served == "rejected"
+    assert response.status_code == 422
+    assert transform["runs"] == 1
+
+async def test_key_reused_while_running_is_rejected(transform):
+    transform["release"] = asyncio.Event()
+    running = asyncio.create_task(coalesce_transform("k", "q", transform["run"], retain=True))
+    await asyncio.sleep(0.01)
+
+    response, served = await coalesce_transform("k", "other", transform["run"], retain=True)
+    assert (served, response.status_code) == ("rejected", 422)
+
+    transform["release"].set()
+    await running
+
+async def test_failures_are_not_replayed(transform):
+    transform["status"] = 500
+    await coalesce_transform("k", "q", transform["run"], retain=True)
+    transform["status"] = 200
+    response, served = await coalesce_transform("k", "q", transform["run"], retain=True)
+
+    assert served == "run"
+    assert response.status_code == 200
+    assert transform["runs"] == 2
+
+async def test_waiters_fail_when_the_run_raises(transform):
+    transform["release"] = asyncio.Event()
+
+    async def failing():
+        await transform["release"].wait()
+        raise RuntimeError("boom")
+
+    owner = asyncio.create_task(coalesce_transform("k", "q", failing, retain=True))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(coalesce_transform("k", "q", transform["run"], retain=True))
+    await asyncio.sleep(0.01)
+    transform["release"].set()
+
+    for task in (owner, waiter):
+        with pytest.raises(RuntimeError, match="boom"):
+            await task
+    assert not transform_results._inflight
@@ -0,0 +1,144 @@
+import os
+import inspect
+import functools
+import contextvars
+from typing import Dict, Optional
+from opentelemetry import trace, context as otel_context
+from opentelemetry.propagate import extract
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# OpenTelemetry tracing. Off unless TRACING_EXPORTER is set:
+#   console  print every finished span (offline debugging)
+#   memory   keep spans in memory_exporter (benchmarks, ad hoc analysis)
+#   otlp     ship to a collector (needs opentelemetry-exporter-otlp)
+# TRACING_SAMPLE_RATIO samples whole traces; an incoming traceparent
+# header's sampling decision wins.
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "cellcraft-backend")
+
+tracer = trace.get_tracer("cellcraft")
+
+memory_exporter = None
+
+# session/commit the current request works on; stamped on every span it starts
+_trace_ids: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("trace_ids", default={})
+
+def init_tracing(exporter: str = TRACING_EXPORTER, sample_ratio: float = TRACING_SAMPLE_RATIO):
+    global memory_exporter
+    if exporter in ("", "none"):
+        return None
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider, SpanProcessor
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor, BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    class _TraceIdsProcessor(SpanProcessor):
+        def on_start(self, span, parent_context=None):
+            for name, value in _trace_ids.get().items():
+                span.set_attribute(f"cellcraft.{name}", value)
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+                              sampler=ParentBased(TraceIdRatioBased(sample_ratio)))
+    provider.add_span_processor(_TraceIdsProcessor())
+
+    if exporter == "console":
+        provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "memory":
+        memory_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(memory_exporter))
+    elif exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("TRACING_EXPORTER=otlp needs opentelemetry-exporter-otlp; tracing disabled")
+            return None
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    else:
+        print(f"Unknown TRACING_EXPORTER {exporter!r}; tracing disabled")
+        return None
+
+    trace.set_tracer_provider(provider)
+    print(f"Tracing enabled: {exporter} exporter, sample ratio {sample_ratio}")
+    return provider
+
+def shutdown_tracing():
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+def bind_trace_ids(session_id: Optional[str] = None, commit_id: Optional[str] = None):
+    """Tags the current span, and every span started after it in this request."""
+    ids = dict(_trace_ids.get())
+    for name, value in (("session_id", session_id), ("commit_id", commit_id)):
+        if value:
+            ids[name] = str(value)
+            trace.get_current_span().set_attribute(f"cellcraft.{name}", str(value))
+    _trace_ids.set(ids)
+
+def traced(name: Optional[str] = None):
+    """
+    Runs an async function in a span named name (default module.function).
+    session_id / commit_id arguments become span attributes.
+    """
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+        signature = inspect.signature(fn)
+        tagged = [p for p in ("session_id", "commit_id") if p in signature.parameters]
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            attributes = {}
+            if tagged:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                attributes = {f"cellcraft.{p}": str(bound[p]) for p in tagged if bound.get(p) is not None}
+            with tracer.start_as_current_span(span_name, attributes=attributes):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TracingMiddleware:
+    """
+    Root span per HTTP request, continuing the caller's trace if it sent a
+    traceparent. FastAPI versions with built-in telemetry open that span
+    themselves; then this only scopes the session/commit ids to the request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        ids_token = _trace_ids.set({})
+        if trace.get_current_span().get_span_context().is_valid:
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                _trace_ids.reset(ids_token)
+
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        token = otel_context.attach(extract(carrier))
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            with tracer.start_as_current_span(f"{scope['method']} {scope['path']}", kind=SpanKind.SERVER,
+                                              attributes={"http.request.method": scope["method"],
+                                                          "url.path": scope["path"]}) as span:
+                await self.app(scope, receive, send_with_status)
+                if "code" in status:
+                    span.set_attribute("http.response.status_code", status["code"])
+                    if status["code"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+        finally:
+            _trace_ids.reset(ids_token)
+            otel_context.detach(token)
@@ -1,30 +1,59 @@
 const BASE_URL = import.meta.env.VITE_BASE_URL
 
-export const sendMessage = async (session_id: string, msg: string): Promise<any> => {
+// idempotency key of each message still waiting for its answer, so a
+// double-click or a retry of the same text joins the running transform
+const pendingKeys = new Map<string, string>()
+
+export const sendMessage = async (session_id: string, msg: string, profile: boolean = false, idempotencyKey?: string): Promise<any> => {
+    const pendingId = `${session_id}\n${msg}`
+    const key = idempotencyKey ?? pendingKeys.get(pendingId) ?? crypto.randomUUID()
+    pendingKeys.set(pendingId, key)
+
     const formData = new FormData()
 
     formData.append('session_id', session_id)
     formData.append('query', msg)
+    formData.append('idempotency_key', key)
+    if (profile) {
+        // per-line timing and memory of the generated code, saved as a commit artifact
+        formData.append('profile', 'true')
+    }
 
-    const response = await fetch(`${BASE_URL}/transform_csv/`,{
-        method: 'POST',
-        body: formData
-    })
+    try {
+        const response = await fetch(`${BASE_URL}/transform_csv/`,{
+            method: 'POST',
+            body: formData
+        })
 
-    if (!response.ok){
-        throw new Error("Failed to send form data")
-    }
+        if (!response.ok){
+            throw new Error("Failed to send form data")
+        }
 
-    return await response.json()
+        return await response.json()
+    } finally {
+        pendingKeys.delete(pendingId)
+    }
 
 }
 
 export const loadConversationHistory = async (session_id: string): Promise<any> =>{
-    const response = await fetch(`${BASE_URL}/chat-history?session_id=${session_id}`)
 
-    if (!response.ok){
-        throw new Error("Failed to load chat history")
-    }
+    let chatHistory: any[] = []
+    let cursor: string | null = null
+    let data: any = null
+
+    do {
+        const cursorParam: string = cursor ? `&cursor=${cursor}` : ''
+        const response = await fetch(`${BASE_URL}/chat-history?session_id=${session_id}${cursorParam}`)
+
+        if (!response.ok){
+            throw new Error("Failed to load chat history")
+        }
+
+        data = await response.json()
+        chatHistory = chatHistory.concat(data.chat_history ?? [])
+        cursor = data.next_cursor ?? null
+    } while (cursor)
 
-    return await response.json()
+    return { ...data, chat_history: chatHistory }
 }
\ No newline at end of file
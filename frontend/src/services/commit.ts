@@ -2,13 +2,24 @@ const BASE_URL = import.meta.env.VITE_BASE_URL
 
 export const getVersionHistory = async (session_id: string): Promise<any> => {
 
-    const response = await fetch(`${BASE_URL}/version-history?session_id=${session_id}`)
+    let commits: any[] = []
+    let cursor: string | null = null
+    let data: any = null
 
-    if (!response.ok) {
-        throw new Error("Failed to fetch Version History")
-    }
+    do {
+        const cursorParam: string = cursor ? `&cursor=${cursor}` : ''
+        const response = await fetch(`${BASE_URL}/version-history?session_id=${session_id}${cursorParam}`)
 
-    return await response.json()
+        if (!response.ok) {
+            throw new Error("Failed to fetch Version History")
+        }
+
+        data = await response.json()
+        commits = commits.concat(data.commits ?? [])
+        cursor = data.next_cursor ?? null
+    } while (cursor)
+
+    return { ...data, commits }
 
 }
 
@@ -21,3 +32,17 @@ export const getCommitFiles = async (session_id: string, commit_id: string): Pro
 
     return await response.json()
 }
+
+export const getCommitRows = async (commit_id: string, offset: number, limit: number, columns?: string[]): Promise<any> => {
+    const columnsParam: string = columns && columns.length ? `&columns=${encodeURIComponent(columns.join(','))}` : ''
+    const response = await fetch(`${BASE_URL}/commit-table?commit_id=${commit_id}&offset=${offset}&limit=${limit}${columnsParam}`)
+
+    if (!response.ok) {
+        throw new Error("Failed to fetch commit rows")
+    }
+
+    return await response.json()
+}
+
+export const getCommitDownloadUrl = (commit_id: string, format: 'csv' | 'parquet' = 'csv'): string =>
+    `${BASE_URL}/commit-table/download?commit_id=${commit_id}&format=${format}`